@@ -1,62 +1,209 @@
-import os
+import base64, os, re, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
 import openai
-import paho.mqtt.client as mqtt
-import json
 from dotenv import load_dotenv
+from mqtt_publisher import MQTT_TOPIC, MqttPublisher, get_publisher
+from frame_store import FRAME_SPILL_DIR, FrameStore, StoredFrame
+from p_prefilter import P_PREFILTER, PreFilter
+from tracing import tracer
 
-MQTT_BROKER = "test.mosquitto.org"
-MQTT_PORT = 1883
-MQTT_TOPIC = "txt4/action"
-
-# Load OpenAI API key
+# Load OpenAI API key (OPENAI_BASE_URL points the client at another endpoint,
+# e.g. benchmarks/fake_openai.py)
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai.api_key = OPENAI_API_KEY
 
 # Use GPT-4o for vision
-OPENAI_VISION_MODEL = "gpt-4o"
+OPENAI_VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o")
+
+# Detection runner: concurrent vision requests, results handled in capture order
+P_IMAGE_DIR      = os.getenv("P_IMAGE_DIR", FRAME_SPILL_DIR)      # standalone run: frames spilled with FRAME_SPILL=disk
+P_DETECT_WORKERS = int(os.getenv("P_DETECT_WORKERS", "4"))     # vision requests in flight
+P_DETECT_BATCH   = int(os.getenv("P_DETECT_BATCH", "1"))       # images per request (1 = one image per request)
+P_DETECT_TIMEOUT = float(os.getenv("P_DETECT_TIMEOUT", "30"))
+
+SYSTEM = "You are a visual parking sign detector."
+PROMPT = "Is there a parking sign (the letter 'P', as used for parking) visible in this image? Answer only YES or NO."
+BATCH_PROMPT = ("For each of the {n} images below, is there a parking sign (the letter 'P', as used for "
+                "parking) visible? Answer with exactly one line per image, in order, formatted as "
+                "'<image number>: YES' or '<image number>: NO'.")
+_LINE = re.compile(r"(\d+)\s*[:.)-]\s*(yes|no)", re.I)
+
+
+def _image_part(img_bytes: bytes) -> dict:
+    b64 = base64.b64encode(img_bytes).decode("ascii")
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}", "detail": "low"}}
 
+def _read(src):
+    """Image bytes from a path, or the bytes themselves (frames decoded in-process)."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return src
+    with open(src, "rb") as img_file:
+        return img_file.read()
+
+def _label(src) -> str:
+    return src if isinstance(src, str) else f"<{len(src)}-byte frame>"
 
 def detect_p_with_openai(image_path):
     try:
-        with open(image_path, "rb") as img_file:
-            img_bytes = img_file.read()
-        prompt = "Is there a parking sign (the letter 'P', as used for parking) visible in this image? Answer only YES or NO."
-        response = openai.chat.completions.create(
-            model=OPENAI_VISION_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a visual parking sign detector."},
-                {"role": "user", "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"data": img_bytes, "detail": "low"}}
-                ]}
-            ],
-            max_tokens=10
-        )
+        with tracer.span("vision.request"):
+            response = openai.chat.completions.create(
+                model=OPENAI_VISION_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM},
+                    {"role": "user", "content": [
+                        {"type": "text", "text": PROMPT},
+                        _image_part(_read(image_path))
+                    ]}
+                ],
+                max_tokens=10,
+                timeout=P_DETECT_TIMEOUT,
+            )
         answer = response.choices[0].message.content.strip().lower()
-        print(f"🔍 OpenAI Vision answer for {image_path}: {answer}")
+        print(f"🔍 OpenAI Vision answer for {_label(image_path)}: {answer}")
         return "yes" in answer
     except Exception as e:
-        print(f"❌ OpenAI Vision failed for {image_path}: {e}")
+        print(f"❌ OpenAI Vision failed for {_label(image_path)}: {e}")
         return False
 
-def send_park_command():
-    cmd = {"M1_dir": "cw", "M2_dir": "cw", "speed": 200, "step_size": 100}  # Example: move forward to park
-    client = mqtt.Client()
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    client.publish(MQTT_TOPIC, json.dumps(cmd))
-    print(f"📡 Sent park command: {cmd}")
-    client.disconnect()
+def detect_p_batch(image_paths: List[str]) -> List[bool]:
+    """One multi-image request; falls back to per-image requests if the reply cannot be parsed."""
+    if len(image_paths) == 1:
+        return [detect_p_with_openai(image_paths[0])]
+    try:
+        content = [{"type": "text", "text": BATCH_PROMPT.format(n=len(image_paths))}]
+        for i, path in enumerate(image_paths, 1):
+            content += [{"type": "text", "text": f"Image {i}:"}, _image_part(_read(path))]
+        with tracer.span("vision.batch_request"):
+            response = openai.chat.completions.create(
+                model=OPENAI_VISION_MODEL,
+                messages=[{"role": "system", "content": SYSTEM}, {"role": "user", "content": content}],
+                max_tokens=8 * len(image_paths),
+                timeout=P_DETECT_TIMEOUT,
+            )
+        answer = response.choices[0].message.content.strip()
+        found = {int(n): v.lower() == "yes" for n, v in _LINE.findall(answer)}
+        if set(found) >= set(range(1, len(image_paths) + 1)):
+            print(f"🔍 OpenAI Vision batch of {len(image_paths)}: {answer!r}")
+            return [found[i] for i in range(1, len(image_paths) + 1)]
+        print(f"⚠️ Unparseable batch answer {answer!r}, asking per image")
+    except Exception as e:
+        print(f"❌ OpenAI Vision batch failed ({len(image_paths)} images): {e}")
+    return [detect_p_with_openai(p) for p in image_paths]
+
+def list_images(image_dir: str = P_IMAGE_DIR) -> List[str]:
+    """JPEGs in capture order (modification time, then name); empty if the directory is missing."""
+    if not os.path.isdir(image_dir):
+        return []
+    paths = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.endswith(".jpg")]
+    return sorted(paths, key=lambda p: (os.path.getmtime(p), os.path.basename(p)))
+
+class DetectionRunner:
+    """Runs vision requests concurrently and returns the first 'P' in capture order.
+
+    Up to ``workers`` requests are in flight; each covers ``batch`` images. With a
+    ``prefilter`` the local detector answers confident frames itself and only the
+    ambiguous ones reach the vision model. Once an image is answered YES, requests
+    for later images are cancelled (or ignored if already running) and only
+    earlier, still-running requests are waited for.
+    """
+
+    def __init__(self, workers: int = P_DETECT_WORKERS, batch: int = P_DETECT_BATCH, detect=detect_p_batch,
+                 prefilter: Optional[PreFilter] = None):
+        self.workers, self.batch, self.detect = max(1, workers), max(1, batch), detect
+        self.prefilter = prefilter
+        self.counts = {"runs": 0, "frames": 0, "images": 0, "requests": 0, "cancelled": 0, "ignored": 0}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _request(self, paths: List[str]) -> List[bool]:
+        with self._lock:
+            self.counts["frames"] += len(paths)
+        answers: List[Optional[bool]] = [None] * len(paths)
+        if self.prefilter is not None:
+            for i, path in enumerate(paths):
+                verdict, s = self.prefilter.decide(path)
+                if verdict != "ask":
+                    answers[i] = verdict == "yes"
+                    print(f"🏠 Local P score for {_label(path)}: {s:.2f} → {verdict.upper()}")
+        ask = [p for p, a in zip(paths, answers) if a is None]
+        if not ask:
+            return answers
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts["images"] += len(ask)         # images sent to the vision model
+        remote = iter(self.detect(ask))
+        return [next(remote) if a is None else a for a in answers]
+
+    def run(self, paths: List[str]) -> Optional[str]:
+        with tracer.trace("detection_run", frames=len(paths), workers=self.workers, batch=self.batch):
+            return self._run(paths)
+
+    def _run(self, paths: List[str]) -> Optional[str]:
+        t0 = time.perf_counter()
+        batches = [paths[i:i + self.batch] for i in range(0, len(paths), self.batch)]
+        hit: Optional[int] = None                      # index of the earliest YES batch so far
+        answers: Dict[int, List[bool]] = {}
+        self.counts["runs"] += 1
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="p-detect")
+        try:
+            futures = {pool.submit(self._request, b): i for i, b in enumerate(batches)}
+            outstanding = set(futures)
+            while outstanding:
+                done, outstanding = wait(outstanding, return_when=FIRST_COMPLETED)
+                for f in done:
+                    i = futures[f]
+                    if f.cancelled():
+                        continue
+                    answers[i] = f.result()
+                    if any(answers[i]) and (hit is None or i < hit):
+                        hit = i
+                if hit is not None:
+                    for f in [f for f in outstanding if futures[f] > hit]:
+                        outstanding.discard(f)
+                        self.counts["cancelled" if f.cancel() else "ignored"] += 1
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.elapsed += time.perf_counter() - t0
+        if hit is None:
+            return None
+        return batches[hit][answers[hit].index(True)]
+
+    def run_store(self, store: FrameStore, frames: Optional[List[StoredFrame]] = None) -> Optional[StoredFrame]:
+        """``run`` over frames held in memory by a FrameStore (default: all of them, capture order)."""
+        frames = store.latest() if frames is None else frames
+        readable = [(f, data) for f in frames if (data := store.read(f.key)) is not None]
+        hit = self.run([data for _, data in readable])
+        return next((f for f, data in readable if data is hit), None)
+
+    def stats(self) -> dict:
+        return {**self.counts, "workers": self.workers, "batch": self.batch,
+                "prefilter": self.prefilter.stats() if self.prefilter else None,
+                "elapsed_s": round(self.elapsed, 3),
+                "images_per_s": round(self.counts["frames"] / self.elapsed, 2) if self.elapsed else 0.0}
+
+PARK_COMMAND = {"M1_dir": "cw", "M2_dir": "cw", "speed": 200, "step_size": 100}  # Example: move forward to park
+
+def send_park_command(topic: str = MQTT_TOPIC, publisher: Optional[MqttPublisher] = None):
+    (publisher or get_publisher()).publish(PARK_COMMAND, topic, wait=True)
+    print(f"📡 Sent park command to {topic}: {PARK_COMMAND}")
 
 def main():
-    image_dir = "received_images"
-    for fname in os.listdir(image_dir):
-        if fname.endswith(".jpg"):
-            path = os.path.join(image_dir, fname)
-            print(f"🔍 Processing {path}...")
-            if detect_p_with_openai(path):
-                send_park_command()
-                break  # Only park at the first detected 'P'
+    runner = DetectionRunner(prefilter=PreFilter() if P_PREFILTER else None)
+    paths = list_images(P_IMAGE_DIR)
+    if not paths:
+        print(f"⚠️ No images in {P_IMAGE_DIR}. Live frames are checked in memory by mac_subscriber.py; "
+              f"run it with FRAME_SPILL=disk to keep evicted frames here, or point P_IMAGE_DIR at JPEGs.")
+        return
+    print(f"🔍 Processing {len(paths)} images from {P_IMAGE_DIR} "
+          f"({runner.workers} in flight, {runner.batch} per request)...")
+    hit = runner.run(paths)
+    print(f"📊 Detection stats: {runner.stats()}")
+    if hit:
+        print(f"🅿️ Parking sign in {hit}")
+        send_park_command()  # Only park at the first detected 'P'
+    tracer.report()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
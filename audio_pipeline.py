@@ -0,0 +1,249 @@
+"""Streaming microphone → VAD → Whisper pipeline.
+
+Capture, segmentation and transcription run on their own threads and talk
+through bounded queues, so speech that arrives while the main loop is busy
+(GPT call, TTS playback, publishing) is still picked up.
+
+    capture (sounddevice callback) ─► frames ─► segmenter (energy VAD)
+        ─► segments ─► transcriber (Whisper) ─► transcripts ─► main()
+"""
+from __future__ import annotations
+import collections, os, queue, threading, time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+import numpy as np
+from bounded_queue import put_drop_oldest
+from startup import lazy_module
+
+sd = lazy_module("sounddevice")   # PortAudio is initialised when the microphone opens
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+SAMPLE_RATE       = 16000
+FRAME_MS          = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_THRESHOLD     = float(os.getenv("VAD_THRESHOLD", "0.01"))    # RMS, float32 scale
+VAD_NOISE_FACTOR  = float(os.getenv("VAD_NOISE_FACTOR", "3.0"))  # × adaptive noise floor
+VAD_SILENCE_S     = float(os.getenv("VAD_SILENCE_S", "0.8"))     # same as pause_threshold
+VAD_MIN_SPEECH_S  = float(os.getenv("VAD_MIN_SPEECH_S", "0.25"))
+VAD_MAX_SEGMENT_S = float(os.getenv("VAD_MAX_SEGMENT_S", "15"))
+VAD_PREROLL_S     = float(os.getenv("VAD_PREROLL_S", "0.3"))
+QUEUE_FRAMES      = int(os.getenv("STREAM_QUEUE_FRAMES", "500"))  # ~15 s of 30 ms frames
+QUEUE_SEGMENTS    = int(os.getenv("STREAM_QUEUE_SEGMENTS", "8"))
+QUEUE_TRANSCRIPTS = int(os.getenv("STREAM_QUEUE_TRANSCRIPTS", "8"))
+LATENCY_WINDOW    = 100
+
+@dataclass
+class Segment:
+    audio: np.ndarray
+    start: float                 # wall-clock time of the first voiced frame
+    end: float                   # wall-clock time of the last captured frame
+    emitted: float = field(default_factory=time.time)
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+@dataclass
+class Transcript:
+    text: str
+    result: Any                  # whatever the transcribe function returned
+    segment: Segment
+    picked: float                # transcriber dequeued the segment
+    done: float                  # transcription finished
+
+# ═════════════════════ ENERGY VAD SEGMENTER ═════════════════════════════════
+class EnergyVAD:
+    """Frame-level RMS detector with an adaptive noise floor and silence hangover."""
+
+    def __init__(self, threshold: float = VAD_THRESHOLD, noise_factor: float = VAD_NOISE_FACTOR,
+                 silence_s: float = VAD_SILENCE_S, min_speech_s: float = VAD_MIN_SPEECH_S,
+                 max_segment_s: float = VAD_MAX_SEGMENT_S, preroll_s: float = VAD_PREROLL_S,
+                 frame_ms: int = FRAME_MS):
+        self.threshold = threshold
+        self.noise_factor = noise_factor
+        self.noise_floor = threshold / noise_factor
+        frames = lambda s: max(1, int(round(s * 1000 / frame_ms)))
+        self.silence_frames = frames(silence_s)
+        self.min_speech_frames = frames(min_speech_s)
+        self.max_frames = frames(max_segment_s)
+        self._preroll: Deque[np.ndarray] = collections.deque(maxlen=frames(preroll_s))
+        self._buf: List[np.ndarray] = []
+        self._voiced = 0
+        self._silent = 0
+        self._start = 0.0
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._buf)
+
+    def level(self) -> float:
+        return max(self.threshold, self.noise_floor * self.noise_factor)
+
+    def feed(self, frame: np.ndarray, ts: float) -> Optional[Segment]:
+        """Consume one frame; returns a finished Segment when an utterance ends."""
+        rms = float(np.sqrt(np.mean(frame * frame))) if len(frame) else 0.0
+        voiced = rms >= self.level()
+        if not voiced:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+
+        if not self._buf:
+            if voiced:
+                self._buf = list(self._preroll) + [frame]
+                self._preroll.clear()
+                self._voiced, self._silent, self._start = 1, 0, ts
+            else:
+                self._preroll.append(frame)
+            return None
+
+        self._buf.append(frame)
+        if voiced:
+            self._voiced += 1; self._silent = 0
+        else:
+            self._silent += 1
+        if self._silent >= self.silence_frames or len(self._buf) >= self.max_frames:
+            return self._flush(ts)
+        return None
+
+    def _flush(self, ts: float) -> Optional[Segment]:
+        buf, voiced = self._buf, self._voiced
+        self._buf, self._voiced, self._silent = [], 0, 0
+        if voiced < self.min_speech_frames:
+            return None
+        return Segment(np.concatenate(buf), self._start, ts)
+
+# ═════════════════════ STREAMING RECOGNIZER ═════════════════════════════════
+class StreamingRecognizer:
+    """Continuous capture + VAD + transcription running beside the main loop."""
+
+    STAGES = ("segment", "queue_wait", "transcribe", "delivery", "end_to_end")
+
+    def __init__(self, transcribe: Callable[[np.ndarray], Any],
+                 text_of: Callable[[Any], str] = lambda r: r["text"].strip(),
+                 vad: Optional[EnergyVAD] = None, device=None,
+                 on_speech: Optional[Callable[[], None]] = None):
+        self.transcribe = transcribe
+        self.on_speech = on_speech    # called when the VAD detects the start of speech (barge-in)
+        self.text_of = text_of
+        self.vad = vad or EnergyVAD()
+        self.device = device
+        self.frames: "queue.Queue" = queue.Queue(maxsize=QUEUE_FRAMES)
+        self.segments: "queue.Queue" = queue.Queue(maxsize=QUEUE_SEGMENTS)
+        self.transcripts: "queue.Queue" = queue.Queue(maxsize=QUEUE_TRANSCRIPTS)
+        self.dropped = {"frames": 0, "segments": 0, "transcripts": 0}
+        self.latency: Dict[str, Deque[float]] = {
+            k: collections.deque(maxlen=LATENCY_WINDOW) for k in self.STAGES}
+        self._running = threading.Event()
+        self._muted = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stream = None
+
+    # ── lifecycle ──────────────────────────────────────────────────────────
+    def start(self, capture: bool = True) -> "StreamingRecognizer":
+        """Start the worker threads; ``capture=False`` skips the microphone (use ``feed``)."""
+        if self._running.is_set():
+            return self
+        self._running.set()
+        for target, name in ((self._segment_loop, "vad"), (self._transcribe_loop, "stt")):
+            t = threading.Thread(target=target, name=f"stream-{name}", daemon=True)
+            t.start(); self._threads.append(t)
+        if not capture:
+            return self
+        self._stream = sd.InputStream(
+            samplerate=SAMPLE_RATE, channels=1, dtype="float32", device=self.device,
+            blocksize=SAMPLE_RATE * FRAME_MS // 1000, callback=self._on_audio)
+        self._stream.start()
+        print(f"🎙️ Streaming capture started ({FRAME_MS} ms frames, VAD ≥ {self.vad.level():.4f} RMS)")
+        return self
+
+    def stop(self) -> None:
+        self._running.clear()
+        if self._stream is not None:
+            self._stream.stop(); self._stream.close(); self._stream = None
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads.clear()
+
+    @contextmanager
+    def muted(self):
+        """Ignore the microphone inside the block (e.g. while our own TTS is playing)."""
+        self._muted.set()
+        try:
+            yield
+        finally:
+            self._muted.clear()
+
+    # ── stages ─────────────────────────────────────────────────────────────
+    def _on_audio(self, indata, frames, time_info, status) -> None:
+        if status:
+            print(f"⚠️ Audio input status: {status}")
+        if self._muted.is_set():
+            return
+        put_drop_oldest(self.frames, (indata[:, 0].copy(), time.time()), self.dropped, "frames")
+
+    def feed(self, samples: np.ndarray, ts: Optional[float] = None) -> None:
+        """Push audio from a non-microphone source (file replay, tests) into the pipeline."""
+        step = SAMPLE_RATE * FRAME_MS // 1000
+        ts = time.time() - len(samples) / SAMPLE_RATE if ts is None else ts
+        for i in range(0, len(samples), step):
+            self.frames.put((samples[i:i + step].astype(np.float32, copy=False), ts + i / SAMPLE_RATE))
+
+    def _segment_loop(self) -> None:
+        while self._running.is_set():
+            try:
+                frame, ts = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            was_speech = self.vad.in_speech
+            seg = self.vad.feed(frame, ts)
+            if self.on_speech and not was_speech and self.vad.in_speech:
+                try:
+                    self.on_speech()
+                except Exception as e:
+                    print(f"⚠️ on_speech hook failed: {e}")
+            if seg is not None:
+                self.latency["segment"].append(seg.emitted - seg.end)
+                put_drop_oldest(self.segments, seg, self.dropped, "segments")
+
+    def _transcribe_loop(self) -> None:
+        while self._running.is_set():
+            try:
+                seg = self.segments.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            picked = time.time()
+            self.latency["queue_wait"].append(picked - seg.emitted)
+            try:
+                result = self.transcribe(seg.audio)
+            except Exception as e:
+                print(f"❌ Streaming transcription failed: {e}")
+                continue
+            done = time.time()
+            self.latency["transcribe"].append(done - picked)
+            text = self.text_of(result)
+            if text:
+                put_drop_oldest(self.transcripts, Transcript(text, result, seg, picked, done),
+                                 self.dropped, "transcripts")
+
+    # ── consumer side ──────────────────────────────────────────────────────
+    def get(self, timeout: Optional[float] = None) -> Optional[Transcript]:
+        try:
+            tr = self.transcripts.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        now = time.time()
+        self.latency["delivery"].append(now - tr.done)
+        self.latency["end_to_end"].append(now - tr.segment.end)
+        return tr
+
+    def stats(self) -> dict:
+        def summary(xs: Deque[float]) -> Dict[str, float]:
+            if not xs:
+                return {"n": 0, "mean_s": 0.0, "max_s": 0.0}
+            return {"n": len(xs), "mean_s": round(sum(xs) / len(xs), 3), "max_s": round(max(xs), 3)}
+        return {
+            "queue_depth": {"frames": self.frames.qsize(), "segments": self.segments.qsize(),
+                            "transcripts": self.transcripts.qsize()},
+            "dropped": dict(self.dropped),
+            "latency": {k: summary(v) for k, v in self.latency.items()},
+            "in_speech": self.vad.in_speech,
+        }
@@ -0,0 +1,45 @@
+"""Bytes on the wire and receive-side decode time: legacy base64 vs binary framing.
+
+    python benchmarks/bench_image_transport.py [--frames 200] [--sizes 20000,120000,600000]
+
+For each image size the same random JPEG-sized payloads are encoded as the
+legacy ``name:<base64>`` text and as binary frames (unchunked and chunked),
+then decoded through ``image_transport.Reassembler`` as mac_subscriber does.
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_transport import Reassembler, encode_frame, encode_legacy
+
+def run(images, encode) -> tuple:
+    payloads = [encode(i, img) for i, img in enumerate(images)]
+    wire = sum(len(p) for msgs in payloads for p in msgs)
+    r = Reassembler()
+    t0 = time.perf_counter()
+    for msgs in payloads:
+        for p in msgs:
+            frame = r.feed(p)
+        assert frame is not None and len(frame.data) == len(images[0])
+    dt = time.perf_counter() - t0
+    return wire / len(images), 1e6 * dt / len(images), max(len(m) for m in payloads)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--sizes", default="20000,120000,600000")
+    args = ap.parse_args()
+    formats = [
+        ("legacy base64", lambda i, img: [encode_legacy(img, f"img_{i}")]),
+        ("binary", lambda i, img: encode_frame(img, i, chunk_size=1 << 30)),
+        ("binary 64 KiB chunks", lambda i, img: encode_frame(img, i, chunk_size=64 * 1024)),
+        ("binary 16 KiB chunks", lambda i, img: encode_frame(img, i, chunk_size=16 * 1024)),
+    ]
+    print(f"{'image':>8} {'format':22} {'wire B/frame':>13} {'overhead':>9} {'msgs':>5} {'decode µs':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        images = [os.urandom(size) for _ in range(args.frames)]
+        for name, encode in formats:
+            wire, us, msgs = run(images, encode)
+            print(f"{size:8d} {name:22} {wire:13.0f} {wire / size - 1:9.1%} {msgs:5d} {us:10.1f}")
+
+if __name__ == "__main__":
+    main()
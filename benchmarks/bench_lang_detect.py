@@ -0,0 +1,119 @@
+"""Accuracy and latency of the compiled language detector vs the old substring scans.
+
+    python benchmarks/bench_lang_detect.py [--repeat 200]
+
+"legacy" is the pre-index implementation (``word in text`` for every word of
+every language, then separate scans for explicit language names, switch
+phrases and yes/no). "index" is ``language.analyze``, one pass per utterance.
+"""
+from __future__ import annotations
+import argparse, contextlib, io, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from language import LANG_WORDS, LANGUAGE_SWITCH_PHRASES, YES, NO, analyze
+
+# (utterance, spoken language, language requested by a switch phrase or None, yes, no)
+SAMPLES = [
+    ("go forward 100 steps", "en-US", None, True, False),
+    ("turn left and then move forward", "en-US", None, False, False),
+    ("yes execute the plan", "en-US", None, True, False),
+    ("no cancel that", "en-US", None, False, True),
+    ("what can you do for me", "en-US", None, False, False),
+    ("now go north", "en-US", None, True, False),
+    ("i want to speak in german", "en-US", "de-DE", False, False),
+    ("switch to turkish please", "en-US", "tr-TR", False, False),
+    ("merhaba beni anlayabiliyor musun", "tr-TR", None, False, False),
+    ("evet uygula", "tr-TR", None, True, False),
+    ("hayır iptal et", "tr-TR", None, False, True),
+    ("sola dön ve ileri git", "tr-TR", None, False, False),
+    ("bir tam tur at lütfen", "tr-TR", None, False, False),
+    ("türkçe konuşalım", "tr-TR", "tr-TR", False, False),
+    ("hallo bitte drehen links", "de-DE", None, False, False),
+    ("ja bitte, danke", "de-DE", None, True, False),
+    ("nein, rückwärts bitte", "de-DE", None, False, True),
+    ("ich möchte sprechen deutsch", "de-DE", "de-DE", False, False),
+    ("bonjour, tourner à gauche merci", "fr-FR", None, False, False),
+    ("oui merci beaucoup", "fr-FR", None, True, False),
+    ("je veux parler en français", "fr-FR", "fr-FR", False, False),
+    ("hola, girar a la izquierda por favor", "es-ES", None, False, False),
+    ("sí, gracias, adelante", "es-ES", None, True, False),
+    ("quiero hablar en español", "es-ES", "es-ES", False, False),
+    ("ciao, girare a sinistra per favore", "it-IT", None, False, False),
+    ("grazie, avanti e poi indietro", "it-IT", None, False, False),
+    ("voglio parlare in italiano", "it-IT", "it-IT", False, False),
+    ("привет робот, вперёд пожалуйста", "ru-RU", None, False, False),
+    ("стоп, назад", "ru-RU", None, False, False),
+    ("давай говорить на русский", "ru-RU", "ru-RU", False, False),
+    ("only one more", "en-US", None, False, False),
+    ("ok", "en-US", None, False, False),
+]
+
+# ── legacy implementation (substring scans), kept verbatim for comparison ───
+def legacy_word_based(text):
+    text_lower = text.lower()
+    scores = {}
+    for lang, words in LANG_WORDS.items():
+        score = sum(1 for word in words if word in text_lower)
+        if score > 0:
+            scores[lang] = score
+    if scores:
+        best_lang = max(scores.items(), key=lambda x: x[1])
+        second_best = None
+        if len(scores) > 1:
+            second_best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[1]
+        if best_lang[1] >= 2 and (not second_best or (best_lang[1] - second_best[1]) > 1):
+            return best_lang[0]
+    if any(char in text_lower for char in ['ç', 'ğ', 'ı', 'ö', 'ş', 'ü']):
+        return "tr-TR"
+    return None
+
+def legacy_explicit(text):
+    t = text.lower()
+    if "german" in t or "deutsch" in t or "almanca" in t: return "de-DE"
+    elif "english" in t or "ingilizce" in t: return "en-US"
+    elif "turkish" in t or "türkçe" in t: return "tr-TR"
+    elif "french" in t or "français" in t or "fransızca" in t: return "fr-FR"
+    elif "spanish" in t or "español" in t or "ispanyolca" in t: return "es-ES"
+    elif "italian" in t or "italiano" in t or "italyanca" in t: return "it-IT"
+    elif "russian" in t or "русский" in t or "по-русски" in t: return "ru-RU"
+    return None
+
+def legacy(text):
+    low = text.lower()
+    switch = any(p in low for p in LANGUAGE_SWITCH_PHRASES)
+    return (legacy_word_based(text), legacy_explicit(text) if switch else None,
+            any(w in low for w in YES), any(w in low for w in NO))
+
+def index(text):
+    a = analyze(text)
+    return a.lang, a.explicit_lang if a.switch_request else None, a.yes, a.no
+
+def evaluate(fn, repeat: int):
+    correct = {"lang": 0, "wrong": 0, "switch": 0, "yes": 0, "no": 0}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text, lang, switch, yes, no in SAMPLES:
+            got = fn(text)
+            correct["wrong"] += got[0] is not None and got[0] != lang   # answered, but wrongly
+            for key, want, have in zip(("lang", "switch", "yes", "no"), (lang, switch, yes, no), got):
+                correct[key] += want == have
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for text, *_ in SAMPLES:
+                fn(text)
+        dt = time.perf_counter() - t0
+    n = len(SAMPLES)
+    return {k: v / n for k, v in correct.items()}, 1e6 * dt / (repeat * n)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    print(f"{len(SAMPLES)} labelled utterances, {args.repeat} timing passes")
+    print("lang = word-based language correct, wrong = a language was returned but it was wrong")
+    print(f"{'impl':8} {'lang':>6} {'wrong':>6} {'switch':>7} {'yes':>6} {'no':>6} {'µs/utt':>8}")
+    for name, fn in (("legacy", legacy), ("index", index)):
+        acc, us = evaluate(fn, args.repeat)
+        print(f"{name:8} {acc['lang']:6.0%} {acc['wrong']:6.0%} {acc['switch']:7.0%} "
+              f"{acc['yes']:6.0%} {acc['no']:6.0%} {us:8.1f}")
+
+if __name__ == "__main__":
+    main()
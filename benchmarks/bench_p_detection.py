@@ -0,0 +1,61 @@
+"""Throughput of the P_detection runner against the local fake vision endpoint.
+
+    python benchmarks/bench_p_detection.py [--images 40] [--hit 30] [--latency 0.8]
+
+Writes ``--images`` dummy frames (frame ``--hit`` carries the fake server's
+parking-sign marker, -1 for none) and times sequential detection against
+concurrent and batched runners. No network or API key is needed.
+"""
+from __future__ import annotations
+import argparse, contextlib, io, os, sys, tempfile, threading, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_openai import MARKER, FakeOpenAI
+
+CONFIGS = [("sequential", 1, 1), ("4 workers", 4, 1), ("8 workers", 8, 1),
+           ("4 workers × 4 images", 4, 4), ("2 workers × 8 images", 2, 8)]
+
+def write_frames(directory: str, n: int, hit: int) -> None:
+    t0 = time.time() - n
+    for i in range(n):
+        path = os.path.join(directory, f"frame_{i:04d}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8fake-jpeg" + (MARKER if i == hit else b"") + os.urandom(2048))
+        os.utime(path, (t0 + i, t0 + i))          # capture order ≠ name order is fine too
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--images", type=int, default=40)
+    ap.add_argument("--hit", type=int, default=30)
+    ap.add_argument("--latency", type=float, default=0.8, help="fake request latency (s)")
+    ap.add_argument("--per-image", type=float, default=0.1, help="extra latency per image (s)")
+    args = ap.parse_args()
+
+    server = FakeOpenAI(0, args.latency, args.per_image).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import openai
+    import P_detection
+    openai.base_url, openai.api_key = server.base_url, os.environ["OPENAI_API_KEY"]
+
+    with tempfile.TemporaryDirectory() as d:
+        write_frames(d, args.images, args.hit)
+        paths = P_detection.list_images(d)
+        want = paths[args.hit] if 0 <= args.hit < len(paths) else None
+        print(f"{args.images} frames, P in frame {args.hit}, fake latency "
+              f"{args.latency}s + {args.per_image}s/image")
+        print(f"{'runner':24} {'time s':>7} {'requests':>9} {'images':>7} {'img/s':>7} {'ok':>4}")
+        for name, workers, batch in CONFIGS:
+            runner = P_detection.DetectionRunner(workers=workers, batch=batch)
+            with contextlib.redirect_stdout(io.StringIO()):
+                got = runner.run(paths)
+            st = runner.stats()
+            print(f"{name:24} {st['elapsed_s']:7.2f} {st['requests']:9d} {st['images']:7d} "
+                  f"{st['images_per_s']:7.1f} {'✓' if got == want else '✗':>4}")
+            with contextlib.redirect_stdout(io.StringIO()):   # requests ignored after the hit still finish
+                for t in threading.enumerate():
+                    if t.name.startswith("p-detect"):
+                        t.join()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
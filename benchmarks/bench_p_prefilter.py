@@ -0,0 +1,129 @@
+"""Precision/recall and speed of the local "P" pre-filter on labelled frames.
+
+    python benchmarks/bench_p_prefilter.py [--frames 400] [--dir labelled/]
+
+Without ``--dir`` synthetic 640×480 frames are generated: positives show a
+"P" (white on a blue plate or dark on paper, random size, position, tilt,
+blur and noise), negatives show other letters, shapes or clutter only. The
+positives are drawn with glyphs the pre-filter was *not* built from: Hershey
+fonts other than its templates, italics, and a sign-style P made of a bar and
+a bowl. With ``--dir`` real frames are read from ``<dir>/p/*.jpg`` and
+``<dir>/no_p/*.jpg`` — the only numbers that say how it does on the robot.
+
+"local" lines score the pre-filter's own yes/no decisions. The "with remote"
+line additionally counts every "ask" frame as answered correctly, i.e. what
+the pipeline gets if the vision model never errs.
+"""
+from __future__ import annotations
+import argparse, glob, os, sys, time
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from p_prefilter import P_LOCAL_ACCEPT, P_LOCAL_REJECT, PreFilter
+
+# Not the fonts p_prefilter._templates() renders (SIMPLEX/DUPLEX/TRIPLEX, upright); None = sign-style P
+FONTS = (cv2.FONT_HERSHEY_COMPLEX, cv2.FONT_HERSHEY_PLAIN, cv2.FONT_HERSHEY_COMPLEX_SMALL,
+         cv2.FONT_HERSHEY_COMPLEX | cv2.FONT_ITALIC, cv2.FONT_HERSHEY_TRIPLEX | cv2.FONT_ITALIC, None)
+OTHER_FONTS = (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_COMPLEX)
+OTHER = "RBDFEOAHKX"
+
+def _clutter(rng, img) -> None:
+    for _ in range(rng.integers(2, 8)):
+        c = tuple(int(v) for v in rng.integers(0, 256, 3))
+        p = tuple(int(v) for v in rng.integers(0, 640, 2))
+        q = tuple(int(v) for v in rng.integers(0, 640, 2))
+        [lambda: cv2.line(img, p, q, c, int(rng.integers(1, 6))),
+         lambda: cv2.circle(img, p, int(rng.integers(5, 60)), c, -1),
+         lambda: cv2.rectangle(img, p, q, c, int(rng.integers(1, 4)))][rng.integers(3)]()
+
+def _sign_p(img, x: int, y: int, side: int, ink, thick: int) -> None:
+    """Road-sign P: vertical bar plus a bowl drawn as a half ring, roughly DIN 1451 proportions."""
+    h, w = int(0.7 * side), int(0.45 * side)
+    x0, y0 = x + (side - w) // 2, y + (side - h) // 2
+    cv2.rectangle(img, (x0, y0), (x0 + thick, y0 + h), ink, -1)
+    r = int(0.27 * h)
+    cv2.rectangle(img, (x0, y0), (x0 + w - r, y0 + thick), ink, -1)
+    cv2.rectangle(img, (x0, y0 + 2 * r - thick), (x0 + w - r, y0 + 2 * r), ink, -1)
+    cv2.ellipse(img, (x0 + w - r, y0 + r), (r - thick // 2, r - thick // 2), 0, -90, 90, ink, thick)
+
+def synth_frame(rng, letter: str) -> np.ndarray:
+    img = np.full((480, 640, 3), rng.integers(60, 200, 3), np.uint8)
+    img = cv2.add(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+    _clutter(rng, img)
+    if letter:
+        side = int(rng.integers(70, 220))
+        x, y = int(rng.integers(10, 640 - side - 10)), int(rng.integers(10, 480 - side - 10))
+        plate, ink = (((200, 90, 20), (255, 255, 255)) if rng.random() < 0.6
+                      else ((235, 235, 235), (30, 30, 30)))
+        cv2.rectangle(img, (x, y), (x + side, y + side), plate, -1)
+        fonts = FONTS if letter == "P" else OTHER_FONTS
+        font = fonts[rng.integers(len(fonts))]
+        thick = max(2, side // int(rng.integers(10, 18)))
+        if font is None:
+            _sign_p(img, x, y, side, ink, thick)
+        else:
+            (tw, th), _ = cv2.getTextSize(letter, font, 1.0, thick)
+            s = 0.7 * side / th
+            (tw, th), _ = cv2.getTextSize(letter, font, s, thick)
+            cv2.putText(img, letter, (x + (side - tw) // 2, y + (side + th) // 2), font, s, ink, thick,
+                        cv2.LINE_AA)
+    m = cv2.getRotationMatrix2D((320, 240), float(rng.uniform(-8, 8)), 1.0)
+    img = cv2.warpAffine(img, m, (640, 480), borderMode=cv2.BORDER_REFLECT)
+    if rng.random() < 0.5:
+        img = cv2.GaussianBlur(img, (5, 5), 0)
+    noise = rng.normal(0, rng.uniform(2, 10), img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+def synthetic(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        positive = i % 2 == 0
+        letter = "P" if positive else (OTHER[rng.integers(len(OTHER))] if rng.random() < 0.7 else "")
+        ok, jpg = cv2.imencode(".jpg", synth_frame(rng, letter), [cv2.IMWRITE_JPEG_QUALITY, 85])
+        yield jpg.tobytes(), positive
+
+def labelled_dir(d: str):
+    for sub, positive in (("p", True), ("no_p", False)):
+        for path in sorted(glob.glob(os.path.join(d, sub, "*.jpg"))):
+            with open(path, "rb") as f:
+                yield f.read(), positive
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--frames", type=int, default=400)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dir", default="")
+    ap.add_argument("--reject", type=float, default=P_LOCAL_REJECT)
+    ap.add_argument("--accept", type=float, default=P_LOCAL_ACCEPT)
+    args = ap.parse_args()
+
+    frames = list(labelled_dir(args.dir) if args.dir else synthetic(args.frames, args.seed))
+    pf = PreFilter(args.reject, args.accept)
+    local = {"right": 0, "false_yes": 0, "false_no": 0}
+    tp = fp = fn = 0
+    t0 = time.perf_counter()
+    for data, positive in frames:
+        verdict, _ = pf.decide(data)
+        if verdict != "ask":
+            right = (verdict == "yes") == positive
+            local["right" if right else "false_yes" if positive is False else "false_no"] += 1
+        said_yes = positive if verdict == "ask" else verdict == "yes"
+        tp += said_yes and positive
+        fp += said_yes and not positive
+        fn += positive and not said_yes
+    dt = time.perf_counter() - t0
+    st = pf.stats()
+    n_pos = sum(p for _, p in frames)
+    decided = st["yes"] + st["no"]
+    print(f"{len(frames)} frames ({n_pos} with P), reject < {args.reject}, accept ≥ {args.accept}"
+          + ("" if args.dir else " • synthetic, positives drawn unlike the templates"))
+    print(f"local yes {st['yes']} • local no {st['no']} • remote {st['ask']} ({st['remote_share']:.0%})")
+    print(f"local decisions: accuracy {local['right'] / max(1, decided):.3f} "
+          f"({local['false_yes']} false yes, {local['false_no']} false no of {decided}) • "
+          f"local recall {(st['yes'] - local['false_yes']) / max(1, n_pos):.3f}")
+    print(f"with remote (asks assumed correct): precision {tp / max(1, tp + fp):.3f} • "
+          f"recall {tp / max(1, tp + fn):.3f}")
+    print(f"{st['ms_per_frame']:.2f} ms/frame scoring • {len(frames) / dt:.0f} FPS incl. JPEG decode")
+
+if __name__ == "__main__":
+    main()
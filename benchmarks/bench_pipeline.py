@@ -0,0 +1,234 @@
+"""Offline, reproducible benchmark of the pipeline hot paths, stage by stage.
+
+    python benchmarks/bench_pipeline.py [--stages lang,gpt,publish,tts,vision,ingest]
+                                        [--wav DIR] [--frames DIR] [--latency 0.05]
+                                        [--json out.json] [--baseline out.json]
+
+Recorded inputs are replayed through the real functions: WAV utterances
+through ``recognize_with_whisper`` (stage ``asr``, needs ``--wav``), the
+transcripts (or built-in sample utterances) through ``auto_detect_language``,
+``gpt_commands`` and ``publish_command``, and stored frames (``--frames``,
+or seeded dummy frames) through ``detect_p_with_openai`` and the ingestion
+service's ``on_message``. OpenAI is benchmarks/fake_openai.py with a fixed
+latency, and MQTT is the in-process loopback broker, so no network or API key
+is needed.
+
+``--baseline`` compares p50 per stage with an earlier ``--json`` run and exits
+with status 1 when a stage got slower than ``--tolerance``.
+"""
+from __future__ import annotations
+import argparse, contextlib, glob, io, json, os, random, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_openai import MARKER, FakeOpenAI
+
+STAGES = ["asr", "lang", "gpt", "publish", "tts", "vision", "ingest"]
+UTTERANCES = [
+    "move forward two steps", "turn left ninety degrees", "drive back slowly and then turn right",
+    "fahre zwei Schritte vorwärts", "dreh dich nach links", "iki adım ileri git", "sola dön",
+    "avance de deux pas", "tourne à droite", "avanza tres pasos", "gira a la izquierda",
+    "vai avanti di due passi", "поверни налево", "go in a square with sides of one meter",
+]
+
+def load_wavs(directory: str):
+    import numpy as np
+    import soundfile as sf
+    out = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        audio, rate = sf.read(path, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1)
+        if rate != 16000:   # Whisper's rate; linear resampling is enough for timing
+            n = int(len(audio) * 16000 / rate)
+            audio = np.interp(np.linspace(0, len(audio) - 1, n), np.arange(len(audio)), audio).astype(np.float32)
+        out.append((os.path.basename(path), audio))
+    return out
+
+def load_frames(directory: str, n: int, size: int, seed: int):
+    if directory:
+        paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(directory, f"*.{ext}")))
+        frames = []
+        for p in paths[:n or None]:
+            with open(p, "rb") as f:
+                frames.append((os.path.basename(p), f.read()))
+        return frames
+    rng = random.Random(seed)
+    return [(f"frame_{i:04d}", b"\xff\xd8fake-jpeg" + (MARKER if i % 10 == 9 else b"") + rng.randbytes(size))
+            for i in range(n)]
+
+class Bench:
+    """Per-stage wall time and item counts on top of a private tracing.Tracer."""
+
+    def __init__(self):
+        from tracing import Tracer
+        self.clock = Tracer(enabled=True, jsonl="", prom="")
+        self.walls = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int):
+        print(f"▶️ {name} ({items} items)…", file=sys.stderr)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):   # the pipeline prints per item
+            yield self.clock
+        self.walls[name] = (items, time.perf_counter() - t0)
+
+    def results(self) -> dict:
+        out = {}
+        for name, s in self.clock.summary().items():
+            items, wall = self.walls.get(name, (0, 0.0))
+            out[name] = {**s, "per_s": round(items / wall, 2) if wall else None}
+        return out
+
+def run(args, bench: Bench) -> None:
+    stages = args.stages.split(",")
+    texts = list(UTTERANCES)
+    stc = None
+    if {"asr", "gpt", "publish", "tts"} & set(stages):
+        import speech_to_command as stc
+
+    if "asr" in stages:
+        wavs = load_wavs(args.wav) if args.wav else []
+        if not wavs:
+            print("⚠️ asr skipped: no --wav directory with *.wav files", file=sys.stderr)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                stc.asr_engine.load()                 # load + warm-up are not part of the stage
+            with bench.stage("asr", len(wavs)) as clock:
+                texts = []
+                for name, audio in wavs:
+                    with clock.span("asr"):
+                        rec = stc.recognize_with_whisper(audio)
+                    texts.append(rec.text or name)
+
+    if "lang" in stages:
+        from language import auto_detect_language
+        with bench.stage("lang", len(texts) * args.repeat) as clock:
+            for _ in range(args.repeat):
+                for text in texts:
+                    with clock.span("lang"):
+                        auto_detect_language(text)
+
+    cmds = []
+    if "gpt" in stages:
+        with bench.stage("gpt", len(texts)) as clock:
+            for text in texts:
+                with clock.span("gpt"):
+                    cmds.extend(stc.gpt_commands(text, 0.2) or [])
+        print(f"🧩 Command parse stats: {stc.parse_stats.summary()}", file=sys.stderr)
+
+    if "publish" in stages:
+        cmds = cmds or [{"M1_dir": "cw", "M2_dir": "cw", "speed": 400, "step_size": 120}] * len(texts)
+        n = len(cmds) * args.repeat
+        with bench.stage("publish", n) as clock:
+            for _ in range(args.repeat):
+                for c in cmds:
+                    with clock.span("publish"):
+                        stc.publish_command(stc.to_robot_cmd(c))
+            deadline = time.monotonic() + 5
+            while stc.mqtt_publisher.stats()["inflight"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+        for dt in list(stc.mqtt_publisher.ack_latency)[-n:]:
+            bench.clock.record("publish.ack", dt)
+
+    if "tts" in stages:
+        phrases = texts[:args.tts]
+        with bench.stage("tts", len(phrases)) as clock:
+            for text in phrases:
+                t0 = time.perf_counter()
+                chunks = stc.openai_tts_chunks(text, "en-US")
+                next(chunks)
+                clock.record("tts.first_audio", time.perf_counter() - t0)
+                for _ in chunks:
+                    pass
+                clock.record("tts", time.perf_counter() - t0)
+
+    frames = load_frames(args.frames, args.images, args.frame_bytes, args.seed)
+    if "vision" in stages:
+        import P_detection
+        with bench.stage("vision", len(frames)) as clock:
+            for _, data in frames:
+                with clock.span("vision"):
+                    P_detection.detect_p_with_openai(data)
+
+    if "ingest" in stages:
+        import P_detection
+        from frame_store import FrameStore
+        from image_transport import publish_frame
+        from mac_subscriber import IngestService
+        from mqtt_publisher import MQTT_IMAGE_TOPIC, MqttPublisher
+        robot = MqttPublisher(broker="loopback", client_id="bench-robot").start()
+        host = MqttPublisher(broker="loopback", client_id="bench-host").start()
+        service = IngestService(host, MQTT_IMAGE_TOPIC, workers=args.workers, store=FrameStore(),
+                                detect=P_detection.detect_p_with_openai, on_park=lambda: None)
+        with bench.stage("ingest", len(frames)) as clock:
+            service.start()
+            for _, data in frames:
+                publish_frame(robot, data, MQTT_IMAGE_TOPIC)
+            while True:
+                c = service.stats()
+                if c["detected"] + c["bad"] + c["dropped"] + c["errors"] >= len(frames):
+                    break
+                time.sleep(0.01)
+            service.stop()
+        bench.walls["ingest.total"] = bench.walls.pop("ingest")   # throughput goes on the end-to-end row
+        for k, xs in service.latency.items():
+            for dt in xs:
+                bench.clock.record(f"ingest.{k}", dt)
+        robot.stop(); host.stop()
+
+def compare(results: dict, path: str, tolerance: float) -> bool:
+    with open(path, encoding="utf-8") as f:
+        base = json.load(f)
+    ok = True
+    print(f"\n{'stage':18} {'base p50':>9} {'now p50':>9} {'change':>8}")
+    for name, s in results.items():
+        b = base.get(name)
+        if not b or not b["p50_ms"]:
+            continue
+        change = s["p50_ms"] / b["p50_ms"] - 1
+        slow = change > tolerance
+        ok &= not slow
+        print(f"{name:18} {b['p50_ms']:9.2f} {s['p50_ms']:9.2f} {change:+8.0%}{'  ❌ slower' if slow else ''}")
+    return ok
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stages", default="lang,gpt,publish,tts,vision,ingest", help=f"any of {','.join(STAGES)}")
+    ap.add_argument("--wav", default="", help="directory of recorded *.wav utterances (stage asr)")
+    ap.add_argument("--whisper-model", default=os.getenv("WHISPER_MODEL", "tiny"))
+    ap.add_argument("--frames", default="", help="directory of stored frames (default: seeded dummy frames)")
+    ap.add_argument("--images", type=int, default=40, help="number of frames (0 = all in --frames)")
+    ap.add_argument("--frame-bytes", type=int, default=60000)
+    ap.add_argument("--workers", type=int, default=4, help="ingestion workers")
+    ap.add_argument("--repeat", type=int, default=50, help="passes for the cheap stages (lang, publish)")
+    ap.add_argument("--tts", type=int, default=5, help="phrases to synthesise")
+    ap.add_argument("--latency", type=float, default=0.05, help="fake OpenAI latency (s)")
+    ap.add_argument("--bad-every", type=int, default=0, help="every n-th fake GPT reply is invalid JSON")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default="", help="write results here")
+    ap.add_argument("--baseline", default="", help="earlier --json results to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing")
+    args = ap.parse_args()
+
+    server = FakeOpenAI(0, args.latency, per_image=0.0, bad_every=args.bad_every).start()
+    os.environ.update(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="fake", MQTT_BROKER="loopback",
+                      WHISPER_MODEL=args.whisper_model)
+    import openai
+    openai.base_url, openai.api_key = server.base_url, "fake"
+
+    bench = Bench()
+    run(args, bench)
+    server.shutdown()
+    results = bench.results()
+    print(f"fake OpenAI latency {args.latency}s • MQTT loopback • seed {args.seed}")
+    print(f"{'stage':18} {'n':>6} {'per s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in results.items():
+        per_s = f"{s['per_s']:9.1f}" if s["per_s"] else f"{'–':>9}"
+        print(f"{name:18} {s['n']:6d} {per_s} {s['mean_ms']:9.2f} {s['p50_ms']:9.2f} "
+              f"{s['p95_ms']:9.2f} {s['p99_ms']:9.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
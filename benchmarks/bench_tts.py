@@ -0,0 +1,53 @@
+"""Real-time factor of the local Coqui models per language.
+
+    python benchmarks/bench_tts.py [--langs en-US,de-DE] [--repeat 3]
+
+RTF = synthesis time / audio duration (below 1.0 is faster than real time).
+Model load time is reported separately from synthesis.
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from coqui_pool import COQUI_MODELS, CoquiPool
+
+SAMPLES = {
+    "en-US": "Plan ready. Say execute to run.",
+    "de-DE": "Plan bereit. Sag ausführen, um ihn zu starten.",
+    "tr-TR": "Plan hazır. Çalıştırmak için uygula deyin.",
+    "fr-FR": "Plan prêt. Dites exécuter pour lancer.",
+    "es-ES": "Plan listo. Di ejecutar para empezar.",
+    "it-IT": "Piano pronto. Di esegui per avviare.",
+    "ru-RU": "План готов. Скажите выполнить, чтобы начать.",
+}
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--langs", default=",".join(COQUI_MODELS))
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pool = CoquiPool(budget_mb=float("inf"))
+    print(f"{'lang':7} {'model':45} {'load s':>7} {'synth s':>8} {'audio s':>8} {'RTF':>6}")
+    for lang in args.langs.split(","):
+        text = SAMPLES.get(lang, SAMPLES["en-US"])
+        name, _ = pool.resolve(lang)
+        t0 = time.perf_counter()
+        try:
+            pool.get(lang)
+        except Exception as e:
+            print(f"{lang:7} {name:45} load failed: {e}")
+            continue
+        load_s = time.perf_counter() - t0
+        synth_s = audio_s = 0.0
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for rate, wav in pool.synth(text, lang):
+                audio_s += len(wav) / rate
+            synth_s += time.perf_counter() - t0
+        name, _ = pool.resolve(lang)
+        print(f"{lang:7} {name:45} {load_s:7.2f} {synth_s / args.repeat:8.2f} "
+              f"{audio_s / args.repeat:8.2f} {synth_s / audio_s if audio_s else 0:6.2f}")
+    print(pool.stats())
+
+if __name__ == "__main__":
+    main()
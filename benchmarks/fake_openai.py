@@ -0,0 +1,164 @@
+"""Local stand-in for the OpenAI endpoints this project uses, for offline tests.
+
+    python benchmarks/fake_openai.py [--port 8765] [--latency 0.8] [--per-image 0.1]
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python P_detection.py
+
+POST /v1/chat/completions answers after ``latency + per_image * images``
+seconds. An image counts as a parking sign when its bytes contain ``MARKER``,
+so test images can be any bytes at all. One image gets "YES"/"NO"; several
+get one "<n>: YES|NO" line each, the format P_detection.detect_p_batch asks for.
+Text-only chats get ``chat_reply`` (a robot command list by default), wrapped
+as ``{"commands": …}`` when the request asks for a json_schema response. With
+``bad_every`` = n every n-th text chat gets a truncated reply instead, to
+exercise the repair path.
+
+POST /v1/audio/speech streams ``tts_seconds_per_char`` of silent 24 kHz PCM
+per input character; the first bytes arrive after ``latency``, the rest at
+``tts_realtime`` × real time. POST /v1/embeddings returns a vector derived
+from the input text, so equal texts embed equally.
+"""
+from __future__ import annotations
+import argparse, base64, hashlib, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import numpy as np
+
+MARKER = b"PARKING-SIGN"
+CHAT_REPLY = json.dumps([{"M1_dir": "cw", "M2_dir": "cw", "speed": 400, "step_size": 120}])
+PCM_RATE = 24000
+
+def _images(body: dict) -> List[bytes]:
+    out = []
+    for msg in body.get("messages", []):
+        content = msg.get("content")
+        for part in content if isinstance(content, list) else []:
+            if part.get("type") == "image_url":
+                url = part["image_url"].get("url", "")
+                out.append(base64.b64decode(url.split(",", 1)[1]) if "," in url else b"")
+    return out
+
+def _answer(images: List[bytes]) -> str:
+    says = ["YES" if MARKER in img else "NO" for img in images]
+    if len(says) == 1:
+        return says[0]
+    return "\n".join(f"{i}: {s}" for i, s in enumerate(says, 1))
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.8, per_image: float = 0.1,
+                 chat_reply: str = CHAT_REPLY, tts_seconds_per_char: float = 0.06, tts_realtime: float = 0.0,
+                 bad_every: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency, self.per_image = latency, per_image
+        self.chat_reply, self.bad_every = chat_reply, bad_every
+        self.tts_seconds_per_char, self.tts_realtime = tts_seconds_per_char, tts_realtime
+        self.counts = {"requests": 0, "images": 0, "chats": 0, "speech": 0, "embeddings": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/"   # module-level openai.base_url needs the slash
+
+    def start(self) -> "FakeOpenAI":
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOpenAI
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/audio/speech"):
+            self._speech(body)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self.send_error(404)
+
+    def _count(self, key: str, images: int = 0) -> None:
+        with self.server._lock:
+            self.server.counts["requests"] += 1
+            self.server.counts[key] += 1
+            self.server.counts["images"] += images
+
+    def _chat(self, body: dict) -> None:
+        images = _images(body)
+        self._count("chats", len(images))
+        content = _answer(images) if images else self._text_reply(body)
+        time.sleep(self.server.latency + self.server.per_image * len(images))
+        self._json({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _text_reply(self, body: dict) -> str:
+        reply = self.server.chat_reply
+        if body.get("response_format", {}).get("type") == "json_schema" and reply.lstrip().startswith("["):
+            reply = f'{{"commands": {reply}}}'
+        with self.server._lock:
+            n = self.server.counts["chats"]
+        return reply[:len(reply) // 2] if self.server.bad_every and n % self.server.bad_every == 0 else reply
+
+    def _speech(self, body: dict) -> None:
+        self._count("speech")
+        samples = int(PCM_RATE * self.server.tts_seconds_per_char * len(body.get("input", "")))
+        pcm = bytes(2 * samples)
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/pcm")
+        self.send_header("Content-Length", str(len(pcm)))
+        self.end_headers()
+        step = 2 * PCM_RATE // 10                       # 100 ms of audio per write
+        for off in range(0, len(pcm), step):
+            self.wfile.write(pcm[off:off + step])
+            if self.server.tts_realtime:
+                time.sleep(0.1 * self.server.tts_realtime)
+
+    def _embeddings(self, body: dict) -> None:
+        self._count("embeddings")
+        texts = body.get("input", "")
+        texts = [texts] if isinstance(texts, str) else texts
+        time.sleep(self.server.latency)
+        data = []
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha1(str(text).encode()).digest()[:4], "little")
+            vec = np.random.default_rng(seed).standard_normal(256)
+            data.append({"object": "embedding", "index": i, "embedding": (vec / np.linalg.norm(vec)).tolist()})
+        self._json({"object": "list", "data": data, "model": body.get("model", "fake"),
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+    def _json(self, obj: dict) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:   # keep benchmark output readable
+        pass
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.8)
+    ap.add_argument("--per-image", type=float, default=0.1)
+    ap.add_argument("--chat-reply", default=CHAT_REPLY)
+    ap.add_argument("--bad-every", type=int, default=0, help="every n-th chat reply is invalid JSON")
+    args = ap.parse_args()
+    server = FakeOpenAI(args.port, args.latency, args.per_image, args.chat_reply, bad_every=args.bad_every)
+    print(f"🧪 Fake OpenAI listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
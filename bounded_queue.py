@@ -0,0 +1,15 @@
+"""Bounded queues that shed load instead of blocking the producer."""
+import queue
+from typing import Dict
+
+def put_drop_oldest(q: "queue.Queue", item, counter: Dict[str, int], key: str) -> None:
+    """Bounded put that never blocks the producer (audio callback, MQTT network thread):
+    the oldest entry is dropped instead and ``counter[key]`` is incremented."""
+    while True:
+        try:
+            q.put_nowait(item); return
+        except queue.Full:
+            try:
+                q.get_nowait(); counter[key] += 1
+            except queue.Empty:
+                pass
@@ -0,0 +1,179 @@
+"""Utterance → validated command list cache in front of the GPT step.
+
+Exact lookups use the normalised utterance text plus the detected language.
+Entries expire after a TTL and the least recently used entry is evicted when
+the cache is full. Optionally the cache is persisted to a JSON file, and an
+embedding function enables near-duplicate lookups above a cosine-similarity
+threshold (same language only, and only when the numbers and movement words of
+both utterances match exactly: "forward 10" never reuses "forward 100").
+"""
+from __future__ import annotations
+import json, os, re, threading, time, unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from command_schema import validate
+from fast_parser import command_signature
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+CMD_CACHE_SIZE      = int(os.getenv("CMD_CACHE_SIZE", "512"))
+CMD_CACHE_TTL_S     = float(os.getenv("CMD_CACHE_TTL_S", str(7 * 24 * 3600)))   # 0 = never expire
+CMD_CACHE_PATH      = os.getenv("CMD_CACHE_PATH", "")                            # "" = memory only
+CMD_CACHE_SIM       = float(os.getenv("CMD_CACHE_SIM", "0.93"))                  # cosine threshold
+
+_PUNCT = re.compile(r"[^\w\s°]", re.UNICODE)
+_SPACE = re.compile(r"\s+")
+
+def normalize(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of an utterance."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _SPACE.sub(" ", _PUNCT.sub(" ", text)).strip()
+
+class CommandCache:
+    """LRU + TTL cache of command lists keyed by (normalised text, language)."""
+
+    def __init__(self, max_entries: int = CMD_CACHE_SIZE, ttl: float = CMD_CACHE_TTL_S,
+                 path: str = CMD_CACHE_PATH, embed: Optional[Callable[[str], np.ndarray]] = None,
+                 threshold: float = CMD_CACHE_SIM):
+        self.max_entries, self.ttl, self.path = max_entries, ttl, path
+        self.embed, self.threshold = embed, threshold
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, List[dict]]]" = OrderedDict()
+        self._vecs: Dict[Tuple[str, str], np.ndarray] = {}
+        self._last_query: Optional[Tuple[Tuple[str, str], np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalid": 0}
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, stored: float, now: float) -> bool:
+        return bool(self.ttl) and now - stored > self.ttl
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._data.pop(key, None)
+        self._vecs.pop(key, None)
+
+    def _valid(self, key: Tuple[str, str]) -> bool:
+        """Entries from an old or hand-edited cache file must still match the command schema."""
+        if not validate({"commands": self._data[key][1]}):
+            return True
+        self._drop(key); self.counts["invalid"] += 1
+        return False
+
+    # ── lookup ─────────────────────────────────────────────────────────────
+    def get(self, text: str, lang: str) -> Optional[List[dict]]:
+        key, now = (normalize(text), lang), time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and self._expired(entry[0], now):
+                self._drop(key); self.counts["expired"] += 1; entry = None
+            if entry and self._valid(key):
+                self._data.move_to_end(key)
+                self.counts["hits"] += 1
+                return [dict(c) for c in entry[1]]
+        near = self._nearest(key) if self.embed else None
+        with self._lock:
+            if near is not None and near in self._data and self._valid(near):
+                self._data.move_to_end(near)
+                self.counts["near_hits"] += 1
+                return [dict(c) for c in self._data[near][1]]
+            self.counts["misses"] += 1
+        return None
+
+    def _nearest(self, key: Tuple[str, str]) -> Optional[Tuple[str, str]]:
+        try:
+            q = self._unit(self.embed(key[0]))
+        except Exception as e:
+            print(f"⚠️ Cache embedding failed: {e}")
+            return None
+        self._last_query = (key, q)
+        with self._lock:
+            cands = [(k, v) for k, v in self._vecs.items() if k[1] == key[1]]
+        if not cands:
+            return None
+        sims = np.stack([v for _, v in cands]) @ q
+        sig = command_signature(key[0])
+        for i in np.argsort(-sims):
+            if sims[i] < self.threshold:
+                break
+            near = cands[i][0]
+            if command_signature(near[0]) == sig:
+                print(f"🗂️ Near-duplicate cache hit: '{key[0]}' ≈ '{near[0]}' ({sims[i]:.3f})")
+                return near
+            print(f"🗂️ Near-duplicate '{near[0]}' ({sims[i]:.3f}) skipped: numbers or directions differ")
+        return None
+
+    @staticmethod
+    def _unit(v) -> np.ndarray:
+        v = np.asarray(v, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    # ── insert ─────────────────────────────────────────────────────────────
+    def put(self, text: str, lang: str, cmds: List[dict]) -> None:
+        key = (normalize(text), lang)
+        vec = None
+        if self.embed:
+            if self._last_query and self._last_query[0] == key:
+                vec = self._last_query[1]          # already embedded during the missed lookup
+            else:
+                try:
+                    vec = self._unit(self.embed(key[0]))
+                except Exception as e:
+                    print(f"⚠️ Cache embedding failed: {e}")
+        with self._lock:
+            self._data[key] = (time.time(), [dict(c) for c in cmds])
+            self._data.move_to_end(key)
+            if vec is not None:
+                self._vecs[key] = vec
+            while len(self._data) > self.max_entries:
+                old, _ = self._data.popitem(last=False)
+                self._vecs.pop(old, None)
+                self.counts["evictions"] += 1
+        if self.path:
+            self.save()
+
+    # ── persistence ────────────────────────────────────────────────────────
+    def save(self) -> None:
+        with self._lock:
+            rows = [{"text": k[0], "lang": k[1], "ts": ts, "cmds": cmds,
+                     "vec": self._vecs[k].tolist() if k in self._vecs else None}
+                    for k, (ts, cmds) in self._data.items()]
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save command cache to {self.path}: {e}")
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load command cache from {self.path}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for r in rows:
+                if self._expired(r["ts"], now):
+                    continue
+                key = (r["text"], r["lang"])
+                self._data[key] = (r["ts"], r["cmds"])
+                if r.get("vec") is not None:
+                    self._vecs[key] = np.asarray(r["vec"], dtype=np.float32)
+            while len(self._data) > self.max_entries:
+                old, _ = self._data.popitem(last=False)
+                self._vecs.pop(old, None)
+        print(f"🗂️ Loaded {len(self._data)} cached commands from {self.path}")
+
+    def stats(self) -> dict:
+        lookups = self.counts["hits"] + self.counts["near_hits"] + self.counts["misses"]
+        hits = self.counts["hits"] + self.counts["near_hits"]
+        return {"entries": len(self._data), **self.counts,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
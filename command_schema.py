@@ -0,0 +1,182 @@
+"""Schema, validator and decoder for GPT's robot command replies.
+
+GPT is asked for structured output (``response_format`` json_schema, strict)
+matching COMMAND_SCHEMA: ``{"commands": [{M1_dir, M2_dir, speed, step_size}, …]}``,
+an empty list meaning NO_COMMAND. Replies are decoded in one pass (the first
+JSON value in the text, so fenced or chatty replies from the plain-prompt path
+still work) and checked against a validator compiled once from the same
+schema: types, cw/ccw enums and speed/step ranges. Errors come back as short
+messages that can be fed to GPT for a repair attempt.
+"""
+from __future__ import annotations
+import json, threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+SPEED_MIN, SPEED_MAX = 1, 1000
+STEP_MIN, STEP_MAX   = 1, 10000
+MAX_COMMANDS         = 32
+NO_COMMAND           = "NO_COMMAND"
+
+COMMAND_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "commands": {
+            "type": "array",
+            "description": "Robot moves in order. Empty when the input is not a movement command (NO_COMMAND).",
+            "maxItems": MAX_COMMANDS,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "M1_dir": {"type": "string", "enum": ["cw", "ccw"]},
+                    "M2_dir": {"type": "string", "enum": ["cw", "ccw"]},
+                    "speed": {"type": "integer", "minimum": SPEED_MIN, "maximum": SPEED_MAX},
+                    "step_size": {"type": "integer", "minimum": STEP_MIN, "maximum": STEP_MAX},
+                },
+                "required": ["M1_dir", "M2_dir", "speed", "step_size"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["commands"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT = {"type": "json_schema",
+                   "json_schema": {"name": "robot_commands", "strict": True, "schema": COMMAND_SCHEMA}}
+
+# ═════════════════════ SCHEMA COMPILER ══════════════════════════════════════
+Check = Callable[[object, str, List[str]], None]
+_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "integer": int, "number": (int, float)}
+
+def compile_schema(schema: dict) -> Check:
+    """Turn the JSON-schema subset used here into nested closures (built once, no per-call schema walk)."""
+    kind = schema.get("type")
+    py = _TYPES[kind]
+    checks: List[Check] = []
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+        checks.append(lambda v, at, errs: v in allowed or errs.append(f"{at} must be one of {sorted(allowed)}"))
+    lo, hi = schema.get("minimum"), schema.get("maximum")
+    if lo is not None:
+        checks.append(lambda v, at, errs: v >= lo or errs.append(f"{at} must be ≥ {lo}"))
+    if hi is not None:
+        checks.append(lambda v, at, errs: v <= hi or errs.append(f"{at} must be ≤ {hi}"))
+    if kind == "object":
+        props = {k: compile_schema(s) for k, s in schema.get("properties", {}).items()}
+        required = schema.get("required", [])
+        closed = schema.get("additionalProperties") is False
+
+        def check_object(v, at, errs):
+            for k in required:
+                if k not in v:
+                    errs.append(f"{at}.{k} is missing")
+            for k, item in v.items():
+                if k in props:
+                    props[k](item, f"{at}.{k}", errs)
+                elif closed:
+                    errs.append(f"{at}.{k} is not allowed")
+        checks.append(check_object)
+    elif kind == "array":
+        item_check = compile_schema(schema["items"])
+        max_items = schema.get("maxItems")
+
+        def check_array(v, at, errs):
+            if max_items is not None and len(v) > max_items:
+                errs.append(f"{at} has {len(v)} items, at most {max_items} allowed")
+            for i, item in enumerate(v):
+                item_check(item, f"{at}[{i}]", errs)
+        checks.append(check_array)
+
+    def check(v, at, errs):
+        # bool is an int subclass in Python but not a JSON integer
+        if not isinstance(v, py) or (isinstance(v, bool) and kind != "boolean"):
+            errs.append(f"{at} must be {'an' if kind[0] in 'aeiou' else 'a'} {kind}")
+            return
+        for c in checks:
+            c(v, at, errs)
+    return check
+
+_validate = compile_schema(COMMAND_SCHEMA)
+
+def validate(obj) -> List[str]:
+    """Error messages for ``obj`` against COMMAND_SCHEMA (empty when valid)."""
+    errs: List[str] = []
+    _validate(obj, "$", errs)
+    return errs
+
+# ═════════════════════ DECODER ══════════════════════════════════════════════
+_decoder = json.JSONDecoder()
+
+def _first_json(text: str):
+    """First JSON object/array in ``text`` (plain, fenced or inside prose); raises ValueError."""
+    err = "no JSON object or list in reply"
+    for i, c in enumerate(text):
+        if c in "{[":
+            try:
+                return _decoder.raw_decode(text, i)[0]
+            except json.JSONDecodeError as e:
+                if err.startswith("no "):
+                    err = f"invalid JSON ({e.msg} at char {e.pos})"
+    raise ValueError(err)
+
+def _normalize(obj):
+    """Accept the shapes the plain-prompt path produces: one command, or a bare list."""
+    if isinstance(obj, list):
+        return {"commands": obj}
+    if isinstance(obj, dict) and "commands" not in obj and "M1_dir" in obj:
+        return {"commands": [obj]}
+    return obj
+
+def decode(text: str) -> Tuple[Optional[List[dict]], List[str]]:
+    """Reply text → (commands, errors). ``[]`` is NO_COMMAND; commands is None when there are errors."""
+    text = (text or "").strip()
+    if text == NO_COMMAND:
+        return [], []
+    try:
+        obj = _normalize(_first_json(text))
+    except ValueError as e:
+        return None, [str(e)]
+    errs = validate(obj)
+    return (None, errs) if errs else (obj["commands"], [])
+
+def repair_prompt(errors: List[str]) -> str:
+    shown = "; ".join(errors[:8]) + (f" (+{len(errors) - 8} more)" if len(errors) > 8 else "")
+    return (f"Your reply was not a valid command list: {shown}. "
+            f"Reply again with only JSON matching the schema, or an empty commands list if this is not a movement command.")
+
+# ═════════════════════ METRICS ══════════════════════════════════════════════
+class ParseStats:
+    """How often GPT replies decode and validate, and how many repair round trips that took."""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {"turns": 0, "replies": 0, "valid": 0, "no_command": 0, "repaired": 0,
+                                       "retries": 0, "failed": 0, "decode_errors": 0, "schema_errors": 0,
+                                       "refusals": 0}
+        self._lock = threading.Lock()
+
+    def reply(self, errors: List[str], refusal: bool = False) -> None:
+        with self._lock:
+            self.counts["replies"] += 1
+            if refusal:
+                self.counts["refusals"] += 1
+            elif errors:   # validator messages start with the JSON path "$…", decoder messages do not
+                self.counts["schema_errors" if errors[0].startswith("$") else "decode_errors"] += 1
+
+    def turn(self, cmds: Optional[List[dict]], attempts: int) -> None:
+        with self._lock:
+            self.counts["turns"] += 1
+            self.counts["retries"] += attempts - 1
+            if cmds is None:
+                self.counts["failed"] += 1
+                return
+            self.counts["valid"] += 1
+            if not cmds:
+                self.counts["no_command"] += 1
+            if attempts > 1:
+                self.counts["repaired"] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            c = dict(self.counts)
+        return {**c, "failure_rate": round(c["failed"] / c["turns"], 3) if c["turns"] else 0.0,
+                "retries_per_turn": round(c["retries"] / c["turns"], 3) if c["turns"] else 0.0}
@@ -0,0 +1,143 @@
+"""Runs a motor-command plan step by step, paced by the robot instead of a fixed sleep.
+
+Each step waits for a completion message on ``ROBOT_ACK_TOPIC`` (any payload
+counts as "previous command finished"). With ``subscribe=False`` the caller
+routes ack messages to ``on_ack`` itself (fleet.py does this for many robots
+over one wildcard subscription). Without an ack topic, or when an ack
+does not arrive in time, the wait falls back to a duration estimated from
+``step_size`` / ``speed``. Plans run on a background thread and can be
+cancelled at any point between steps.
+"""
+from __future__ import annotations
+import collections, os, threading, time
+from typing import Deque, Dict, List, Optional
+from mqtt_publisher import MQTT_TOPIC, MqttPublisher
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+ROBOT_ACK_TOPIC = os.getenv("ROBOT_ACK_TOPIC", "")                 # e.g. "txt4/ack"; empty = estimate only
+SEQ_TIME_SCALE  = float(os.getenv("SEQ_TIME_SCALE", "1.0"))        # seconds per (step_size / speed)
+SEQ_SETTLE_S    = float(os.getenv("SEQ_SETTLE_S", "0.15"))         # motor stop + message transit
+SEQ_ACK_GRACE   = float(os.getenv("SEQ_ACK_GRACE", "1.0"))         # extra wait for an ack past the estimate
+DEFAULT_SPEED   = 300
+
+def estimate_duration(cmd: dict) -> float:
+    """Expected run time of one command, assuming ``speed`` is in steps per second."""
+    speed = float(cmd.get("speed") or DEFAULT_SPEED)
+    steps = float(cmd.get("step_size") or 0)
+    return SEQ_TIME_SCALE * steps / max(speed, 1.0) + SEQ_SETTLE_S
+
+class CommandSequencer:
+    """Publishes plan steps one at a time and waits for each to finish."""
+
+    def __init__(self, publisher: MqttPublisher, topic: str = MQTT_TOPIC,
+                 ack_topic: str = ROBOT_ACK_TOPIC, subscribe: bool = True, name: str = "command-sequencer"):
+        self.publisher = publisher
+        self.topic = topic
+        self.ack_topic = ack_topic
+        self.name = name
+        self.counts = {"plans": 0, "completed": 0, "cancelled": 0, "steps": 0,
+                       "acked": 0, "ack_timeouts": 0}
+        self.step_error: Deque[float] = collections.deque(maxlen=200)   # actual − estimated (acked steps)
+        self._acks = 0
+        self._wake = threading.Condition()
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._busy_until = 0.0    # robot is assumed to be moving until this monotonic time
+        if ack_topic and subscribe:
+            publisher.subscribe(ack_topic, self.on_ack)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def on_ack(self, msg) -> None:
+        with self._wake:
+            self._acks += 1
+            self._wake.notify_all()
+
+    # ── control ────────────────────────────────────────────────────────────
+    def start(self, cmds: List[dict]) -> threading.Thread:
+        """Run ``cmds`` in the background; a plan that is still running is cancelled first."""
+        if self.running:
+            self.cancel()
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self.run, args=(list(cmds),),
+                                        name=self.name, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def cancel(self, wait: bool = True) -> bool:
+        """Stop sending further steps. The step already sent is allowed to finish."""
+        if not self.running:
+            return False
+        self._cancel.set()
+        with self._wake:
+            self._wake.notify_all()
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    # ── execution ──────────────────────────────────────────────────────────
+    def run(self, cmds: List[dict]) -> bool:
+        """Execute the plan in the calling thread. Returns False if it was cancelled."""
+        self.counts["plans"] += 1
+        # never overlap the tail of a previous (cancelled) plan
+        if not self._sleep(self._busy_until - time.monotonic()):
+            return self._cancelled(0, len(cmds))
+        for i, cmd in enumerate(cmds, 1):
+            if self._cancel.is_set():
+                return self._cancelled(i - 1, len(cmds))
+            est = estimate_duration(cmd)
+            with self._wake:
+                acks_before = self._acks
+            t0 = time.monotonic()
+            self._busy_until = t0 + est
+            self.publisher.publish(cmd, self.topic)
+            self.counts["steps"] += 1
+            print(f"🤖 Step {i}/{len(cmds)} sent: {cmd} (≈{est:.2f}s)")
+            if self.ack_topic:
+                done = self._wait_ack(acks_before, est + SEQ_ACK_GRACE)
+                if done:
+                    actual = time.monotonic() - t0
+                    self.counts["acked"] += 1
+                    self.step_error.append(actual - est)
+                    self._busy_until = time.monotonic()
+                    continue
+                if self._cancel.is_set():
+                    return self._cancelled(i, len(cmds))
+                self.counts["ack_timeouts"] += 1
+                print(f"⚠️ No completion ack for step {i} within {est + SEQ_ACK_GRACE:.2f}s")
+            elif not self._sleep(self._busy_until - time.monotonic()):
+                return self._cancelled(i, len(cmds))
+        self.counts["completed"] += 1
+        print(f"✅ Plan finished ({len(cmds)} steps)")
+        return True
+
+    def _wait_ack(self, acks_before: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._wake:
+            while self._acks == acks_before and not self._cancel.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._wake.wait(remaining)
+            return self._acks != acks_before
+
+    def _sleep(self, seconds: float) -> bool:
+        """Cancellable sleep; False if the plan was cancelled meanwhile."""
+        return seconds <= 0 or not self._cancel.wait(seconds)
+
+    def _cancelled(self, sent: int, total: int) -> bool:
+        self.counts["cancelled"] += 1
+        print(f"🛑 Plan cancelled after {sent}/{total} steps")
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        err = list(self.step_error)
+        return {**self.counts, "running": self.running,
+                "ack_minus_estimate_mean_s": round(sum(err) / len(err), 3) if err else 0.0}
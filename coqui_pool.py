@@ -0,0 +1,217 @@
+"""Offline Coqui TTS engine: a pool of loaded models under a memory budget.
+
+Models are loaded lazily (or eagerly with ``preload``) and shared by name,
+so every language that maps to ``MULTI_SPKR_MODEL`` uses one instance with a
+per-language speaker from ``SPK_MAP``. When the next load would exceed
+``COQUI_MEMORY_MB`` the least recently used idle model is evicted.
+"""
+from __future__ import annotations
+import collections, gc, importlib.util, os, threading, time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, Optional, Tuple
+import numpy as np
+from startup import lazy_module
+if TYPE_CHECKING:
+    from TTS.api import TTS
+
+tts_api = lazy_module("TTS.api")   # pulls in torch; imported when the first model loads
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+COQUI_MODELS: Dict[str, Tuple[str, Optional[str]]] = {
+    "en-US": ("tts_models/en/ljspeech/tacotron2-DDC", None),
+    "de-DE": ("tts_models/de/thorsten/tacotron2-DDC", None),
+    "tr-TR": ("tts_models/tr/common-voice/glow-tts", None),
+    "fr-FR": ("tts_models/fr/css10/vits", None),
+    "es-ES": ("tts_models/es/mai/tacotron2-DDC", None),
+    "it-IT": ("tts_models/multilingual/multi-dataset/your_tts", "it_0"),
+    "ru-RU": ("tts_models/ru/ru_v3", None),
+}
+MULTI_SPKR_MODEL = "tts_models/multilingual/multi-dataset/your_tts"
+SPK_MAP = {"it-IT": "it_0", "fr-FR": "fr_0", "tr-TR": "tr_0",
+           "en-US": "en_0", "de-DE": "de_0", "es-ES": "es_0", "ru-RU": "ru_0"}
+
+# Optional loudness match for Coqui vs OpenAI (dB)
+COQUI_GAIN_DB   = float(os.getenv("COQUI_GAIN_DB", "0"))
+COQUI_MEMORY_MB = float(os.getenv("COQUI_MEMORY_MB", "1500"))
+COQUI_GPU       = os.getenv("COQUI_GPU", "0") == "1"
+DEFAULT_MODEL_MB = 350.0   # size assumed for a model that has not been loaded yet
+
+class _Slot:
+    def __init__(self, tts: "TTS", size_mb: float, load_s: float):
+        self.tts, self.size_mb, self.load_s = tts, size_mb, load_s
+        self.users = 0
+        self.lock = threading.Lock()   # Coqui models are not thread-safe
+
+def _model_mb(tts: "TTS") -> float:
+    try:
+        params = tts.synthesizer.tts_model.parameters()
+        return sum(p.numel() * p.element_size() for p in params) / 2**20
+    except Exception:
+        return DEFAULT_MODEL_MB
+
+class CoquiPool:
+    def __init__(self, models: Dict[str, Tuple[str, Optional[str]]] = COQUI_MODELS,
+                 multi_model: str = MULTI_SPKR_MODEL, spk_map: Dict[str, str] = SPK_MAP,
+                 budget_mb: float = COQUI_MEMORY_MB, gain_db: float = COQUI_GAIN_DB,
+                 gpu: bool = COQUI_GPU):
+        self.models, self.multi_model, self.spk_map = models, multi_model, spk_map
+        self.budget_mb, self.gpu = budget_mb, gpu
+        self.gain = 10 ** (gain_db / 20)
+        self._slots: "OrderedDict[str, _Slot]" = OrderedDict()   # model name → slot, LRU order
+        self._known_mb: Dict[str, float] = {}
+        self._failed: set = set()
+        self._installed: Optional[bool] = None
+        self._lock = threading.Lock()                               # registry, LRU order and users only
+        self._loading: Dict[str, threading.Lock] = {}               # one load at a time per model
+        self._reserved: Dict[str, float] = {}                       # MB of models being loaded
+        self.counts = {"loads": 0, "evictions": 0, "load_failures": 0}
+        self.rtf: Dict[str, Deque[float]] = collections.defaultdict(lambda: collections.deque(maxlen=50))
+
+    # ── model selection ────────────────────────────────────────────────────
+    def resolve(self, lang: str) -> Tuple[str, Optional[str]]:
+        """(model name, speaker) for a language; the multi-speaker model is shared via SPK_MAP."""
+        name, spk = self.models.get(lang, (self.multi_model, None))
+        if name in self._failed:
+            name, spk = self.multi_model, None
+        if name == self.multi_model and spk is None:
+            spk = self.spk_map.get(lang, "en_0")
+        return name, spk
+
+    @property
+    def used_mb(self) -> float:
+        return sum(s.size_mb for s in self._slots.values())
+
+    def _evict_for(self, need_mb: float) -> None:
+        for name in list(self._slots):
+            if self.used_mb + sum(self._reserved.values()) + need_mb <= self.budget_mb:
+                return
+            slot = self._slots[name]
+            if slot.users == 0:
+                del self._slots[name]
+                self.counts["evictions"] += 1
+                print(f"♻️ Coqui evicted idle model {name} ({slot.size_mb:.0f} MB)")
+                del slot
+                gc.collect()
+
+    def _checkout_loaded(self, name: str) -> Optional[_Slot]:
+        with self._lock:
+            slot = self._slots.get(name)
+            if slot is not None:
+                self._slots.move_to_end(name)
+                slot.users += 1
+            return slot
+
+    def _acquire(self, name: str) -> _Slot:
+        """Loaded slot for ``name``. Loading runs outside ``_lock``, so other models stay usable."""
+        slot = self._checkout_loaded(name)
+        if slot is not None:
+            return slot
+        with self._lock:
+            load_lock = self._loading.setdefault(name, threading.Lock())
+        with load_lock:
+            slot = self._checkout_loaded(name)     # loaded by another thread while we waited
+            if slot is not None:
+                return slot
+            with self._lock:
+                need = self._known_mb.get(name, DEFAULT_MODEL_MB)
+                self._evict_for(need)
+                self._reserved[name] = need
+            try:
+                t0 = time.perf_counter()
+                tts = tts_api.TTS(name, progress_bar=False, gpu=self.gpu)
+                load_s = time.perf_counter() - t0
+                slot = _Slot(tts, _model_mb(tts), load_s)
+            finally:
+                with self._lock:
+                    self._reserved.pop(name, None)
+            with self._lock:
+                self._known_mb[name] = slot.size_mb
+                self._slots[name] = slot
+                slot.users += 1
+                self.counts["loads"] += 1
+                print(f"🧩 Coqui loaded {name} in {load_s:.1f}s ({slot.size_mb:.0f} MB, "
+                      f"pool {self.used_mb:.0f}/{self.budget_mb:.0f} MB)")
+            return slot
+
+    def _release(self, slot: _Slot) -> None:
+        with self._lock:
+            slot.users -= 1
+
+    def _checkout(self, lang: str) -> Tuple[_Slot, Optional[str]]:
+        name, spk = self.resolve(lang)
+        try:
+            return self._acquire(name), spk
+        except Exception as e:
+            if name == self.multi_model:
+                self._failed.add(name)
+                raise
+            print("⚠️  Coqui load failed, using multilingual model →", e)
+            self._failed.add(name)
+            self.counts["load_failures"] += 1
+            name, spk = self.resolve(lang)
+            return self._acquire(name), spk
+
+    def usable(self) -> bool:
+        """A model is loaded, or the TTS package is installed and the multilingual model has not failed."""
+        if self._slots:
+            return True
+        if self._installed is None:
+            self._installed = importlib.util.find_spec("TTS") is not None
+        return self._installed and self.multi_model not in self._failed
+
+    def get(self, lang: str) -> Tuple["TTS", Optional[str]]:
+        """Loaded model and speaker for ``lang``, falling back to the multilingual model."""
+        slot, spk = self._checkout(lang)
+        self._release(slot)
+        return slot.tts, spk
+
+    def preload(self, langs: Iterable[str]) -> threading.Thread:
+        """Load models for ``langs`` on a background thread (stops at the memory budget)."""
+        def run():
+            for lang in langs:
+                name, _ = self.resolve(lang)
+                if name in self._slots:
+                    continue
+                if self.used_mb + self._known_mb.get(name, DEFAULT_MODEL_MB) > self.budget_mb:
+                    print(f"⏭️ Coqui preload stopped at {lang}: memory budget reached")
+                    return
+                try:
+                    self.get(lang)
+                except Exception as e:
+                    print(f"⚠️ Coqui preload failed for {lang}: {e}")
+        t = threading.Thread(target=run, name="coqui-preload", daemon=True)
+        t.start()
+        return t
+
+    # ── synthesis ──────────────────────────────────────────────────────────
+    def synth(self, text: str, lang: str):
+        """tts_stream.Synth: one float32 chunk per sentence (Coqui does not stream)."""
+        slot, spk = self._checkout(lang)
+        tts = slot.tts
+        try:
+            kwargs = {}
+            if getattr(tts, "is_multi_speaker", False):
+                speakers = getattr(tts, "speakers", None) or []
+                kwargs["speaker"] = spk if not speakers or spk in speakers else speakers[0]
+            if getattr(tts, "is_multi_lingual", False):
+                langs = getattr(tts, "languages", None) or []
+                short = lang.split("-")[0].lower()
+                kwargs["language"] = next((l for l in langs if l.split("-")[0] == short),
+                                          langs[0] if langs else short)
+            t0 = time.perf_counter()
+            with slot.lock:
+                wav = np.asarray(tts.tts(text=text, **kwargs), dtype=np.float32)
+            dt = time.perf_counter() - t0
+        finally:
+            self._release(slot)
+        rate = tts.synthesizer.output_sample_rate
+        if len(wav):
+            self.rtf[lang].append(dt / (len(wav) / rate))
+        if self.gain != 1.0:
+            wav = np.clip(wav * self.gain, -1.0, 1.0)
+        yield rate, wav
+
+    def stats(self) -> dict:
+        return {"loaded": {n: round(s.size_mb) for n, s in self._slots.items()},
+                "used_mb": round(self.used_mb), "budget_mb": self.budget_mb, "usable": self.usable(), **self.counts,
+                "rtf": {l: round(sum(v) / len(v), 3) for l, v in self.rtf.items() if v}}
@@ -0,0 +1,237 @@
+"""Deterministic fast path for common movement commands.
+
+Turns phrases such as "go forward 100 steps", "turn left 90 degrees",
+"dön 180 derece" or "bir tam tur at" straight into the
+``M1_dir/M2_dir/speed/step_size`` command list, using the same mappings as
+SYSTEM_PROMPT (68 steps per 90° of turn, cw/ccw for a left or undirected
+turn). A clause is only accepted when every word in it is understood and the
+result passes command_schema.validate (cw/ccw, speed and step ranges);
+anything else returns None so the caller falls back to GPT.
+"""
+from __future__ import annotations
+import collections, re, time
+from typing import Deque, Dict, List, Optional, Tuple
+from command_schema import validate
+
+DEFAULT_SPEED = 300
+STEPS_PER_90  = 68
+FULL_TURN     = 4 * STEPS_PER_90
+
+# ═════════════════════ VOCABULARY (en / tr / de / fr / es / it / ru) ════════
+_WORDS: Dict[str, Tuple[str, ...]] = {
+    "forward":  ("forward", "forwards", "ahead", "straight", "ileri", "düz", "vorwärts", "vorwaerts",
+                 "geradeaus", "vor", "avant", "avance", "avancer", "adelante", "avanza", "avanzar",
+                 "avanti", "вперёд", "вперед"),
+    "backward": ("back", "backward", "backwards", "reverse", "geri", "rückwärts", "zurück", "arrière",
+                 "recule", "reculer", "atrás", "retrocede", "indietro", "назад"),
+    "left":     ("left", "sol", "sola", "links", "gauche", "izquierda", "sinistra", "налево", "влево"),
+    "right":    ("right", "sağ", "sağa", "rechts", "droite", "derecha", "destra", "направо", "вправо"),
+    "turn":     ("turn", "rotate", "dön", "döndür", "dreh", "drehe", "drehen", "tourne", "tourner",
+                 "gira", "girar", "girare", "повернуть", "поверни", "повернись", "развернись"),
+    "around":   ("around", "spin", "um"),
+    "steps":    ("step", "steps", "adım", "schritt", "schritte", "pas", "paso", "pasos", "passo",
+                 "passi", "шаг", "шага", "шагов"),
+    "degrees":  ("degree", "degrees", "°", "derece", "grad", "degré", "degrés", "grado", "grados",
+                 "gradi", "градус", "градуса", "градусов"),
+    "times":    ("times", "time", "kez", "kere", "defa", "mal", "fois", "veces", "vez", "volte",
+                 "volta", "раз", "раза"),
+    "then":     ("then", "and", "after", "that", "sonra", "ve", "daha", "dann", "und", "danach", "puis",
+                 "et", "ensuite", "luego", "y", "después", "poi", "e", "quindi", "затем", "потом", "и"),
+    "filler":   ("please", "can", "could", "would", "you", "go", "move", "drive", "the", "a", "by",
+                 "robot", "now", "make", "do", "lütfen", "git", "hareket", "et", "ilerle", "at", "yap",
+                 "misin", "mısın", "musun", "müsün", "bitte", "kannst", "du", "gehen", "geh", "fahr",
+                 "fahre", "fahren", "mach", "mache", "nach", "va", "vas", "aller", "fais", "faire",
+                 "peux", "tu", "de", "à", "ir", "dich", "sich", "muévete", "mueve", "hacia", "la", "puedes",
+                 "vai", "muoviti", "muovi", "di", "puoi", "пожалуйста", "иди", "двигайся", "езжай",
+                 "на", "робот"),
+}
+# multi-word phrases are rewritten to single marker tokens before tokenising
+_PHRASES: List[Tuple[str, str]] = [
+    (p, m) for m, ps in {
+        " _full ": ("full turn", "full circle", "full rotation", "whole turn", "tam tur", "tam bir tur",
+                    "volle drehung", "ganze drehung", "tour complet", "vuelta completa", "giro completo",
+                    "полный оборот", "полный круг"),
+        " _half ": ("half turn", "yarım tur", "halbe drehung", "demi-tour", "demi tour", "media vuelta",
+                    "mezzo giro", "пол-оборота", "полоборота"),
+        " _quarter ": ("quarter turn", "çeyrek tur", "vierteldrehung", "quart de tour", "cuarto de vuelta",
+                       "quarto di giro", "четверть оборота"),
+        " ": ("s'il vous plaît", "s'il te plaît", "por favor", "per favore", "is it possible to",
+              "can you", "could you"),
+    }.items() for p in ps
+]
+_PHRASES.sort(key=lambda pm: -len(pm[0]))
+_KIND = {w: kind for kind, ws in _WORDS.items() for w in ws}
+_KIND.update({"_full": "full", "_half": "half", "_quarter": "quarter"})
+
+_NUM_WORDS = {
+    # en
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "hundred": 100, "once": 1, "twice": 2,
+    # tr
+    "bir": 1, "iki": 2, "üç": 3, "dört": 4, "beş": 5, "altı": 6, "yedi": 7, "sekiz": 8, "dokuz": 9,
+    "on": 10, "yirmi": 20, "otuz": 30, "kırk": 40, "elli": 50, "yüz": 100,
+    # de
+    "ein": 1, "eine": 1, "eins": 1, "einmal": 1, "zwei": 2, "drei": 3, "vier": 4, "fünf": 5,
+    "sechs": 6, "sieben": 7, "acht": 8, "neun": 9, "zehn": 10, "zwanzig": 20, "fünfzig": 50, "hundert": 100,
+    # fr
+    "un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4, "cinq": 5, "sept": 7, "huit": 8,
+    "neuf": 9, "dix": 10, "vingt": 20, "cinquante": 50, "cent": 100,
+    # es / it
+    "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "diez": 10, "cien": 100, "ciento": 100,
+    "due": 2, "tre": 3, "quattro": 4, "cinque": 5, "dieci": 10, "cento": 100,
+    # ru
+    "один": 1, "одна": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5, "десять": 10, "сто": 100,
+}
+_REPEAT = {"once", "twice", "einmal"}   # a count that also means "times"
+_TOKEN = re.compile(r"-?\d+|°|[^\W\d_]+|_\w+")   # "-100" stays one (rejected) token
+
+# ═════════════════════ PARSER ═══════════════════════════════════════════════
+def _tokens(text: str) -> List[str]:
+    low = f" {text.lower()} "
+    for phrase, marker in _PHRASES:
+        if phrase in low:
+            low = low.replace(phrase, marker)
+    return _TOKEN.findall(low)
+
+def _cmd(m1: str, m2: str, steps: int) -> dict:
+    return {"M1_dir": m1, "M2_dir": m2, "speed": DEFAULT_SPEED, "step_size": steps}
+
+def _clause(tokens: List[Tuple[str, Optional[int]]]) -> Optional[dict]:
+    """One movement from (kind, number) tokens, or None if it is not unambiguous."""
+    kinds = [k for k, _ in tokens if k != "filler"]
+    nums = [n for k, n in tokens if k == "num"]
+    if len(nums) > 2:
+        return None
+    has = lambda k: k in kinds
+    amount = nums[0] if nums else None
+
+    if has("forward") or has("backward"):
+        # "go forward twice / 3 times": a repeat count, not a step count → GPT
+        if has("forward") == has("backward") or has("left") or has("right") or has("degrees") \
+                or has("turn") or has("times") or amount is None or len(nums) > 1:
+            return None
+        m = "cw" if has("forward") else "ccw"
+        return _cmd(m, m, amount)
+
+    if not (has("turn") or has("left") or has("right") or has("around") or has("full")
+            or has("half") or has("quarter")) or has("steps") or (has("left") and has("right")):
+        return None
+    m1, m2 = ("ccw", "cw") if has("right") else ("cw", "ccw")
+    if has("degrees"):
+        if amount is None or len(nums) > 1:
+            return None
+        return _cmd(m1, m2, round(amount * STEPS_PER_90 / 90))
+    sized = has("full") or has("half") or has("quarter")
+    if len(nums) > 1 or (nums and not (has("times") or sized)) or (has("times") and not nums):
+        return None
+    if has("around") and not (nums or sized):
+        return None              # "turn around" alone: 180° or 360°? let GPT decide
+    times = nums[0] if nums else 1
+    if has("full") or has("around"):
+        return _cmd(m1, m2, FULL_TURN * times)
+    if has("half"):
+        return _cmd(m1, m2, FULL_TURN // 2 * times)
+    if has("quarter") or has("left") or has("right"):
+        return _cmd(m1, m2, STEPS_PER_90 * times)
+    return None
+
+def parse_command(text: str, lang: Optional[str] = None) -> Optional[List[dict]]:
+    """Command list for a plain movement request, or None when GPT should handle it.
+
+    ``lang`` (e.g. from Whisper's language ID) resolves words that mean different
+    things in different languages; None keeps the language-agnostic rules.
+    """
+    clauses: List[List[Tuple[str, Optional[int]]]] = [[]]
+    pending_num: List[int] = []
+    def flush_num():
+        if pending_num:
+            clauses[-1].append(("num", _number(pending_num))); pending_num.clear()
+    toks = _tokens(text)
+    for i, tok in enumerate(toks):
+        if tok.isdigit():
+            if pending_num:
+                return None
+            clauses[-1].append(("num", int(tok))); continue
+        if tok in _NUM_WORDS and (tok != "on" or (lang in (None, "tr-TR") and _counts_something(toks[i + 1:i + 2]))):
+            pending_num.append(_NUM_WORDS[tok])
+            if tok in _REPEAT:
+                flush_num(); clauses[-1].append(("times", None))
+            continue
+        flush_num()
+        kind = _KIND.get(tok)
+        if kind is None:
+            return None          # unknown word → not confident
+        if kind == "then":
+            if clauses[-1]:
+                clauses.append([])
+            continue
+        clauses[-1].append((kind, None))
+    flush_num()
+    cmds = []
+    for cl in clauses:
+        if not cl:
+            continue
+        cmd = _clause(cl)
+        if cmd is None:
+            return None
+        cmds.append(cmd)
+    if not cmds or validate({"commands": cmds}):   # e.g. 0 or 99999999 steps
+        return None
+    return cmds
+
+def _number(words: List[int]) -> int:
+    total = 0
+    for v in words:
+        total = (total or 1) * v if v == 100 else total + v
+    return total
+
+def _counts_something(nxt: List[str]) -> bool:
+    # "on" is Turkish "ten" only when a unit or another number follows ("on adım", "on beş")
+    return bool(nxt) and (nxt[0] in _NUM_WORDS or _KIND.get(nxt[0]) in ("steps", "degrees", "times"))
+
+_SIGNATURE_KINDS = {"forward", "backward", "left", "right", "turn", "around", "steps", "degrees", "times",
+                    "full", "half", "quarter"}
+
+def command_signature(text: str) -> Tuple:
+    """Numbers and movement words of ``text`` in order (synonyms folded to their kind, fillers
+    dropped): two phrasings mean the same command only if their signatures are equal."""
+    sig = []
+    for tok in _tokens(text):
+        if tok.lstrip("-").isdigit():
+            sig.append(int(tok))
+        elif tok in _NUM_WORDS:
+            sig.append(_NUM_WORDS[tok])
+        elif _KIND.get(tok) in _SIGNATURE_KINDS:
+            sig.append(_KIND[tok])
+    return tuple(sig)
+
+# ═════════════════════ METRICS ══════════════════════════════════════════════
+class FastPathStats:
+    """Hit rate of the fast path and the GPT round-trip time it avoided."""
+
+    def __init__(self, window: int = 100):
+        self.attempts = 0
+        self.hits = 0
+        self.parse_s = 0.0
+        self.gpt_latency: Deque[float] = collections.deque(maxlen=window)
+
+    def parse(self, text: str, lang: Optional[str] = None) -> Optional[List[dict]]:
+        t0 = time.perf_counter()
+        cmds = parse_command(text, lang)
+        self.parse_s += time.perf_counter() - t0
+        self.attempts += 1
+        self.hits += cmds is not None
+        return cmds
+
+    def record_gpt(self, seconds: float) -> None:
+        self.gpt_latency.append(seconds)
+
+    def summary(self) -> dict:
+        gpt_mean = sum(self.gpt_latency) / len(self.gpt_latency) if self.gpt_latency else 0.0
+        return {
+            "attempts": self.attempts, "hits": self.hits,
+            "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else 0.0,
+            "parse_mean_us": round(1e6 * self.parse_s / self.attempts, 1) if self.attempts else 0.0,
+            "gpt_mean_s": round(gpt_mean, 3),
+            "saved_s": round(self.hits * gpt_mean, 2),
+        }
@@ -0,0 +1,213 @@
+"""Several TXT 4.0 robots from one process, over one MQTT connection.
+
+Every robot has its own topic namespace:
+
+    txt4/<robot_id>/action   motor commands to the robot
+    txt4/<robot_id>/image    camera frames from the robot (image_transport format)
+    txt4/<robot_id>/ack      step-completion acks (FLEET_ACKS=1, for robots that send them)
+
+Robots are listed in FLEET_ROBOTS (comma-separated ids); with
+FLEET_AUTO_REGISTER=1 a robot is also added the first time it sends a frame
+or an ack. The fleet subscribes once to ``txt4/+/image`` and ``txt4/+/ack``
+on the shared publisher and routes each message by its id segment, so the
+number of subscriptions does not grow with the class size.
+
+Each robot gets its own CommandSequencer (plans run concurrently, one thread
+per robot) and its own ingestion pipeline (IngestService with its own queue,
+workers and frame store), so one busy camera cannot hold up another robot.
+"""
+from __future__ import annotations
+import os, re, threading, time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+from command_sequencer import CommandSequencer
+from frame_store import FRAME_SPILL_DIR, FrameStore
+from mqtt_publisher import MqttPublisher, get_publisher
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+FLEET_ROBOTS         = [r.strip() for r in os.getenv("FLEET_ROBOTS", "").split(",") if r.strip()]
+FLEET_AUTO_REGISTER  = os.getenv("FLEET_AUTO_REGISTER", "0") == "1"
+FLEET_PREFIX         = os.getenv("FLEET_PREFIX", "txt4")
+FLEET_INGEST_WORKERS = int(os.getenv("FLEET_INGEST_WORKERS", "2"))   # per robot
+FLEET_ACKS           = os.getenv("FLEET_ACKS", "0") == "1"           # pace plans by txt4/<id>/ack; off = estimate only
+FLEET_ENABLED        = bool(FLEET_ROBOTS) or FLEET_AUTO_REGISTER
+
+_ROBOT_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")    # one topic level, no MQTT wildcards
+
+def robot_topic(robot_id: str, kind: str, prefix: str = FLEET_PREFIX) -> str:
+    """``txt4/<robot_id>/<kind>`` for kind = action / image / ack."""
+    return f"{prefix}/{robot_id}/{kind}"
+
+@dataclass
+class Robot:
+    robot_id: str
+    action_topic: str
+    sequencer: CommandSequencer
+    ingest: Optional[object] = None             # mac_subscriber.IngestService once ingestion runs
+    added: float = field(default_factory=time.monotonic)
+    last_seen: float = 0.0
+    counts: Dict[str, int] = field(default_factory=lambda: {"frames": 0, "acks": 0, "commands": 0})
+
+class Fleet:
+    """Robot registry with per-robot topics, multiplexed over one MqttPublisher.
+
+    ``start``/``cancel``/``running``/``stats`` match CommandSequencer, so a
+    fleet can stand in for the single sequencer: a plan then goes to every
+    robot at once.
+    """
+
+    def __init__(self, publisher: Optional[MqttPublisher] = None, robots: Iterable[str] = FLEET_ROBOTS,
+                 auto_register: bool = FLEET_AUTO_REGISTER, prefix: str = FLEET_PREFIX,
+                 acks: bool = FLEET_ACKS):
+        self.publisher = publisher or get_publisher()
+        self.auto_register, self.prefix, self.acks = auto_register, prefix, acks
+        self._robots: Dict[str, Robot] = {}
+        self._lock = threading.RLock()
+        self._ingest_factory: Optional[Callable[[str], object]] = None
+        self.counts = {"unknown": 0, "dispatches": 0}
+        for rid in robots:
+            self.add(rid)
+        self.publisher.subscribe(f"{prefix}/+/ack", self._on_ack)
+
+    # ── registry ───────────────────────────────────────────────────────────
+    def add(self, robot_id: str) -> Robot:
+        if not _ROBOT_ID.match(robot_id):
+            raise ValueError(f"invalid robot id {robot_id!r} (letters, digits, '_', '-', '.' only)")
+        with self._lock:
+            robot = self._robots.get(robot_id)
+            if robot is not None:
+                return robot
+            seq = CommandSequencer(self.publisher, robot_topic(robot_id, "action", self.prefix),
+                                   ack_topic=robot_topic(robot_id, "ack", self.prefix) if self.acks else "",
+                                   subscribe=False, name=f"sequencer-{robot_id}")
+            robot = self._robots[robot_id] = Robot(robot_id, seq.topic, seq)
+            if self._ingest_factory is not None:
+                robot.ingest = self._ingest_factory(robot_id).start()
+        print(f"🤖 Robot '{robot_id}' registered ({self.prefix}/{robot_id}/…)")
+        return robot
+
+    def remove(self, robot_id: str) -> None:
+        with self._lock:
+            robot = self._robots.pop(robot_id, None)
+        if robot is not None:
+            robot.sequencer.cancel()
+            if robot.ingest is not None:
+                robot.ingest.stop()
+
+    def get(self, robot_id: str) -> Optional[Robot]:
+        with self._lock:
+            return self._robots.get(robot_id)
+
+    @property
+    def robots(self) -> List[str]:
+        with self._lock:
+            return sorted(self._robots)
+
+    def _route(self, topic: str) -> Optional[Robot]:
+        """Robot for ``txt4/<id>/<kind>``, registering it if allowed."""
+        parts = topic.split("/")
+        rid = parts[-2] if len(parts) >= 3 else ""
+        robot = self.get(rid)
+        if robot is None and self.auto_register and _ROBOT_ID.match(rid):
+            robot = self.add(rid)
+        if robot is None:
+            with self._lock:
+                self.counts["unknown"] += 1
+            return None
+        robot.last_seen = time.monotonic()
+        return robot
+
+    # ── inbound (network thread) ───────────────────────────────────────────
+    def _on_ack(self, msg) -> None:
+        robot = self._route(msg.topic)
+        if robot is not None:
+            robot.counts["acks"] += 1
+            robot.sequencer.on_ack(msg)
+
+    def _on_image(self, msg) -> None:
+        robot = self._route(msg.topic)
+        if robot is not None and robot.ingest is not None:
+            robot.counts["frames"] += 1
+            robot.ingest.on_message(msg)
+
+    def start_ingest(self, factory: Callable[[str], object]) -> "Fleet":
+        """Run one ingestion pipeline per robot; ``factory(robot_id)`` returns an unstarted IngestService."""
+        with self._lock:
+            self._ingest_factory = factory
+            for robot in self._robots.values():
+                if robot.ingest is None:
+                    robot.ingest = factory(robot.robot_id).start()
+        self.publisher.subscribe(f"{self.prefix}/+/image", self._on_image)
+        print(f"📡 Subscribed to topic: {self.prefix}/+/image ({len(self.robots)} robots)")
+        return self
+
+    def store_for(self, robot_id: str) -> FrameStore:
+        """A frame store of its own per robot (memory limits apply per robot)."""
+        return FrameStore(spill_dir=os.path.join(FRAME_SPILL_DIR, robot_id))
+
+    # ── outbound ───────────────────────────────────────────────────────────
+    def publish(self, robot_id: str, cmd: dict, wait: bool = False):
+        robot = self.get(robot_id)
+        if robot is None:
+            raise KeyError(f"unknown robot {robot_id!r}")
+        robot.counts["commands"] += 1
+        return self.publisher.publish(cmd, robot.action_topic, wait=wait)
+
+    def dispatch(self, plans: Dict[str, List[dict]]) -> Dict[str, threading.Thread]:
+        """Start one plan per robot; all sequencers run concurrently. Unknown ids raise KeyError."""
+        robots = {rid: self.get(rid) for rid in plans}
+        missing = [rid for rid, r in robots.items() if r is None]
+        if missing:
+            raise KeyError(f"unknown robots: {', '.join(missing)}")
+        with self._lock:
+            self.counts["dispatches"] += 1
+        for rid, cmds in plans.items():
+            robots[rid].counts["commands"] += len(cmds)
+        return {rid: robots[rid].sequencer.start(cmds) for rid, cmds in plans.items()}
+
+    def start(self, cmds: List[dict], robots: Optional[Iterable[str]] = None) -> Dict[str, threading.Thread]:
+        """The same plan for ``robots`` (default: every registered robot), concurrently.
+
+        Raises LookupError if there is no robot to run it on (KeyError, a LookupError, for unknown ids)."""
+        targets = self.robots if robots is None else list(robots)
+        if not targets:
+            raise LookupError("no robots registered (set FLEET_ROBOTS, or FLEET_AUTO_REGISTER=1 and wait "
+                              "for a robot to send a frame or an ack)")
+        return self.dispatch({rid: cmds for rid in targets})
+
+    def cancel(self, robots: Optional[Iterable[str]] = None) -> bool:
+        cancelled = False
+        for rid in self.robots if robots is None else robots:
+            robot = self.get(rid)
+            cancelled |= robot is not None and robot.sequencer.cancel()
+        return cancelled
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            robots = list(self._robots.values())
+        for robot in robots:
+            robot.sequencer.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not self.running
+
+    @property
+    def running(self) -> bool:
+        with self._lock:
+            return any(r.sequencer.running for r in self._robots.values())
+
+    def stop(self) -> None:
+        self.publisher.unsubscribe(f"{self.prefix}/+/ack", self._on_ack)
+        self.publisher.unsubscribe(f"{self.prefix}/+/image", self._on_image)
+        for rid in self.robots:
+            self.remove(rid)
+
+    # ── reporting ──────────────────────────────────────────────────────────
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            robots = list(self._robots.values())
+        return {**self.counts, "robots": {
+            r.robot_id: {**r.counts, "last_seen_s": round(now - r.last_seen, 1) if r.last_seen else None,
+                         "sequencer": r.sequencer.stats(),
+                         "ingest": r.ingest.stats() if r.ingest is not None else None}
+            for r in robots}}
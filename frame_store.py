@@ -0,0 +1,263 @@
+"""Memory-resident store for received camera frames.
+
+Frames live in an in-memory ring buffer that is bounded by bytes, count and
+age. They are indexed by store key (arrival order), sender frame id and
+capture timestamp, so the subscriber and the detector share them without a
+disk round-trip. When a frame is evicted it can optionally be spilled:
+
+    FRAME_SPILL=""      drop it
+    FRAME_SPILL=disk    write <FRAME_SPILL_DIR>/<name>_<run>_<key>.jpg; FRAME_SPILL_MAX caps the
+                        .jpg files in that directory, including ones left by earlier runs
+    FRAME_SPILL=mmap    append it to one preallocated, memory-mapped segment file used
+                        as a circular log (oldest spilled frames are overwritten)
+"""
+from __future__ import annotations
+import bisect, itertools, mmap, os, threading, time, uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+FRAME_STORE_MB     = float(os.getenv("FRAME_STORE_MB", "64"))
+FRAME_STORE_FRAMES = int(os.getenv("FRAME_STORE_FRAMES", "500"))
+FRAME_STORE_AGE_S  = float(os.getenv("FRAME_STORE_AGE_S", "300"))       # 0 = no age limit
+FRAME_SPILL        = os.getenv("FRAME_SPILL", "")                        # "" / disk / mmap
+FRAME_SPILL_DIR    = os.getenv("FRAME_SPILL_DIR", "received_images")
+FRAME_SPILL_MAX    = int(os.getenv("FRAME_SPILL_MAX", "2000"))           # files kept with FRAME_SPILL=disk
+FRAME_SPILL_MB     = float(os.getenv("FRAME_SPILL_MB", "256"))           # segment size with FRAME_SPILL=mmap
+
+@dataclass
+class StoredFrame:
+    key: int                      # store-assigned, increases with arrival
+    name: str
+    data: Optional[memoryview]    # None once evicted from memory
+    frame_id: Optional[int] = None
+    ts: float = 0.0               # capture time (sender clock); arrival time if unknown
+    encoding: str = "jpeg"
+    size: int = 0
+    stored: float = field(default_factory=time.monotonic)
+
+class _MmapSegment:
+    """Fixed-size file mapped into memory and written as a circular log."""
+
+    def __init__(self, path: str, size: int):
+        self.size = size
+        self._f = open(path, "w+b")
+        self._f.truncate(size)
+        self.mm = mmap.mmap(self._f.fileno(), size)
+        self.pos = 0
+        self.index: "OrderedDict[int, Tuple[int, int]]" = OrderedDict()   # key → (offset, length), write order
+
+    def append(self, key: int, data) -> Optional[List[int]]:
+        """Write ``data``; returns the keys it overwrote, or None if it does not fit at all."""
+        n = len(data)
+        if n > self.size:
+            return None
+        if self.pos + n > self.size:
+            self.pos = 0
+        lo, hi = self.pos, self.pos + n
+        # every entry under [lo, hi): after a wrap they are not a leading run of the oldest
+        dropped = [k for k, (off, ln) in self.index.items() if off < hi and lo < off + ln]
+        for k in dropped:
+            del self.index[k]
+        self.mm[lo:hi] = data
+        self.index[key] = (lo, n)
+        self.pos = hi
+        return dropped
+
+    def read(self, key: int) -> Optional[bytes]:
+        loc = self.index.get(key)
+        return None if loc is None else self.mm[loc[0]:loc[0] + loc[1]]
+
+    def close(self) -> None:
+        self.mm.close(); self._f.close()
+
+class FrameStore:
+    """Ring buffer of frames with byte/count/age eviction and optional spill. Thread-safe."""
+
+    def __init__(self, max_bytes: float = FRAME_STORE_MB * 2**20, max_frames: int = FRAME_STORE_FRAMES,
+                 max_age: float = FRAME_STORE_AGE_S, spill: str = FRAME_SPILL,
+                 spill_dir: str = FRAME_SPILL_DIR, spill_max: int = FRAME_SPILL_MAX,
+                 spill_bytes: float = FRAME_SPILL_MB * 2**20):
+        self.max_bytes, self.max_frames, self.max_age = int(max_bytes), max_frames, max_age
+        self.spill, self.spill_dir, self.spill_max = spill, spill_dir, spill_max
+        self._frames: "OrderedDict[int, StoredFrame]" = OrderedDict()   # in memory, arrival order
+        self._meta: "OrderedDict[int, StoredFrame]" = OrderedDict()     # everything still readable
+        self._by_id: Dict[int, int] = {}
+        self._by_ts: List[Tuple[float, int]] = []
+        self._files: "OrderedDict[int, str]" = OrderedDict()           # disk spill, oldest first
+        self._old_files: "deque[str]" = deque()                         # left by earlier runs, oldest first
+        self._run = uuid.uuid4().hex[:8]                                # keeps file names unique across runs
+        self._keys = itertools.count(1)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._ready = threading.Condition(self._lock)
+        self.counts = {"stored": 0, "evicted": 0, "spilled": 0, "memory_reads": 0, "spill_reads": 0,
+                       "misses": 0}
+        self._segment: Optional[_MmapSegment] = None
+        if spill:
+            os.makedirs(spill_dir, exist_ok=True)
+        if spill == "disk":
+            self._old_files.extend(self._existing_files())
+            self._prune()
+        if spill == "mmap":
+            self._segment = _MmapSegment(os.path.join(spill_dir, "frames.seg"), int(spill_bytes))
+
+    # ── writing ────────────────────────────────────────────────────────────
+    def put(self, data, name: str = "", frame_id: Optional[int] = None, ts: Optional[float] = None,
+            encoding: str = "jpeg") -> int:
+        """Keep ``data`` (bytes or a memoryview, not copied) and return its store key."""
+        view = memoryview(data).cast("B")
+        with self._lock:
+            key = next(self._keys)
+            f = StoredFrame(key, name or f"frame_{key}", view, frame_id,
+                            time.time() if not ts else ts, encoding, len(view))
+            self._frames[key] = self._meta[key] = f
+            self._bytes += f.size
+            if frame_id is not None:
+                self._by_id[frame_id] = key
+            bisect.insort(self._by_ts, (f.ts, key))
+            self.counts["stored"] += 1
+            self._evict()
+            self._ready.notify_all()
+        return key
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._frames:
+            oldest = next(iter(self._frames.values()))
+            too_old = self.max_age and now - oldest.stored > self.max_age
+            if not (too_old or self._bytes > self.max_bytes or len(self._frames) > self.max_frames):
+                break
+            del self._frames[oldest.key]
+            self._bytes -= oldest.size
+            self.counts["evicted"] += 1
+            spilled = self._spill(oldest)
+            oldest.data = None
+            if not spilled:
+                self._forget(oldest.key)
+
+    def _spill(self, f: StoredFrame) -> bool:
+        try:
+            if self.spill == "disk":
+                path = os.path.join(self.spill_dir, f"{os.path.basename(f.name)}_{self._run}_{f.key}.jpg")
+                with open(path, "wb") as fh:
+                    fh.write(f.data)
+                self._files[f.key] = path
+                self._prune()
+            elif self.spill == "mmap":
+                dropped = self._segment.append(f.key, f.data)
+                if dropped is None:
+                    return False
+                for key in dropped:              # overwritten in the segment: gone for good
+                    self._forget(key)
+            else:
+                return False
+        except OSError as e:
+            print(f"⚠️ Frame spill failed for {f.name}: {e}")
+            return False
+        self.counts["spilled"] += 1
+        return True
+
+    def _existing_files(self) -> List[str]:
+        """Spilled frames already in ``spill_dir`` (not its per-robot subfolders), oldest first."""
+        try:
+            entries = [e for e in os.scandir(self.spill_dir) if e.name.endswith(".jpg") and e.is_file()]
+        except OSError:
+            return []
+        return [e.path for e in sorted(entries, key=lambda e: e.stat().st_mtime)]
+
+    def _prune(self) -> None:
+        """Delete the oldest spilled files, earlier runs' first, until at most ``spill_max`` remain."""
+        while len(self._old_files) + len(self._files) > self.spill_max:
+            if self._old_files:
+                old = self._old_files.popleft()
+            else:
+                key, old = self._files.popitem(last=False)
+                self._forget(key)
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _forget(self, key: int) -> None:
+        f = self._meta.pop(key, None)
+        if f is None:
+            return
+        if f.frame_id is not None and self._by_id.get(f.frame_id) == key:
+            del self._by_id[f.frame_id]
+        i = bisect.bisect_left(self._by_ts, (f.ts, key))
+        if i < len(self._by_ts) and self._by_ts[i] == (f.ts, key):
+            del self._by_ts[i]
+
+    # ── reading ────────────────────────────────────────────────────────────
+    def read(self, key: int):
+        """Frame bytes from memory (a memoryview, no copy) or from the spill; None if gone."""
+        with self._lock:
+            f = self._meta.get(key)
+            if f is not None and f.data is not None:
+                self.counts["memory_reads"] += 1
+                return f.data
+            if f is not None and self.spill == "mmap":
+                data = self._segment.read(key)
+            elif f is not None and self.spill == "disk":
+                path = self._files.get(key)
+                data = None
+                if path:
+                    with open(path, "rb") as fh:
+                        data = fh.read()
+            else:
+                data = None
+            self.counts["spill_reads" if data is not None else "misses"] += 1
+            return data
+
+    def get(self, key: int) -> Optional[StoredFrame]:
+        with self._lock:
+            return self._meta.get(key)
+
+    def by_frame_id(self, frame_id: int) -> Optional[StoredFrame]:
+        with self._lock:
+            key = self._by_id.get(frame_id)
+            return None if key is None else self._meta.get(key)
+
+    def between(self, t0: float, t1: float) -> List[StoredFrame]:
+        """Frames captured in [t0, t1], in capture order."""
+        with self._lock:
+            lo = bisect.bisect_left(self._by_ts, (t0, 0))
+            hi = bisect.bisect_right(self._by_ts, (t1, float("inf")))
+            return [self._meta[k] for _, k in self._by_ts[lo:hi]]
+
+    def latest(self, n: int = 0, in_memory: bool = True) -> List[StoredFrame]:
+        """Newest ``n`` frames (0 = all), in capture order."""
+        with self._lock:
+            keys = [k for _, k in self._by_ts if not in_memory or k in self._frames]
+            return [self._meta[k] for k in keys[-n if n else 0:]]
+
+    def wait(self, after: int, timeout: Optional[float] = None) -> List[StoredFrame]:
+        """Block until frames newer than key ``after`` arrive; returns them in arrival order."""
+        with self._ready:
+            self._ready.wait_for(lambda: next(reversed(self._frames), 0) > after, timeout)
+            return [f for k, f in self._frames.items() if k > after]
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"frames": len(self._frames), "mb": round(self._bytes / 2**20, 2),
+                    "readable": len(self._meta), "spill": self.spill or None, **self.counts}
+
+    def close(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+
+_store: Optional[FrameStore] = None
+_store_lock = threading.Lock()
+
+def get_frame_store() -> FrameStore:
+    """Process-wide store shared by the subscriber and the detector."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FrameStore()
+        return _store
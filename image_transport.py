@@ -0,0 +1,160 @@
+"""Binary, chunked image framing for the MQTT image topic.
+
+Every message is a fixed 28-byte little-endian header followed by raw image
+bytes (no base64):
+
+    magic "TX" | version u8 | encoding u8 | frame_id u32 | seq u16 | count u16
+    | offset u32 | total u32 | ts_us u64
+
+A frame larger than IMAGE_CHUNK_BYTES is split into ``count`` chunks (``seq``
+0…count-1, each at byte ``offset`` of a ``total``-byte image).
+``Reassembler.feed`` takes ``msg.payload`` as-is: single-chunk frames come
+back as a memoryview into the payload (no copy), and chunks of a larger frame
+are copied once into a preallocated buffer. Legacy ``name:<base64>``
+payloads are still accepted; a payload counts as binary only if the magic,
+version and encoding bytes all match.
+"""
+from __future__ import annotations
+import base64, binascii, itertools, os, struct, threading, time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+IMAGE_CHUNK_BYTES  = int(os.getenv("IMAGE_CHUNK_BYTES", str(64 * 1024)))
+REASSEMBLY_TIMEOUT = float(os.getenv("IMAGE_REASSEMBLY_TIMEOUT", "5"))   # seconds an incomplete frame is kept
+MAX_PARTIAL        = 32                                                   # incomplete frames kept at once
+
+MAGIC   = b"TX"
+VERSION = 1
+HEADER  = struct.Struct("<2sBBIHHIIQ")
+ENCODINGS = {"jpeg": 0, "png": 1, "raw": 2}
+_ENCODING_NAMES = {v: k for k, v in ENCODINGS.items()}
+
+@dataclass
+class Frame:
+    frame_id: Optional[int]       # None for legacy payloads
+    name: str
+    data: memoryview              # encoded image bytes (a view into the payload when unchunked)
+    encoding: str = "jpeg"
+    ts: float = 0.0               # capture time (sender clock, epoch seconds)
+    chunks: int = 1
+    legacy: bool = False
+
+@dataclass
+class _Partial:
+    buf: bytearray
+    count: int
+    ts: float
+    encoding: str
+    seen: set = field(default_factory=set)
+    first: float = field(default_factory=time.monotonic)
+
+# ═════════════════════ SENDER ═══════════════════════════════════════════════
+def encode_frame(data, frame_id: int, ts: Optional[float] = None, encoding: str = "jpeg",
+                 chunk_size: int = IMAGE_CHUNK_BYTES) -> List[bytes]:
+    """Image bytes → list of MQTT payloads (one per chunk)."""
+    view = memoryview(data).cast("B")
+    total = len(view)
+    count = max(1, -(-total // chunk_size))
+    if count > 0xFFFF:
+        raise ValueError(f"frame of {total} bytes needs {count} chunks, raise chunk_size")
+    ts_us = int((time.time() if ts is None else ts) * 1e6)
+    enc = ENCODINGS[encoding]
+    out = []
+    for seq in range(count):
+        off = seq * chunk_size
+        out.append(HEADER.pack(MAGIC, VERSION, enc, frame_id & 0xFFFFFFFF, seq, count, off, total, ts_us)
+                   + view[off:off + chunk_size])
+    return out
+
+_frame_ids = itertools.count(int(time.time()) & 0xFFFF)
+
+def publish_frame(publisher, data, topic: str, frame_id: Optional[int] = None, encoding: str = "jpeg",
+                  chunk_size: int = IMAGE_CHUNK_BYTES, wait: bool = False) -> int:
+    """Send one image through an mqtt_publisher.MqttPublisher; returns the frame id used."""
+    fid = next(_frame_ids) if frame_id is None else frame_id
+    publisher.publish_batch(encode_frame(data, fid, encoding=encoding, chunk_size=chunk_size), topic, wait=wait)
+    return fid
+
+def encode_legacy(data, name: str) -> bytes:
+    """The old ``name:<base64>`` text payload (for comparison and old receivers)."""
+    return name.encode() + b":" + base64.b64encode(data)
+
+def parse_legacy(payload) -> Tuple[str, bytes]:
+    """``name:<base64>`` (optionally a data URL) → (name, image bytes)."""
+    name, sep, b64data = bytes(payload).partition(b":")
+    if not sep:
+        raise ValueError("invalid payload, missing ':'")
+    if b64data.startswith(b"data:image"):   # Remove base64 prefix if present
+        b64data = b64data.split(b",", 1)[1]
+    try:
+        return name.decode(errors="ignore").strip(), base64.b64decode(b64data)
+    except binascii.Error as e:
+        raise ValueError(f"bad base64: {e}") from None
+
+def is_binary(payload) -> bool:
+    """Binary header: magic plus a known version and encoding byte. A legacy name that merely
+    starts with "TX" (``TXT4_cam_1:...``) has text there and is parsed as legacy."""
+    return (len(payload) >= HEADER.size and bytes(payload[:2]) == MAGIC
+            and payload[2] == VERSION and payload[3] in _ENCODING_NAMES)
+
+# ═════════════════════ RECEIVER ═════════════════════════════════════════════
+class Reassembler:
+    """Turns MQTT payloads (binary chunks or legacy text) into complete Frames. Thread-safe."""
+
+    def __init__(self, timeout: float = REASSEMBLY_TIMEOUT, max_partial: int = MAX_PARTIAL):
+        self.timeout, self.max_partial = timeout, max_partial
+        self._partial: Dict[int, _Partial] = {}
+        self._lock = threading.Lock()
+        self.counts = {"frames": 0, "chunks": 0, "legacy": 0, "bad": 0, "duplicates": 0, "expired": 0}
+
+    def feed(self, payload) -> Optional[Frame]:
+        """Complete Frame, or None while chunks are still missing. Raises ValueError on bad input."""
+        view = memoryview(payload).cast("B")
+        if not is_binary(view):
+            name, data = parse_legacy(view)
+            with self._lock:
+                self.counts["legacy"] += 1
+                self.counts["frames"] += 1
+            return Frame(None, name, memoryview(data), legacy=True)
+        magic, ver, enc, fid, seq, count, off, total, ts_us = HEADER.unpack_from(view)
+        body = view[HEADER.size:]
+        if seq >= count or off + len(body) > total:
+            with self._lock:
+                self.counts["bad"] += 1
+            raise ValueError(f"bad frame header (v{ver}, enc {enc}, chunk {seq}/{count}, "
+                             f"{off}+{len(body)}/{total})")
+        ts, encoding = ts_us / 1e6, _ENCODING_NAMES[enc]
+        with self._lock:
+            self.counts["chunks"] += 1
+            if count == 1:
+                self.counts["frames"] += 1
+                return Frame(fid, f"frame_{fid}", body, encoding, ts)
+            part = self._partial.get(fid)
+            if part is None or len(part.buf) != total or part.count != count:
+                self._partial.pop(fid, None)
+                self._expire()
+                part = self._partial[fid] = _Partial(bytearray(total), count, ts, encoding)
+            if seq in part.seen:
+                self.counts["duplicates"] += 1
+                return None
+            part.buf[off:off + len(body)] = body
+            part.seen.add(seq)
+            if len(part.seen) < count:
+                return None
+            del self._partial[fid]
+            self.counts["frames"] += 1
+        return Frame(fid, f"frame_{fid}", memoryview(part.buf), encoding, ts, chunks=count)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        stale = [fid for fid, p in self._partial.items() if now - p.first > self.timeout]
+        while len(self._partial) - len(stale) >= self.max_partial:   # make room: oldest first
+            stale.append(min((f for f in self._partial if f not in stale),
+                             key=lambda f: self._partial[f].first))
+        for fid in stale:
+            del self._partial[fid]
+            self.counts["expired"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, "partial": len(self._partial)}
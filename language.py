@@ -0,0 +1,247 @@
+"""Language and intent detection for recognised utterances.
+
+All word lists below are compiled into one token index (n-grams over word
+boundaries), so a single pass over an utterance yields per-language scores,
+explicit language-switch requests, command hints and yes/no/stop words.
+Matching is on whole words: "no" no longer fires inside "now" or "north".
+"""
+from __future__ import annotations
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from langdetect import DetectorFactory, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+
+# Set seed for consistent language detection
+DetectorFactory.seed = 0
+
+# ═════════════════════ WORD LISTS ═════════════════════════════════════════
+LANG_MAP = {
+    "english": "en-US", "ingilizce": "en-US", "german": "de-DE", "deutsch": "de-DE",
+    "almanca": "de-DE", "turkish": "tr-TR", "türkçe": "tr-TR", "french": "fr-FR",
+    "français": "fr-FR", "spanish": "es-ES", "español": "es-ES",
+    "italian": "it-IT", "italiano": "it-IT",
+    # Add more Turkish words for better detection
+    "evet": "tr-TR", "hayır": "tr-TR", "tamam": "tr-TR", "anladım": "tr-TR",
+    "beni": "tr-TR", "anlayabiliyor": "tr-TR", "musun": "tr-TR", "türkçe": "tr-TR",
+    # Russian
+    "russian": "ru-RU", "русский": "ru-RU", "русский язык": "ru-RU", "по-русски": "ru-RU"
+}
+
+# Language detection mapping for langdetect results
+DETECT_LANG_MAP = {
+    "en": "en-US",
+    "de": "de-DE", 
+    "tr": "tr-TR",
+    "fr": "fr-FR",
+    "es": "es-ES",
+    "it": "it-IT",
+    "ru": "ru-RU"
+}
+
+# Common words for each language to improve detection
+LANG_WORDS = {
+    "en-US": ["hello", "hi", "hey", "yes", "no", "okay", "good", "bad", "move", "turn", "left", "right", "forward", "back", "the", "and", "you", "me", "what", "how", "why", "when", "where", "who"],
+    "tr-TR": ["merhaba", "selam", "evet", "hayır", "tamam", "iyi", "kötü", "hareket", "dön", "sol", "sağ", "ileri", "geri", "beni", "anlayabiliyor", "musun", "sen", "ben", "ne", "nasıl", "neden", "ne zaman", "nerede", "kim", "bu", "şu", "o", "bir", "iki", "üç", "dört", "beş", "altı", "yedi", "sekiz", "dokuz", "on", "lütfen", "teşekkür", "rica", "güzel", "kötü", "büyük", "küçük", "uzun", "kısa", "yeni", "eski", "genç", "yaşlı"],
+    "de-DE": ["hallo", "ja", "nein", "gut", "schlecht", "bewegen", "drehen", "links", "rechts", "vorwärts", "rückwärts", "bitte", "danke", "schön", "schlecht", "groß", "klein", "lang", "kurz", "neu", "alt", "jung", "alt"],
+    "fr-FR": ["bonjour", "oui", "non", "bien", "mal", "bouger", "tourner", "gauche", "droite", "avant", "arrière", "s'il vous plaît", "merci", "beau", "mauvais", "grand", "petit", "long", "court", "nouveau", "vieux", "jeune", "vieux"],
+    "es-ES": ["hola", "sí", "no", "bueno", "malo", "mover", "girar", "izquierda", "derecha", "adelante", "atrás", "por favor", "gracias", "bonito", "feo", "grande", "pequeño", "largo", "corto", "nuevo", "viejo", "joven", "viejo"],
+    "it-IT": ["ciao", "sì", "no", "bene", "male", "muovere", "girare", "sinistra", "destra", "avanti", "indietro", "per favore", "grazie", "bello", "brutto", "grande", "piccolo", "lungo", "corto", "nuovo", "vecchio", "giovane", "vecchio"],
+    "ru-RU": [
+        "привет", "здравствуйте", "да", "нет", "хорошо", "плохо", "двигаться", "повернуть", "налево", "направо", "вперёд", "назад", "пожалуйста", "спасибо", "большой", "маленький", "длинный", "короткий", "новый", "старый", "молодой", "старый", "робот", "команда", "движение", "выполнить", "стоп", "остановить", "поехали", "команду", "вперёд", "назад", "налево", "направо"
+    ]
+}
+
+# Language switch phrases that should not generate commands
+LANGUAGE_SWITCH_PHRASES = [
+    "i want to talk in", "i want to speak in", "switch to", "change to", "let's speak",
+    "ich möchte sprechen", "ich will sprechen", "wechseln zu", "ändern zu",
+    "quiero hablar", "quiero hablar en", "cambiar a", "cambia a",
+    "je veux parler", "je veux parler en", "changer à", "change à",
+    "voglio parlare", "voglio parlare in", "cambiare a", "cambia a",
+    "almanca", "türkçe", "ingilizce", "fransızca", "ispanyolca", "italyanca",
+    "german", "turkish", "english", "french", "spanish", "italian",
+    # Russian
+    "я хочу говорить на", "я хочу говорить по", "переключить на", "сменить на", "давай говорить на", "русский", "по-русски"
+]
+
+# Explicit language names, in the priority order used when several are mentioned
+EXPLICIT_LANG_NAMES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("de-DE", ("german", "deutsch", "almanca")),
+    ("en-US", ("english", "ingilizce")),
+    ("tr-TR", ("turkish", "türkçe")),
+    ("fr-FR", ("french", "français", "fransızca")),
+    ("es-ES", ("spanish", "español", "ispanyolca")),
+    ("it-IT", ("italian", "italiano", "italyanca")),
+    ("ru-RU", ("russian", "русский", "по-русски")),
+]
+
+CMD_HINTS = ("forward","back","move","spin","turn","left","right","wait",
+             "geri","ileri","dön","bekle","links","rechts")
+YES=("execute","run","go","yes","onayla","evet","uygula","ja","oui","sí")
+NO =("cancel","no","hayır","iptal","nein","non")
+STOP=NO+("stop","halt","dur","стоп")
+
+TURKISH_CHARS = set("ğış")   # ç, ö, ü also occur in French/German words
+
+# ═════════════════════ COMPILED DETECTOR ════════════════════════════════════
+_WORD = re.compile(r"\w+(?:['’-]\w+)*")
+
+_UNSET = object()
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+@dataclass
+class Analysis:
+    scores: Dict[str, int] = field(default_factory=dict)   # distinct LANG_WORDS hits per language
+    explicit_lang: Optional[str] = None                    # language named in the utterance
+    switch_request: bool = False
+    cmd_hint: bool = False
+    yes: bool = False
+    no: bool = False
+    stop: bool = False
+    text: str = ""
+    _lang: object = field(default=_UNSET, repr=False)
+
+    @property
+    def lang(self) -> Optional[str]:
+        """Confident word-based language, decided (and logged) only when someone asks for it,
+        i.e. not when Whisper's language ID is trusted."""
+        if self._lang is _UNSET:
+            self._lang = LanguageDetector._decide(self.scores, self.text)
+        return self._lang
+
+class LanguageDetector:
+    """Token n-gram index over every word list; ``analyze`` makes one pass per utterance."""
+
+    def __init__(self, lang_words: Dict[str, Iterable[str]] = LANG_WORDS,
+                 explicit: List[Tuple[str, Tuple[str, ...]]] = EXPLICIT_LANG_NAMES,
+                 switch_phrases: Iterable[str] = LANGUAGE_SWITCH_PHRASES,
+                 cmd_hints: Iterable[str] = CMD_HINTS, yes: Iterable[str] = YES,
+                 no: Iterable[str] = NO, stop: Iterable[str] = STOP):
+        self.index: Dict[Tuple[str, ...], List[Tuple[str, object]]] = defaultdict(list)
+        self.prefixes: Set[Tuple[str, ...]] = set()
+        self.explicit_rank = {lang: i for i, (lang, _) in enumerate(explicit)}
+        for lang, words in lang_words.items():
+            for w in set(words):
+                self._add(w, "lang", lang)
+        for lang, names in explicit:
+            for n in names:
+                self._add(n, "explicit", lang)
+        for kind, phrases in (("switch", switch_phrases), ("cmd", cmd_hints),
+                              ("yes", yes), ("no", no), ("stop", stop)):
+            for p in phrases:
+                self._add(p, kind, True)
+        self.index = dict(self.index)
+
+    def _add(self, phrase: str, kind: str, value) -> None:
+        key = tuple(_tokens(phrase))
+        if not key:
+            return
+        if (kind, value) not in self.index[key]:
+            self.index[key].append((kind, value))
+        for n in range(1, len(key) + 1):
+            self.prefixes.add(key[:n])
+
+    def analyze(self, text: str) -> Analysis:
+        toks = _tokens(text)
+        seen: Dict[str, Set[Tuple[str, ...]]] = defaultdict(set)
+        res = Analysis(text=text)
+        explicit_rank = len(self.explicit_rank)
+        for i in range(len(toks)):
+            for j in range(i + 1, len(toks) + 1):
+                key = tuple(toks[i:j])
+                if key not in self.prefixes:
+                    break
+                for kind, value in self.index.get(key, ()):
+                    if kind == "lang":
+                        seen[value].add(key)
+                    elif kind == "explicit":
+                        if self.explicit_rank[value] < explicit_rank:
+                            explicit_rank, res.explicit_lang = self.explicit_rank[value], value
+                    elif kind == "switch":
+                        res.switch_request = True
+                    elif kind == "cmd":
+                        res.cmd_hint = True
+                    else:
+                        setattr(res, kind, True)
+        res.scores = {lang: len(words) for lang, words in seen.items()}
+        return res
+
+    @staticmethod
+    def _decide(scores: Dict[str, int], text: str) -> Optional[str]:
+        if scores:
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            best_lang = ranked[0]
+            second_best = ranked[1] if len(ranked) > 1 else None
+            # Only detect if we have a clear winner and minimum score
+            if best_lang[1] >= 2 and (not second_best or (best_lang[1] - second_best[1]) > 1):
+                print(f"🔍 Word-based detection: {best_lang[0]} (score: {best_lang[1]})")
+                return best_lang[0]
+            if second_best:
+                print(f"🔍 Ambiguous word detection: {best_lang[0]} ({best_lang[1]}) vs {second_best[0]} ({second_best[1]})")
+            else:
+                print(f"🔍 Low confidence word detection: {best_lang[0]} (score: {best_lang[1]})")
+        if TURKISH_CHARS.intersection(text.lower()):
+            print(f"🔍 Turkish detected by special characters")
+            return "tr-TR"
+        return None
+
+detector = LanguageDetector()
+analyze = detector.analyze
+
+# ═════════════════════ HELPERS (one analysis each) ══════════════════════════
+def word_based_language_detection(text: str) -> Optional[str]:
+    """Detect language based on common words"""
+    return analyze(text).lang
+
+def auto_detect_language(text: str, analysis: Optional[Analysis] = None) -> Optional[str]:
+    """Automatically detect language from text and return language code with confidence check"""
+    # First try word-based detection (more reliable for short phrases)
+    word_detected = (analysis or analyze(text)).lang
+    if word_detected:
+        return word_detected
+    
+    # Fall back to langdetect for longer texts
+    try:
+        # Get all detected languages with confidence scores
+        detected_langs = detect_langs(text)
+        if not detected_langs:
+            print(f"🔍 No languages detected for: {text}")
+            return None
+        
+        # Get the most confident detection
+        best_lang = detected_langs[0]
+        print(f"🔍 Detected: {best_lang.lang} (confidence: {best_lang.prob:.3f}) for: {text}")
+        
+        # Lower confidence threshold to 0.5 for better detection
+        if best_lang.prob >= 0.5:
+            detected_code = DETECT_LANG_MAP.get(best_lang.lang)
+            if detected_code:
+                print(f"🔍 Language switch to: {detected_code}")
+                return detected_code
+        
+        return None
+    except LangDetectException as e:
+        print(f"🔍 Language detection error: {e}")
+        return None
+
+
+def detect_explicit_language_request(text: str) -> Optional[str]:
+    """Detect explicit language switch requests more accurately"""
+    return analyze(text).explicit_lang
+
+def is_language_switch_request(text: str) -> bool:
+    """Check if the user is just requesting a language switch"""
+    return analyze(text).switch_request
+
+likely_cmd = lambda t: analyze(t).cmd_hint
+
+def warmup() -> None:
+    """Load langdetect's language profiles now instead of in the first fallback detection."""
+    try:
+        detect_langs("warm up the language profiles")
+    except LangDetectException:
+        pass
@@ -1,69 +1,185 @@
-import paho.mqtt.client as mqtt
-import base64
-import os
-import subprocess
-
-BROKER = "test.mosquitto.org"
-PORT = 1883
-TOPIC = "txt4/image"
-SAVE_DIR = 'received_images'
-
-os.makedirs(SAVE_DIR, exist_ok=True)
-received_images = set()
-
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        print("✅ Connected to MQTT broker")
-        client.subscribe(TOPIC)
-        print(f"📡 Subscribed to topic: {TOPIC}")
-    else:
-        print("❌ Failed to connect. Code:", rc)
+"""Long-running image ingestion service for frames from the robot.
 
-def on_message(client, userdata, msg):
-    try:
-        print(f"📨 Received message of {len(msg.payload)} bytes")
+The MQTT network thread only hands payloads to a bounded queue; decoding,
+storing and P detection run in-process on worker threads, frame by frame as
+they arrive. Frames are kept in the shared in-memory frame store (see
+frame_store.py for retention and optional spill to disk). The first
+confident "P" sends the park command (then waits P_PARK_COOLDOWN_S before
+parking again).
 
-        payload = msg.payload.decode(errors="ignore")  # Avoid decode errors
+    MQTT (txt4/image) ─► ingest queue ─► workers: decode ─► frame store ─► detect ─► park
 
-        if ":" not in payload:
-            print("⚠️ Invalid payload, missing ':'")
-            return
+With FLEET_ROBOTS / FLEET_AUTO_REGISTER set (see fleet.py) every robot gets
+its own service fed from ``txt4/<robot_id>/image``, parking that robot only.
+"""
+import collections, os, queue, threading, time
+from typing import Deque, Dict, Optional
+from bounded_queue import put_drop_oldest
+from fleet import FLEET_ENABLED, FLEET_INGEST_WORKERS, Fleet, robot_topic
+from frame_store import FrameStore, get_frame_store
+from image_transport import Reassembler
+from mqtt_publisher import MQTT_IMAGE_TOPIC, MqttPublisher, get_publisher
+from p_prefilter import P_PREFILTER, PreFilter
+from tracing import latency_summary, tracer
+import P_detection
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+INGEST_WORKERS    = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_QUEUE      = int(os.getenv("INGEST_QUEUE", "64"))        # oldest frame is dropped when full
+INGEST_STATS_S    = float(os.getenv("INGEST_STATS_S", "30"))     # 0 = only at exit
+P_PARK_COOLDOWN_S = float(os.getenv("P_PARK_COOLDOWN_S", "10"))
+LATENCY_WINDOW    = 200
+
+class IngestService:
+    """Queue + worker threads between the MQTT callback and in-process P detection."""
 
-        name, b64data = payload.split(":", 1)
+    def __init__(self, publisher: Optional[MqttPublisher] = None, topic: str = MQTT_IMAGE_TOPIC,
+                 workers: int = INGEST_WORKERS, maxsize: int = INGEST_QUEUE,
+                 store: Optional[FrameStore] = None, prefilter: Optional[PreFilter] = None,
+                 detect=P_detection.detect_p_with_openai, on_park=P_detection.send_park_command):
+        self.publisher, self.topic = publisher, topic
+        self.workers = max(1, workers)
+        self.store = store if store is not None else get_frame_store()
+        self.prefilter, self.detect, self.on_park = prefilter, detect, on_park
+        self.reassembler = Reassembler()
+        self._q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_park = 0.0
+        self.started = 0.0
+        self.counts = {"received": 0, "decoded": 0, "bad": 0, "dropped": 0,
+                       "detected": 0, "p_found": 0, "parked": 0, "errors": 0}
+        self.latency: Dict[str, Deque[float]] = {k: collections.deque(maxlen=LATENCY_WINDOW)
+                                                 for k in ("queue", "decode", "detect", "total")}
 
-        # Remove base64 prefix if present
-        if b64data.startswith("data:image"):
-            b64data = b64data.split(",", 1)[1]
+    # ── lifecycle ──────────────────────────────────────────────────────────
+    def start(self) -> "IngestService":
+        self.started = time.perf_counter()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True)
+            t.start(); self._threads.append(t)
+        if self.publisher is not None:
+            self.publisher.subscribe(self.topic, self.on_message)
+            print(f"📡 Subscribed to topic: {self.topic}")
+        return self
 
-        filename = f"{name.strip()}.jpg"
-        filepath = os.path.join(SAVE_DIR, filename)
+    def stop(self, timeout: float = 5.0) -> None:
+        if self.publisher is not None:
+            self.publisher.unsubscribe(self.topic, self.on_message)
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
 
-        # Write decoded image
+    # ── network thread: enqueue only ───────────────────────────────────────
+    def on_message(self, msg) -> None:
+        self.submit(msg.payload)
+
+    def submit(self, payload: bytes, received: Optional[float] = None) -> None:
+        with self._lock:
+            self.counts["received"] += 1
+        put_drop_oldest(self._q, (payload, received or time.perf_counter()), self.counts, "dropped")
+
+    # ── workers ────────────────────────────────────────────────────────────
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                payload, received = self._q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                self._process(payload, received)
+            except Exception as e:
+                with self._lock:
+                    self.counts["errors"] += 1
+                print(f"❌ Frame processing failed: {e}")
+
+    def _process(self, payload: bytes, received: float) -> None:
+        t0 = time.perf_counter()
         try:
-            with open(filepath, "wb") as f:
-                f.write(base64.b64decode(b64data))
-            print(f"✅ Image saved: {filepath}")
-        except Exception as e:
-            print("❌ Failed to decode/write image:", e)
+            frame = self.reassembler.feed(payload)   # binary chunks or legacy name:<base64>
+        except ValueError as e:
+            with self._lock:
+                self.counts["bad"] += 1
+            print(f"⚠️ Invalid image payload ({len(payload)} bytes): {e}")
             return
+        if frame is None:
+            return                                  # more chunks of this frame to come
+        name = frame.name
+        with tracer.trace("frame", start=received, name=name, frame_id=frame.frame_id):
+            tracer.record("frame.queue", t0 - received, received)
+            tracer.record("frame.decode", time.perf_counter() - t0, t0)
+            with tracer.span("frame.store"):
+                self.store.put(frame.data, name, frame.frame_id, frame.ts or None, frame.encoding)
+            t1 = time.perf_counter()
+            with tracer.span("frame.detect"):
+                # the bytes in hand: the store may evict at once (frame > FRAME_STORE_MB, full without spill)
+                found = self._detect(name, frame.data)
+            t2 = time.perf_counter()
+            tracer.annotate(found=found)
+        with self._lock:
+            self.counts["decoded"] += 1
+            self.counts["detected"] += 1
+            self.counts["p_found"] += found
+            for k, v in (("queue", t0 - received), ("decode", t1 - t0), ("detect", t2 - t1),
+                         ("total", t2 - received)):
+                self.latency[k].append(v)
+            park = found and t2 - self._last_park >= P_PARK_COOLDOWN_S
+            if park:
+                self._last_park = t2
+                self.counts["parked"] += 1
+        print(f"🖼️ {name}: {'P found' if found else 'no P'} in {1000 * (t2 - received):.0f} ms")
+        if park:
+            with tracer.trace("park", name=name):
+                self.on_park()
 
-        received_images.add(name.strip())
-        if len(received_images) >= 4:
-            print("📷 Received 4 images. Running detection...")
-            subprocess.run(["python", "P_detection.py"])
-            client.disconnect()
+    def _detect(self, name: str, jpeg: bytes) -> bool:
+        if self.prefilter is not None:
+            verdict, s = self.prefilter.decide(jpeg)
+            if verdict != "ask":
+                print(f"🏠 Local P score for {name}: {s:.2f} → {verdict.upper()}")
+                return verdict == "yes"
+        return self.detect(jpeg)
 
-    except Exception as e:
-        print("❌ Error in on_message:", e)
+    # ── metrics ────────────────────────────────────────────────────────────
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        with self._lock:
+            return {**self.counts, "queue_depth": self._q.qsize(), "workers": self.workers,
+                    "frames_per_s": round(self.counts["detected"] / elapsed, 2) if elapsed else 0.0,
+                    "latency": {k: latency_summary(v) for k, v in self.latency.items()},
+                    "transport": self.reassembler.stats(), "store": self.store.stats(),
+                    "prefilter": self.prefilter.stats() if self.prefilter else None}
 
-def on_log(client, userdata, level, buf):
-    print("📒 MQTT Log:", buf)
+def robot_service(fleet: Fleet, robot_id: str) -> IngestService:
+    """Ingestion for one fleet robot: own queue, workers and frame store; parks only that robot."""
+    action = robot_topic(robot_id, "action", fleet.prefix)
+    return IngestService(None, robot_topic(robot_id, "image", fleet.prefix), workers=FLEET_INGEST_WORKERS,
+                         store=fleet.store_for(robot_id), prefilter=PreFilter() if P_PREFILTER else None,
+                         on_park=lambda: P_detection.send_park_command(action, fleet.publisher))
 
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
-client.on_log = on_log  # optional for debugging
+def main() -> None:
+    if FLEET_ENABLED:
+        fleet = Fleet(get_publisher())
+        fleet.start_ingest(lambda rid: robot_service(fleet, rid))
+        stats, stop = fleet.stats, fleet.stop
+    else:
+        service = IngestService(get_publisher(), prefilter=PreFilter() if P_PREFILTER else None).start()
+        stats, stop = service.stats, service.stop
+    print("🚀 Waiting for images from robot... (Ctrl+C quits)")
+    try:
+        while True:
+            time.sleep(INGEST_STATS_S or 3600)
+            if INGEST_STATS_S:
+                print(f"📊 Ingest stats: {stats()}")
+                tracer.export()
+    except KeyboardInterrupt:
+        pass
+    final = stats()
+    stop()
+    print(f"📊 Ingest stats: {final}")
+    tracer.report()
+    get_publisher().stop()
 
-print("🚀 Waiting for images from robot...")
-client.connect(BROKER, PORT)
-client.loop_forever() 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
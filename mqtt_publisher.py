@@ -0,0 +1,329 @@
+"""Shared, persistent MQTT publisher for robot commands.
+
+One connection per process with paho's background network loop instead of a
+connect/publish/disconnect round trip per command. paho reconnects on its
+own with exponential backoff (``reconnect_delay_set``); messages published
+with QoS ≥ 1 while offline are queued and flushed after reconnect.
+
+Set ``MQTT_BROKER=loopback`` to use the in-process stand-in broker below
+(no network, used for offline runs and benchmarks).
+"""
+from __future__ import annotations
+import collections, json, os, queue, threading, time
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+import paho.mqtt.client as mqtt
+from tracing import latency_summary, tracer
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+MQTT_BROKER      = os.getenv("MQTT_BROKER", "test.mosquitto.org")
+MQTT_PORT        = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_TOPIC       = os.getenv("MQTT_TOPIC", "txt4/action")
+MQTT_IMAGE_TOPIC = os.getenv("MQTT_IMAGE_TOPIC", "txt4/image")
+MQTT_QOS         = int(os.getenv("MQTT_QOS", "1"))
+MQTT_KEEPALIVE   = int(os.getenv("MQTT_KEEPALIVE", "60"))
+RECONNECT_MIN_S, RECONNECT_MAX_S = 1, 30
+ACK_TIMEOUT_S    = float(os.getenv("MQTT_ACK_TIMEOUT", "5"))
+LOOPBACK         = "loopback"
+LATENCY_WINDOW   = 200
+
+# ═════════════════════ IN-PROCESS STAND-IN BROKER ═══════════════════════════
+class _LoopbackMessage:
+    def __init__(self, topic: str, payload: bytes, qos: int, retain: bool, mid: int):
+        self.topic, self.payload, self.qos, self.retain, self.mid = topic, payload, qos, retain, mid
+        self.timestamp = time.monotonic()
+
+class _LoopbackInfo:
+    """Mimics paho's MQTTMessageInfo."""
+    def __init__(self, mid: int):
+        self.mid, self.rc = mid, mqtt.MQTT_ERR_SUCCESS
+        self._done = threading.Event()
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        self._done.wait(timeout)
+
+    def is_published(self) -> bool:
+        return self._done.is_set()
+
+class LoopbackBroker:
+    """Routes publishes to subscribed LoopbackClients on a dispatcher thread."""
+
+    def __init__(self):
+        self._subs: Dict["LoopbackClient", List[str]] = {}
+        self._lock = threading.Lock()
+        self._q: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._dispatch, name="loopback-broker", daemon=True).start()
+
+    def subscribe(self, client: "LoopbackClient", topic: str) -> None:
+        with self._lock:
+            self._subs.setdefault(client, []).append(topic)
+
+    def unsubscribe(self, client: "LoopbackClient", topic: Optional[str] = None) -> None:
+        with self._lock:
+            if topic is None:
+                self._subs.pop(client, None)
+            elif topic in self._subs.get(client, []):
+                self._subs[client].remove(topic)
+
+    def publish(self, sender: "LoopbackClient", msg: _LoopbackMessage, info: _LoopbackInfo) -> None:
+        self._q.put((sender, msg, info))
+
+    def _dispatch(self) -> None:
+        while True:
+            sender, msg, info = self._q.get()
+            with self._lock:
+                targets = [c for c, subs in self._subs.items()
+                           if any(mqtt.topic_matches_sub(s, msg.topic) for s in subs)]
+            for c in targets:
+                c._deliver(msg)
+            info._done.set()
+            if sender.on_publish:
+                sender.on_publish(sender, sender._userdata, msg.mid)
+
+_loopback_broker: Optional[LoopbackBroker] = None
+def loopback_broker() -> LoopbackBroker:
+    global _loopback_broker
+    if _loopback_broker is None:
+        _loopback_broker = LoopbackBroker()
+    return _loopback_broker
+
+class LoopbackClient:
+    """The subset of paho's Client API used in this project, wired to LoopbackBroker."""
+
+    def __init__(self, client_id: str = "", userdata=None, broker: Optional[LoopbackBroker] = None):
+        self._client_id, self._userdata = client_id, userdata
+        self._broker = broker or loopback_broker()
+        self._connected = False
+        self._mid = 0
+        self.on_connect = self.on_disconnect = self.on_message = self.on_publish = self.on_log = None
+
+    def reconnect_delay_set(self, min_delay: int = 1, max_delay: int = 120) -> None:
+        pass
+
+    def connect(self, host: str = LOOPBACK, port: int = 0, keepalive: int = 60) -> int:
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, self._userdata, {}, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+    connect_async = connect
+
+    def disconnect(self) -> int:
+        self._connected = False
+        self._broker.unsubscribe(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, self._userdata, 0)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def loop_start(self) -> int:
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force: bool = False) -> int:
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_forever(self, *args, **kwargs) -> int:
+        while self._connected:
+            time.sleep(0.1)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic: str, qos: int = 0):
+        self._broker.subscribe(self, topic)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def unsubscribe(self, topic: str):
+        self._broker.unsubscribe(self, topic)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> _LoopbackInfo:
+        self._mid += 1
+        if isinstance(payload, str):
+            payload = payload.encode()
+        info = _LoopbackInfo(self._mid)
+        self._broker.publish(self, _LoopbackMessage(topic, payload or b"", qos, retain, self._mid), info)
+        return info
+
+    def _deliver(self, msg: _LoopbackMessage) -> None:
+        if self._connected and self.on_message:
+            self.on_message(self, self._userdata, msg)
+
+def make_client(broker: str = MQTT_BROKER, client_id: str = "") -> "mqtt.Client":
+    """paho Client (1.x or 2.x, classic callback signatures) or a LoopbackClient."""
+    if broker == LOOPBACK:
+        return LoopbackClient(client_id)
+    if hasattr(mqtt, "CallbackAPIVersion"):   # paho-mqtt ≥ 2.0
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id, protocol=mqtt.MQTTv311)
+    return mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv311)
+
+def _published(info) -> bool:
+    """paho's own flag, for acks that arrived before the mid was tracked (QoS 0 can ack inside publish)."""
+    try:
+        return info.is_published()
+    except (RuntimeError, ValueError):   # rc=NO_CONN / queue full: only _on_publish can tell
+        return False
+
+# ═════════════════════ PERSISTENT PUBLISHER ═════════════════════════════════
+class MqttPublisher:
+    """Single long-lived connection with background loop, QoS, batching and timing stats."""
+
+    def __init__(self, broker: str = MQTT_BROKER, port: int = MQTT_PORT, topic: str = MQTT_TOPIC,
+                 qos: int = MQTT_QOS, client_id: str = "",
+                 client_factory: Callable[[str, str], "mqtt.Client"] = make_client):
+        self.broker, self.port, self.topic, self.qos = broker, port, topic, qos
+        self.client = client_factory(broker, client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.on_message = self._on_message
+        self.connected = threading.Event()
+        self.connects = 0
+        self.counts = {"published": 0, "acked": 0, "failed": 0, "ack_timeouts": 0}
+        self.publish_latency: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self.ack_latency: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+        self._inflight: Dict[int, float] = {}                               # mid → publish time, until acked
+        self._unsent: Deque[int] = collections.deque(maxlen=LATENCY_WINDOW)  # mids that were never queued
+        self._handlers: Dict[str, List[Callable]] = {}
+        self._lock = threading.RLock()
+        self._acked = threading.Condition(self._lock)
+        self._started = False
+
+    # ── lifecycle ──────────────────────────────────────────────────────────
+    def start(self, wait: float = 5.0) -> "MqttPublisher":
+        if self._started:
+            return self
+        self._started = True
+        self.client.reconnect_delay_set(RECONNECT_MIN_S, RECONNECT_MAX_S)
+        try:
+            self.client.connect_async(self.broker, self.port, MQTT_KEEPALIVE)
+        except Exception as e:
+            print(f"⚠️ MQTT connect to {self.broker}:{self.port} failed: {e} (will retry)")
+        self.client.loop_start()
+        if wait and not self.connected.wait(wait):
+            print(f"⚠️ MQTT not connected after {wait:.0f}s, messages will be queued")
+        return self
+
+    def stop(self) -> None:
+        if not self._started:
+            return
+        self.client.disconnect()
+        self.client.loop_stop()
+        self._started = False
+        self.connected.clear()
+
+    # ── paho callbacks (network thread) ────────────────────────────────────
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        if rc == 0:
+            self.connects += 1
+            self.connected.set()
+            again = " (reconnected)" if self.connects > 1 else ""
+            print(f"🔌 MQTT connected to {self.broker}:{self.port}{again}")
+            for topic in list(self._handlers):   # subscriptions do not survive a reconnect
+                client.subscribe(topic, self.qos)
+        else:
+            print(f"❌ MQTT connect refused, rc={rc}")
+
+    def _on_disconnect(self, client, userdata, rc) -> None:
+        self.connected.clear()
+        if rc != 0:
+            print(f"⚠️ MQTT connection lost (rc={rc}), reconnecting with backoff…")
+
+    def _on_publish(self, client, userdata, mid) -> None:
+        with self._lock:
+            t0 = self._inflight.pop(mid, None)
+            if t0 is not None:
+                self.counts["acked"] += 1
+                self.ack_latency.append(time.perf_counter() - t0)
+                tracer.record("mqtt.ack", self.ack_latency[-1], t0)
+                self._acked.notify_all()
+
+    def _on_message(self, client, userdata, msg) -> None:
+        for sub, handlers in list(self._handlers.items()):
+            if mqtt.topic_matches_sub(sub, msg.topic):
+                for handler in handlers:
+                    try:
+                        handler(msg)
+                    except Exception as e:
+                        print(f"❌ MQTT handler for {sub} failed: {e}")
+
+    # ── subscriptions ──────────────────────────────────────────────────────
+    def subscribe(self, topic: str, handler: Callable) -> None:
+        """Call ``handler(msg)`` for messages on ``topic``; restored after every reconnect."""
+        first = topic not in self._handlers
+        self._handlers.setdefault(topic, []).append(handler)
+        if first and self.connected.is_set():
+            self.client.subscribe(topic, self.qos)
+
+    def unsubscribe(self, topic: str, handler: Optional[Callable] = None) -> None:
+        handlers = self._handlers.get(topic, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if handler is None or not handlers:
+            self._handlers.pop(topic, None)
+            if self.connected.is_set():
+                self.client.unsubscribe(topic)
+
+    # ── publishing ─────────────────────────────────────────────────────────
+    def publish(self, payload, topic: Optional[str] = None, qos: Optional[int] = None,
+                wait: bool = False, timeout: float = ACK_TIMEOUT_S):
+        """Publish a dict (sent as JSON), str or bytes. Returns paho's MQTTMessageInfo."""
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        topic = topic or self.topic
+        qos = self.qos if qos is None else qos
+        with self._lock:
+            t0 = time.perf_counter()
+            info = self.client.publish(topic, payload, qos=qos)
+            self.publish_latency.append(time.perf_counter() - t0)
+            tracer.record("mqtt.publish", self.publish_latency[-1], t0)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN):
+                self.counts["published"] += 1
+                self._inflight[info.mid] = t0
+            else:
+                self.counts["failed"] += 1
+                self._unsent.append(info.mid)
+                print(f"❌ MQTT publish to {topic} failed, rc={info.rc}")
+        if wait:
+            self.wait_for(info, timeout)
+        return info
+
+    def publish_batch(self, payloads: Iterable, topic: Optional[str] = None, qos: Optional[int] = None,
+                      wait: bool = True, timeout: float = ACK_TIMEOUT_S) -> list:
+        """Publish several messages back to back on the shared connection, then wait for all acks."""
+        infos = [self.publish(p, topic, qos) for p in payloads]
+        if wait:
+            deadline = time.monotonic() + timeout
+            for info in infos:
+                self.wait_for(info, max(0.0, deadline - time.monotonic()))
+        return infos
+
+    def wait_for(self, info, timeout: float = ACK_TIMEOUT_S) -> bool:
+        """Wait until ``info`` is acked (tracked through _on_publish, not paho's MQTTMessageInfo:
+        paho ≥2 raises on messages queued while disconnected even after they are delivered)."""
+        with self._acked:
+            if info.mid in self._unsent:
+                done = False
+            else:
+                done = self._acked.wait_for(lambda: info.mid not in self._inflight or _published(info), timeout)
+            if done:
+                return True
+            self.counts["ack_timeouts"] += 1
+        print(f"⚠️ MQTT message {info.mid} not acknowledged within {timeout:.1f}s")
+        return False
+
+    # ── reporting ──────────────────────────────────────────────────────────
+    def stats(self) -> dict:
+        return {"broker": f"{self.broker}:{self.port}", "qos": self.qos,
+                "connected": self.connected.is_set(), "connects": self.connects,
+                **self.counts, "inflight": len(self._inflight),
+                "publish_call": latency_summary(self.publish_latency), "ack": latency_summary(self.ack_latency)}
+
+_publisher: Optional[MqttPublisher] = None
+_publisher_lock = threading.Lock()
+
+def get_publisher() -> MqttPublisher:
+    """Process-wide publisher, connected on first use."""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = MqttPublisher().start()
+        return _publisher
@@ -0,0 +1,112 @@
+"""Local CPU pre-filter for parking-sign ("P") frames.
+
+Scores a frame in a few milliseconds by shape-matching its glyph-sized
+connected components (both polarities after Otsu thresholding, so a white P on
+a blue plate and a dark P on paper both count) against rendered "P"
+templates. A P has exactly one enclosed hole, which is required for a full
+score. ``decide()`` turns the score into "yes" / "no" / "ask": only frames
+between the two thresholds are sent to the remote vision model.
+"""
+from __future__ import annotations
+import os, threading, time
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+from tracing import tracer
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+P_PREFILTER     = os.getenv("P_PREFILTER", "1") == "1"
+P_LOCAL_REJECT  = float(os.getenv("P_LOCAL_REJECT", "0.45"))   # below: answered NO locally
+P_LOCAL_ACCEPT  = float(os.getenv("P_LOCAL_ACCEPT", "0.85"))   # at or above: answered YES locally
+P_MAX_SIDE      = int(os.getenv("P_MAX_SIDE", "320"))          # frames are downscaled to this before scoring
+
+GLYPH = (24, 32)                   # (w, h) the candidates and templates are compared at
+MIN_AREA, MAX_AREA = 0.002, 0.5    # component bbox area as a fraction of the frame
+MIN_ASPECT, MAX_ASPECT = 0.9, 2.6  # glyph height / width
+
+def _templates() -> List[np.ndarray]:
+    out = []
+    for font in (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_TRIPLEX):
+        for thick in (6, 10, 14):
+            canvas = np.zeros((120, 120), np.uint8)
+            cv2.putText(canvas, "P", (15, 100), font, 3.0, 255, thick, cv2.LINE_AA)
+            ys, xs = np.nonzero(canvas > 127)
+            crop = canvas[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+            out.append(cv2.resize(crop, GLYPH, interpolation=cv2.INTER_AREA) > 127)
+    return out
+
+_TEMPLATES = _templates()
+
+def _iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a & b) / union if union else 0.0
+
+def _glyph_score(mask: np.ndarray) -> float:
+    """Best template IoU for one binary component, halved unless it has exactly one hole."""
+    glyph = cv2.resize(mask.astype(np.uint8) * 255, GLYPH, interpolation=cv2.INTER_AREA) > 127
+    best = max(_iou(glyph, t) for t in _TEMPLATES)
+    _, hierarchy = cv2.findContours(mask.astype(np.uint8), cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    holes = 0 if hierarchy is None else sum(1 for h in hierarchy[0] if h[3] >= 0)
+    return best if holes == 1 else best * 0.5
+
+def load_gray(data) -> Optional[np.ndarray]:
+    """Grayscale frame from a path, encoded bytes or a BGR/gray array, downscaled to P_MAX_SIDE."""
+    if isinstance(data, str):
+        img = cv2.imread(data, cv2.IMREAD_GRAYSCALE)
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        img = data if data.ndim == 2 else cv2.cvtColor(data, cv2.COLOR_BGR2GRAY)
+    if img is None:
+        return None
+    scale = P_MAX_SIDE / max(img.shape)
+    if scale < 1:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
+
+def score(data) -> Optional[float]:
+    """0..1 likelihood-like score that the frame shows a "P"; None if it cannot be decoded."""
+    gray = load_gray(data)
+    if gray is None:
+        return None
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    frame_area = gray.shape[0] * gray.shape[1]
+    best = 0.0
+    for mask in (bw, 255 - bw):
+        n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        for i in range(1, n):
+            x, y, w, h, area = stats[i]
+            if not MIN_AREA <= w * h / frame_area <= MAX_AREA or not MIN_ASPECT <= h / w <= MAX_ASPECT:
+                continue
+            if x == 0 or y == 0 or x + w == gray.shape[1] or y + h == gray.shape[0]:
+                continue            # touches the border: background, not a glyph
+            best = max(best, _glyph_score(labels[y:y + h, x:x + w] == i))
+    return best
+
+class PreFilter:
+    """Three-way local decision with counters: "yes", "no" or "ask" (send to the vision model)."""
+
+    def __init__(self, reject: float = P_LOCAL_REJECT, accept: float = P_LOCAL_ACCEPT):
+        self.reject, self.accept = reject, accept
+        self.counts = {"yes": 0, "no": 0, "ask": 0}
+        self.seconds = 0.0
+        self._lock = threading.Lock()   # decide() runs on every ingest worker
+
+    def decide(self, data) -> Tuple[str, Optional[float]]:
+        t0 = time.perf_counter()
+        s = score(data)
+        dt = time.perf_counter() - t0
+        tracer.record("p.prefilter", dt, t0)
+        verdict = "ask" if s is None else "yes" if s >= self.accept else "no" if s < self.reject else "ask"
+        with self._lock:
+            self.seconds += dt
+            self.counts[verdict] += 1
+        return verdict, s
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts, seconds = dict(self.counts), self.seconds
+        n = sum(counts.values())
+        return {**counts, "ms_per_frame": round(1000 * seconds / n, 2) if n else 0.0,
+                "remote_share": round(counts["ask"] / n, 3) if n else 0.0}
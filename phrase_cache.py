@@ -0,0 +1,129 @@
+"""Pre-synthesised audio for the fixed phrases the agent says over and over.
+
+Entries are keyed by (text, language, voice, model) and hold decoded float32
+PCM in memory, mirrored to ``TTS_PHRASE_CACHE_DIR`` (default: .tts_cache next
+to this module, created on the first write) as .npz files so later runs start
+warm. Only registered phrases are cached; ``cached()`` wraps a
+synth function (see tts_stream.Synth) so hits never reach the network.
+Synths that ignore the language (OpenAI voices read any language) are
+wrapped with ``per_lang=False`` and keyed with ANY_LANG, so each text is
+synthesised and stored once.
+"""
+from __future__ import annotations
+import hashlib, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+TTS_PHRASE_CACHE_DIR = os.getenv("TTS_PHRASE_CACHE_DIR",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache"))
+
+Key = Tuple[str, str, str, str]   # (text, lang, voice, model)
+ANY_LANG = ""                      # lang in the key of language-independent synths
+
+class PhraseCache:
+    def __init__(self, directory: str = TTS_PHRASE_CACHE_DIR):
+        self.directory = directory
+        self.phrases: set = set()
+        self._mem: Dict[Key, Tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.counts = {"hits": 0, "disk_hits": 0, "misses": 0, "stored": 0}
+        self._made_dir = False     # created on the first write, not on import
+
+    def register(self, phrases: Iterable[str]) -> None:
+        self.phrases.update(p for p in phrases if p)
+
+    def _path(self, key: Key) -> str:
+        digest = hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.npz")
+
+    def get(self, key: Key, count: bool = True) -> Optional[Tuple[int, np.ndarray]]:
+        with self._lock:
+            hit = self._mem.get(key)
+        if hit is not None:
+            self.counts["hits"] += count
+            return hit
+        if self.directory:
+            try:
+                with np.load(self._path(key)) as f:
+                    hit = int(f["rate"]), f["pcm"].astype(np.float32) / 32768.0
+            except (OSError, KeyError, ValueError):
+                hit = None
+            if hit is not None:
+                with self._lock:
+                    self._mem[key] = hit
+                self.counts["disk_hits"] += count
+                return hit
+        self.counts["misses"] += count
+        return None
+
+    def put(self, key: Key, rate: int, pcm: np.ndarray) -> None:
+        pcm = np.ascontiguousarray(pcm, dtype=np.float32)
+        with self._lock:
+            self._mem[key] = (rate, pcm)
+        self.counts["stored"] += 1
+        if self.directory:
+            path = self._path(key)
+            tmp = f"{path}.tmp.npz"
+            try:
+                if not self._made_dir:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._made_dir = True
+                np.savez(tmp, rate=rate, pcm=(np.clip(pcm, -1, 1) * 32767).astype(np.int16))
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"⚠️ Could not write phrase cache {path}: {e}")
+
+    def lookup(self, text: str, lang: str, voice: str, model: str) -> Optional[Tuple[int, np.ndarray]]:
+        """Cached audio for a registered phrase, or None (a miss is counted by the synth wrapper)."""
+        if text not in self.phrases:
+            return None
+        hit = self.get((text, lang, voice, model), count=False)
+        if hit is not None:
+            self.counts["hits"] += 1
+        return hit
+
+    def cached(self, synth, voice: str, model: str, per_lang: bool = True):
+        """Wrap ``synth(text, lang)``: registered phrases are served from / stored into the cache."""
+        def wrapped(text: str, lang: str):
+            if text not in self.phrases:
+                yield from synth(text, lang)
+                return
+            key = (text, lang if per_lang else ANY_LANG, voice, model)
+            hit = self.get(key)
+            if hit is not None:
+                yield hit
+                return
+            chunks: List[np.ndarray] = []
+            rate = 0
+            for rate, chunk in synth(text, lang):
+                chunks.append(chunk)
+                yield rate, chunk
+            if chunks:
+                self.put(key, rate, np.concatenate(chunks))
+        return wrapped
+
+    def prewarm(self, synth, voice: str, model: str, items: Iterable[Tuple[str, str]],
+                workers: int = 4) -> threading.Thread:
+        """Synthesise missing (text, lang) pairs on a background thread."""
+        def run():
+            t0 = time.perf_counter()
+            todo = [(t, l) for t, l in items if self.get((t, l, voice, model), count=False) is None]
+            def one(item):
+                text, lang = item
+                try:
+                    chunks = [(r, c) for r, c in synth(text, lang)]
+                    if chunks:
+                        self.put((text, lang, voice, model), chunks[0][0], np.concatenate([c for _, c in chunks]))
+                except Exception as e:
+                    print(f"⚠️ Phrase pre-warm failed for {text!r} [{lang}]: {e}")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="phrase-warm") as pool:
+                list(pool.map(one, todo))
+            print(f"🔥 Phrase cache warm: {len(self._mem)} phrases ready "
+                  f"({len(todo)} synthesised in {time.perf_counter() - t0:.1f}s)")
+        t = threading.Thread(target=run, name="phrase-prewarm", daemon=True)
+        t.start()
+        return t
+
+    def stats(self) -> dict:
+        return {"entries": len(self._mem), **self.counts}
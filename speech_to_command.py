@@ -1,20 +1,36 @@
 from __future__ import annotations
-import io, json, os, re, time
-from typing import List, Dict, Tuple, Optional
+from startup import STARTUP_REPORT, lazy, lazy_module, resolve, startup
+import io, json, os, re, threading, time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
 import numpy as np
-import sounddevice as sd
-import soundfile  as sf
-import speech_recognition as sr
-import paho.mqtt.client as mqtt
-from openai import OpenAI
-from TTS.api import TTS
+startup.mark("import numpy")
+from coqui_pool import COQUI_MODELS, CoquiPool
 from dotenv import load_dotenv
-from langdetect import detect, DetectorFactory, detect_langs
-from langdetect.lang_detect_exception import LangDetectException
-import whisper
-
-# Set seed for consistent language detection
-DetectorFactory.seed = 0
+from audio_pipeline import StreamingRecognizer
+from mqtt_publisher import MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, get_publisher
+from command_sequencer import CommandSequencer
+from fleet import FLEET_ENABLED, Fleet
+from fast_parser import FastPathStats
+from command_schema import NO_COMMAND, RESPONSE_FORMAT, ParseStats, repair_prompt
+from command_schema import decode as decode_commands
+from command_cache import CommandCache
+from tts_stream import StreamingSpeaker
+from phrase_cache import ANY_LANG, PhraseCache
+from tracing import tracer
+from language import (DETECT_LANG_MAP, LANG_MAP, YES, NO, STOP, analyze, auto_detect_language,
+                      detect_explicit_language_request, is_language_switch_request, likely_cmd)
+from language import warmup as language_warmup
+if TYPE_CHECKING:
+    from TTS.api import TTS
+startup.mark("import project modules")
+
+# Heavy libraries are imported on first use (whisper/TTS pull in torch), timed in the startup report
+whisper  = lazy_module("whisper")
+openai   = lazy_module("openai")
+tiktoken = lazy_module("tiktoken")
+sr       = lazy_module("speech_recognition")
 
 # ═════════════════════════════ CONFIG ═══════════════════════════════════════
 load_dotenv()
@@ -22,49 +38,58 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 FINETUNED_MODEL = os.getenv("FINETUNED_MODEL")
 FALLBACK_MODEL = ""
 
-MQTT_BROKER, MQTT_PORT, MQTT_TOPIC = "test.mosquitto.org", 1883, "txt4/action"
-
 # OpenAI-TTS defaults (override in .env)
 OPENAI_TTS_MODEL = os.getenv("OPENAI_TTS_MODEL", "tts-1")   # or "tts-1-hd"
 OPENAI_VOICE     = os.getenv("OPENAI_VOICE", "alloy")       # alloy / onyx …
 
-# Optional loudness match for Coqui vs OpenAI (dB)
-COQUI_GAIN_DB = float(os.getenv("COQUI_GAIN_DB", "0"))
+# TTS routing: "auto" = OpenAI, switching to local Coqui when OpenAI fails or its
+# time to first audio exceeds TTS_LATENCY_LIMIT_S (for TTS_DEGRADED_S seconds)
+TTS_ENGINE          = os.getenv("TTS_ENGINE", "auto")        # auto / openai / coqui
+TTS_LATENCY_LIMIT_S = float(os.getenv("TTS_LATENCY_LIMIT_S", "1.5"))
+TTS_DEGRADED_S      = float(os.getenv("TTS_DEGRADED_S", "60"))
+COQUI_PRELOAD       = os.getenv("COQUI_PRELOAD", "0") == "1"  # load Coqui models at startup
+
+# Whisper STT: model is loaded once at startup and kept resident
+WHISPER_MODEL  = os.getenv("WHISPER_MODEL", "medium")      # tiny/base/small/medium/large
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "1") == "1"   # run one silent pass after load
+# Whisper's spoken-language ID is trusted at or above this probability; below it
+# the text heuristics in language.py decide
+WHISPER_LANG_MIN_PROB = float(os.getenv("WHISPER_LANG_MIN_PROB", "0.6"))
+
+# "stream": continuous VAD capture beside the main loop, "listen": one blocking listen per turn
+STT_MODE        = os.getenv("STT_MODE", "stream")
+STREAM_DUCK_TTS = os.getenv("STREAM_DUCK_TTS", "1") == "1"  # mute mic during our own speech (set 0 with a headset)
+TTS_PREWARM     = os.getenv("TTS_PREWARM", "1") == "1"      # synthesise fixed phrases for all languages at startup
+
+# GPT conversation window: SYSTEM_PROMPT is always sent, plus at most this many
+# recent user/assistant turns and this many prompt tokens (0 disables a limit)
+GPT_CONTEXT_TURNS  = int(os.getenv("GPT_CONTEXT_TURNS", "6"))
+GPT_CONTEXT_TOKENS = int(os.getenv("GPT_CONTEXT_TOKENS", "3000"))
+
+# GPT replies: JSON-schema structured output; invalid replies are sent back for repair this many times
+GPT_STRUCTURED     = os.getenv("GPT_STRUCTURED", "1") == "1"
+GPT_REPAIR_RETRIES = int(os.getenv("GPT_REPAIR_RETRIES", "1"))
+
+# Deterministic parser for plain movement commands; GPT is only the fallback
+FAST_PATH = os.getenv("FAST_PATH", "1") == "1"
+
+# Utterance → command cache (size/TTL/path in command_cache.py); optional embedding near-duplicates
+CMD_CACHE_EMBED       = os.getenv("CMD_CACHE_EMBED", "0") == "1"
+CMD_CACHE_EMBED_MODEL = os.getenv("CMD_CACHE_EMBED_MODEL", "text-embedding-3-small")
 # ═════════════════════ INITIALISE CLIENTS ═══════════════════════════════════
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-mqtt_client = mqtt.Client(protocol=mqtt.MQTTv311)
-try:
-    mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    print(f"🔌 MQTT connected to {MQTT_BROKER}:{MQTT_PORT}")
-except Exception as e:
-    print(f"⚠️ MQTT connection failed: {e}")
-    mqtt_client = None
+# Created on first use (or by the warm-up threads in main), not at import time
+openai_client = lazy("OpenAI client", lambda: openai.OpenAI(api_key=OPENAI_API_KEY))
+mqtt_publisher = lazy("MQTT connect", get_publisher)   # one persistent connection, background loop + reconnect
+# With FLEET_ROBOTS set, a confirmed plan runs on every robot at once (txt4/<robot_id>/action)
+sequencer = lazy("command sequencer", lambda: Fleet(resolve(mqtt_publisher)) if FLEET_ENABLED
+                 else CommandSequencer(resolve(mqtt_publisher), MQTT_TOPIC))
 
 # ═════════════════════ COQUI-TTS SETUP ══════════════════════════════════════
-COQUI_MODELS: Dict[str, Tuple[str, Optional[str]]] = {
-    "en-US": ("tts_models/en/ljspeech/tacotron2-DDC", None),
-    "de-DE": ("tts_models/de/thorsten/tacotron2-DDC", None),
-    "tr-TR": ("tts_models/tr/common-voice/glow-tts", None),
-    "fr-FR": ("tts_models/fr/css10/vits", None),
-    "es-ES": ("tts_models/es/mai/tacotron2-DDC", None),
-    "it-IT": ("tts_models/multilingual/multi-dataset/your_tts", "it_0"),
-    "ru-RU": ("tts_models/ru/ru_v3", None),
-}
-MULTI_SPKR_MODEL = "tts_models/multilingual/multi-dataset/your_tts"
-SPK_MAP = {"it-IT": "it_0", "fr-FR": "fr_0", "tr-TR": "tr_0",
-           "en-US": "en_0", "de-DE": "de_0", "es-ES": "es_0", "ru-RU": "ru_0"}
-
-tts_cache: Dict[str, Tuple[TTS, Optional[str]]] = {}
-def get_tts(lang: str) -> Tuple[TTS, Optional[str]]:
-    name, dflt = COQUI_MODELS.get(lang, (MULTI_SPKR_MODEL, "en_0"))
-    if lang not in tts_cache:
-        try:
-            tts_cache[lang] = (TTS(name, progress_bar=False, gpu=False), dflt)
-        except Exception as e:
-            print("⚠️  Coqui load failed, using multilingual model →", e)
-            tts_cache[lang] = (TTS(MULTI_SPKR_MODEL, progress_bar=False, gpu=False), "en_0")
-    return tts_cache[lang]
+# Models, speakers, gain and memory budget live in coqui_pool.py
+coqui_pool = CoquiPool()
+
+def get_tts(lang: str) -> Tuple["TTS", Optional[str]]:
+    return coqui_pool.get(lang)
 
 # ═════════════════════ SPEAK (OpenAI → Coqui) ═══════════════════════════════
 _SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
@@ -78,170 +103,104 @@ def _split(txt: str, max_len: int = 200) -> List[str]:
     if buf.strip(): out.append(buf.strip())
     return out
 
-def speak(text: str, lang: str = "en-US") -> None:
-    clean = re.sub(r"[`*_#>\"“”]", "", text).strip()
-    try:
-        t0 = time.time()
-        rsp = openai_client.audio.speech.create(
-            model  = OPENAI_TTS_MODEL,
-            voice  = OPENAI_VOICE,  # e.g., 'alloy', 'onyx', 'nova', etc.
-            input  = clean,
-        )
-        data, sr = sf.read(io.BytesIO(rsp.read()), dtype="float32")
-        sd.play(data, sr); sd.wait()
-        print(f"[🔊 OPENAI] {time.time()-t0:.2f}s • {len(data)} samples")
-        return
-    except Exception as err:
-        print(f"❌ OpenAI-TTS error: {err}")
-        print("[TTS] Could not speak the response.")
-        # No fallback to Coqui or any other TTS
-
-# ═════════════════════ LANG / INTENT HELPERS ════════════════════════════════
-LANG_MAP = {
-    "english": "en-US", "ingilizce": "en-US", "german": "de-DE", "deutsch": "de-DE",
-    "almanca": "de-DE", "turkish": "tr-TR", "türkçe": "tr-TR", "french": "fr-FR",
-    "français": "fr-FR", "spanish": "es-ES", "español": "es-ES",
-    "italian": "it-IT", "italiano": "it-IT",
-    # Add more Turkish words for better detection
-    "evet": "tr-TR", "hayır": "tr-TR", "tamam": "tr-TR", "anladım": "tr-TR",
-    "beni": "tr-TR", "anlayabiliyor": "tr-TR", "musun": "tr-TR", "türkçe": "tr-TR",
-    # Russian
-    "russian": "ru-RU", "русский": "ru-RU", "русский язык": "ru-RU", "по-русски": "ru-RU"
-}
-
-# Language detection mapping for langdetect results
-DETECT_LANG_MAP = {
-    "en": "en-US",
-    "de": "de-DE", 
-    "tr": "tr-TR",
-    "fr": "fr-FR",
-    "es": "es-ES",
-    "it": "it-IT",
-    "ru": "ru-RU"
-}
-
-# Common words for each language to improve detection
-LANG_WORDS = {
-    "en-US": ["hello", "hi", "hey", "yes", "no", "okay", "good", "bad", "move", "turn", "left", "right", "forward", "back", "the", "and", "you", "me", "what", "how", "why", "when", "where", "who"],
-    "tr-TR": ["merhaba", "selam", "evet", "hayır", "tamam", "iyi", "kötü", "hareket", "dön", "sol", "sağ", "ileri", "geri", "beni", "anlayabiliyor", "musun", "sen", "ben", "ne", "nasıl", "neden", "ne zaman", "nerede", "kim", "bu", "şu", "o", "bir", "iki", "üç", "dört", "beş", "altı", "yedi", "sekiz", "dokuz", "on", "lütfen", "teşekkür", "rica", "güzel", "kötü", "büyük", "küçük", "uzun", "kısa", "yeni", "eski", "genç", "yaşlı"],
-    "de-DE": ["hallo", "ja", "nein", "gut", "schlecht", "bewegen", "drehen", "links", "rechts", "vorwärts", "rückwärts", "bitte", "danke", "schön", "schlecht", "groß", "klein", "lang", "kurz", "neu", "alt", "jung", "alt"],
-    "fr-FR": ["bonjour", "oui", "non", "bien", "mal", "bouger", "tourner", "gauche", "droite", "avant", "arrière", "s'il vous plaît", "merci", "beau", "mauvais", "grand", "petit", "long", "court", "nouveau", "vieux", "jeune", "vieux"],
-    "es-ES": ["hola", "sí", "no", "bueno", "malo", "mover", "girar", "izquierda", "derecha", "adelante", "atrás", "por favor", "gracias", "bonito", "feo", "grande", "pequeño", "largo", "corto", "nuevo", "viejo", "joven", "viejo"],
-    "it-IT": ["ciao", "sì", "no", "bene", "male", "muovere", "girare", "sinistra", "destra", "avanti", "indietro", "per favore", "grazie", "bello", "brutto", "grande", "piccolo", "lungo", "corto", "nuovo", "vecchio", "giovane", "vecchio"],
-    "ru-RU": [
-        "привет", "здравствуйте", "да", "нет", "хорошо", "плохо", "двигаться", "повернуть", "налево", "направо", "вперёд", "назад", "пожалуйста", "спасибо", "большой", "маленький", "длинный", "короткий", "новый", "старый", "молодой", "старый", "робот", "команда", "движение", "выполнить", "стоп", "остановить", "поехали", "команду", "вперёд", "назад", "налево", "направо"
-    ]
-}
-
-def word_based_language_detection(text: str) -> Optional[str]:
-    """Detect language based on common words"""
-    text_lower = text.lower()
-    scores = {}
-    
-    for lang, words in LANG_WORDS.items():
-        score = sum(1 for word in words if word in text_lower)
-        if score > 0:
-            scores[lang] = score
-    
-    if scores:
-        # Only return if we have a clear winner (score difference > 1)
-        best_lang = max(scores.items(), key=lambda x: x[1])
-        second_best = None
-        if len(scores) > 1:
-            second_best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[1]
-        
-        # Only detect if we have a clear winner and minimum score
-        if best_lang[1] >= 2 and (not second_best or (best_lang[1] - second_best[1]) > 1):
-            print(f"🔍 Word-based detection: {best_lang[0]} (score: {best_lang[1]})")
-            return best_lang[0]
-        else:
-            if second_best:
-                print(f"🔍 Ambiguous word detection: {best_lang[0]} ({best_lang[1]}) vs {second_best[0]} ({second_best[1]})")
-            else:
-                print(f"🔍 Low confidence word detection: {best_lang[0]} (score: {best_lang[1]})")
-    
-    # If no words match, try partial word matching for Turkish
-    turkish_chars = ['ç', 'ğ', 'ı', 'ö', 'ş', 'ü']
-    if any(char in text_lower for char in turkish_chars):
-        print(f"🔍 Turkish detected by special characters")
-        return "tr-TR"
-    
-    return None
-
-def auto_detect_language(text: str) -> Optional[str]:
-    """Automatically detect language from text and return language code with confidence check"""
-    # First try word-based detection (more reliable for short phrases)
-    word_detected = word_based_language_detection(text)
-    if word_detected:
-        return word_detected
-    
-    # Fall back to langdetect for longer texts
-    try:
-        # Get all detected languages with confidence scores
-        detected_langs = detect_langs(text)
-        if not detected_langs:
-            print(f"🔍 No languages detected for: {text}")
-            return None
-        
-        # Get the most confident detection
-        best_lang = detected_langs[0]
-        print(f"🔍 Detected: {best_lang.lang} (confidence: {best_lang.prob:.3f}) for: {text}")
-        
-        # Lower confidence threshold to 0.5 for better detection
-        if best_lang.prob >= 0.5:
-            detected_code = DETECT_LANG_MAP.get(best_lang.lang)
-            if detected_code:
-                print(f"🔍 Language switch to: {detected_code}")
-                return detected_code
-        
-        return None
-    except LangDetectException as e:
-        print(f"🔍 Language detection error: {e}")
-        return None
+stream_recognizer: Optional[StreamingRecognizer] = None
+
+def _mic_guard():
+    """Keep the streaming recognizer from transcribing our own voice."""
+    if stream_recognizer is not None and STREAM_DUCK_TTS:
+        return stream_recognizer.muted()
+    return nullcontext()
+
+OPENAI_PCM_RATE = 24000   # response_format="pcm": 24 kHz, 16-bit, mono
+
+def openai_tts_chunks(text: str, lang: str):
+    """Stream OpenAI speech as float32 chunks while the response is still downloading."""
+    with openai_client.audio.speech.with_streaming_response.create(
+        model  = OPENAI_TTS_MODEL,
+        voice  = OPENAI_VOICE,  # e.g., 'alloy', 'onyx', 'nova', etc.
+        input  = text,
+        response_format = "pcm",
+    ) as rsp:
+        rest = b""
+        for data in rsp.iter_bytes(4800):
+            data = rest + data
+            n = len(data) - len(data) % 2
+            rest = data[n:]
+            if n:
+                yield OPENAI_PCM_RATE, np.frombuffer(data[:n], dtype=np.int16).astype(np.float32) / 32768.0
+
+# Fixed confirmations are served from pre-synthesised audio (memory + disk)
+LANG_NAMES = {"en-US": "English", "de-DE": "German", "tr-TR": "Turkish",
+              "fr-FR": "French", "es-ES": "Spanish", "it-IT": "Italian", "ru-RU": "Russian"}
+FIXED_PHRASES = [
+    "Executing.", "Cancelled.", "Plan ready. Say execute to run.",
+    "Say 'execute' to confirm, or modify the plan.",
+    "Sorry, I could not process your request.",
+    "OK, language or context switched. Awaiting your robot command.",
+] + [f"Switched to {name}. How can I help you?" for name in LANG_NAMES.values()]
+
+def _clean(text: str) -> str:
+    return re.sub(r"[`*_#>\"“”]", "", text).strip()
+
+phrase_cache = PhraseCache()
+phrase_cache.register(part for p in FIXED_PHRASES for part in _split(_clean(p)))
+# OpenAI voices read the text in whatever language it is written: one entry per text
+openai_tts = phrase_cache.cached(openai_tts_chunks, OPENAI_VOICE, OPENAI_TTS_MODEL, per_lang=False)
+
+class TTSRouter:
+    """Phrase cache first, then OpenAI; Coqui on errors, or for a cool-down period after slow
+    first audio — only while the Coqui pool can actually synthesise."""
+
+    def __init__(self):
+        self.degraded_until = 0.0
+        self.counts = {"cached": 0, "openai": 0, "coqui": 0, "fallbacks": 0}
+
+    def _degrade(self, why: str) -> bool:
+        if not coqui_pool.usable():
+            return False   # no offline engine: stay on OpenAI rather than go silent
+        if time.monotonic() >= self.degraded_until:
+            print(f"🔀 TTS → Coqui for {TTS_DEGRADED_S:.0f}s ({why})")
+        self.degraded_until = time.monotonic() + TTS_DEGRADED_S
+        return True
+
+    def __call__(self, text: str, lang: str):
+        hit = phrase_cache.lookup(text, ANY_LANG, OPENAI_VOICE, OPENAI_TTS_MODEL)
+        if hit is not None:   # fixed phrases play from the cache whichever engine is active
+            self.counts["cached"] += 1
+            yield hit
+            return
+        if TTS_ENGINE == "coqui" or (TTS_ENGINE == "auto" and time.monotonic() < self.degraded_until):
+            self.counts["coqui"] += 1
+            yield from coqui_pool.synth(text, lang)
+            return
+        t0, first = time.perf_counter(), True
+        try:
+            for chunk in openai_tts(text, lang):
+                if first:
+                    first = False
+                    if time.perf_counter() - t0 > TTS_LATENCY_LIMIT_S and TTS_ENGINE == "auto":
+                        self._degrade(f"first audio after {time.perf_counter() - t0:.2f}s")
+                yield chunk
+            self.counts["openai"] += 1
+        except Exception as err:
+            print(f"❌ OpenAI-TTS error: {err}")
+            if TTS_ENGINE != "auto" or not first or not self._degrade("request failed"):
+                return   # nothing to fall back to, or half the sentence was already played
+            self.counts["fallbacks"] += 1
+            yield from coqui_pool.synth(text, lang)
 
-# Language switch phrases that should not generate commands
-LANGUAGE_SWITCH_PHRASES = [
-    "i want to talk in", "i want to speak in", "switch to", "change to", "let's speak",
-    "ich möchte sprechen", "ich will sprechen", "wechseln zu", "ändern zu",
-    "quiero hablar", "quiero hablar en", "cambiar a", "cambia a",
-    "je veux parler", "je veux parler en", "changer à", "change à",
-    "voglio parlare", "voglio parlare in", "cambiare a", "cambia a",
-    "almanca", "türkçe", "ingilizce", "fransızca", "ispanyolca", "italyanca",
-    "german", "turkish", "english", "french", "spanish", "italian",
-    # Russian
-    "я хочу говорить на", "я хочу говорить по", "переключить на", "сменить на", "давай говорить на", "русский", "по-русски"
-]
-
-def detect_explicit_language_request(text: str) -> Optional[str]:
-    """Detect explicit language switch requests more accurately"""
-    text_lower = text.lower()
-    
-    # Direct language name detection
-    if "german" in text_lower or "deutsch" in text_lower or "almanca" in text_lower:
-        return "de-DE"
-    elif "english" in text_lower or "ingilizce" in text_lower:
-        return "en-US"
-    elif "turkish" in text_lower or "türkçe" in text_lower:
-        return "tr-TR"
-    elif "french" in text_lower or "français" in text_lower or "fransızca" in text_lower:
-        return "fr-FR"
-    elif "spanish" in text_lower or "español" in text_lower or "ispanyolca" in text_lower:
-        return "es-ES"
-    elif "italian" in text_lower or "italiano" in text_lower or "italyanca" in text_lower:
-        return "it-IT"
-    elif "russian" in text_lower or "русский" in text_lower or "по-русски" in text_lower:
-        return "ru-RU"
-    
-    return None
+tts_router = TTSRouter()
+speaker = StreamingSpeaker(tts_router, guard=_mic_guard, name="TTS")
 
-def is_language_switch_request(text: str) -> bool:
-    """Check if the user is just requesting a language switch"""
-    text_lower = text.lower()
-    return any(phrase in text_lower for phrase in LANGUAGE_SWITCH_PHRASES)
+def prewarm_phrases() -> threading.Thread:
+    return phrase_cache.prewarm(openai_tts_chunks, OPENAI_VOICE, OPENAI_TTS_MODEL,
+                                [(p, ANY_LANG) for p in sorted(phrase_cache.phrases)])
 
-CMD_HINTS = ("forward","back","move","spin","turn","left","right","wait",
-             "geri","ileri","dön","bekle","links","rechts")
-likely_cmd = lambda t:any(w in t.lower() for w in CMD_HINTS)
+def speak(text: str, lang: str = "en-US", wait: Optional[bool] = None) -> None:
+    """Queue text for playback. Blocks only in listen mode, where the mic must not hear us."""
+    if wait is None:
+        wait = stream_recognizer is None
+    speaker.say(_split(_clean(text)), lang, wait=wait)
 
 # ═════════════════════ GPT + JSON PARSER ════════════════════════════════════
 SYSTEM_PROMPT = """
@@ -266,16 +225,127 @@ Examples:
 - \"Turn around three times\" → {\"M1_dir\": \"cw\", \"M2_dir\": \"ccw\", \"speed\": 300, \"step_size\": 816}
 - \"Switch to German\" → NO_COMMAND
 """
-chat_hist = [{"role":"system","content":SYSTEM_PROMPT}]
-
-def gpt(prompt:str, temp:float)->str:
-    chat_hist.append({"role":"user","content":prompt})
-    reply = openai_client.chat.completions.create(
-        model="gpt-4o", messages=chat_hist, temperature=temp
-    ).choices[0].message.content.strip()
-    chat_hist.append({"role":"assistant","content":reply})
-    print(f"🧠 [gpt-4o]", reply)
-    return reply
+class ChatContext:
+    """System prompt + a sliding window of recent turns, bounded by turn count and token budget."""
+
+    def __init__(self, system_prompt: str, max_turns: int = GPT_CONTEXT_TURNS,
+                 max_tokens: int = GPT_CONTEXT_TOKENS, model: str = "gpt-4o"):
+        self.max_turns, self.max_tokens, self.model = max_turns, max_tokens, model
+        self.system_prompt = system_prompt
+        self._enc = None
+        self._enc_loaded = False
+        self._enc_lock = threading.Lock()
+        self.turns: List[Tuple[Tuple[dict, int], Tuple[dict, int]]] = []   # ((user, ntok), (assistant, ntok))
+        self.last_prompt_tokens = 0
+
+    def warmup(self) -> None:
+        """Load the tokenizer (a BPE file, downloaded on first use) before the first turn needs it."""
+        with self._enc_lock:
+            if self._enc_loaded:
+                return
+            try:
+                self._enc = tiktoken.encoding_for_model(self.model)
+            except Exception as e:   # unknown model name or BPE file not downloadable offline
+                print(f"⚠️ tiktoken unavailable ({e}), estimating tokens as chars/4")
+                self._enc = None
+            self._enc_loaded = True
+            self.system = ({"role": "system", "content": self.system_prompt}, self._count(self.system_prompt))
+
+    def _count(self, text: str) -> int:
+        if not self._enc_loaded:
+            self.warmup()
+        # 3 tokens of per-message overhead, as in OpenAI's chat token accounting
+        return 3 + (len(self._enc.encode(text)) if self._enc else len(text) // 4 + 1)
+
+    def messages(self, prompt: str) -> List[dict]:
+        """Messages for the next request; oldest turns are dropped first to fit the limits."""
+        self.warmup()
+        user = ({"role": "user", "content": prompt}, self._count(prompt))
+        budget = (self.max_tokens or float("inf")) - self.system[1] - user[1] - 3
+        kept: List[Tuple[dict, int]] = []
+        recent = self.turns[-self.max_turns:] if self.max_turns else self.turns
+        for u, a in reversed(recent):
+            if u[1] + a[1] > budget:
+                break
+            budget -= u[1] + a[1]
+            kept[:0] = [u, a]
+        msgs = [self.system] + kept + [user]
+        self.last_prompt_tokens = sum(n for _, n in msgs) + 3
+        return [m for m, _ in msgs]
+
+    def record(self, prompt: str, reply: str) -> None:
+        self.turns.append((({"role": "user", "content": prompt}, self._count(prompt)),
+                           ({"role": "assistant", "content": reply}, self._count(reply))))
+        if self.max_turns:
+            del self.turns[:-self.max_turns]
+
+chat_ctx = ChatContext(SYSTEM_PROMPT)
+fast_path = FastPathStats()
+
+def embed_text(text: str) -> np.ndarray:
+    rsp = openai_client.embeddings.create(model=CMD_CACHE_EMBED_MODEL, input=text)
+    return np.asarray(rsp.data[0].embedding, dtype=np.float32)
+
+cmd_cache = CommandCache(embed=embed_text if CMD_CACHE_EMBED else None)
+
+parse_stats = ParseStats()
+_structured = GPT_STRUCTURED   # switched off for the session if the API rejects response_format
+
+def _chat(messages: List[dict], temp: float):
+    """One chat completion, with structured output while the API accepts it."""
+    global _structured
+    extra = {"response_format": RESPONSE_FORMAT} if _structured else {}
+    t0 = time.perf_counter()
+    try:
+        with tracer.span("gpt"):
+            rsp = openai_client.chat.completions.create(
+                model="gpt-4o", messages=messages, temperature=temp, **extra
+            )
+    except openai.BadRequestError as e:
+        if not extra:
+            raise
+        _structured = False
+        print(f"⚠️ Structured output rejected ({e}), using plain JSON prompting")
+        return _chat(messages, temp)
+    fast_path.record_gpt(time.perf_counter() - t0)
+    return rsp
+
+def gpt_commands(prompt: str, temp: float) -> Optional[List[dict]]:
+    """GPT → validated command list ([] for NO_COMMAND), or None if no valid reply came back.
+
+    An invalid reply is returned to GPT with the validation errors, at most
+    GPT_REPAIR_RETRIES times, instead of being read out to the user.
+    """
+    messages = chat_ctx.messages(prompt)
+    estimate = chat_ctx.last_prompt_tokens
+    cmds, attempt = None, 0
+    for attempt in range(1, GPT_REPAIR_RETRIES + 2):
+        rsp = _chat(messages, temp)
+        used = getattr(rsp.usage, "prompt_tokens", None)   # what the API actually counted
+        print(f"🧮 Prompt{f' (repair {attempt - 1})' if attempt > 1 else ''}: "
+              f"{len(messages)} msgs • ~{estimate} tokens (API: {used})")
+        msg = rsp.choices[0].message
+        refusal = getattr(msg, "refusal", None)
+        reply = (msg.content or "").strip()
+        print(f"🧠 [gpt-4o] {reply or refusal}")
+        if refusal:
+            parse_stats.reply([refusal], refusal=True)
+            break
+        with tracer.span("parse"):
+            cmds, errors = decode_commands(reply)
+        parse_stats.reply(errors)
+        if cmds is not None:
+            break
+        print(f"🧩 Invalid command reply ({'; '.join(errors)})"
+              + (", asking GPT to repair it" if attempt <= GPT_REPAIR_RETRIES else ""))
+        repair = [{"role": "assistant", "content": reply}, {"role": "user", "content": repair_prompt(errors)}]
+        messages = messages + repair
+        estimate += sum(chat_ctx._count(m["content"]) for m in repair)
+    parse_stats.turn(cmds, attempt)
+    if cmds is None:
+        return None
+    chat_ctx.record(prompt, json.dumps(cmds) if cmds else NO_COMMAND)   # only valid replies go into the context
+    return validate_and_correct_commands(cmds)
 
 def validate_and_correct_commands(cmds: List[dict]) -> List[dict]:
     """Validate and correct step sizes for turns"""
@@ -307,53 +377,196 @@ def validate_and_correct_commands(cmds: List[dict]) -> List[dict]:
     return corrected_cmds
 
 def get_cmds(txt:str)->Optional[List[dict]]:
-    try: obj=json.loads(txt); return validate_and_correct_commands(obj if isinstance(obj,list) else [obj])
-    except: pass
-    m=re.search(r"```(?:json)?\s+(.*?)```",txt,re.S)
-    if m:
-        try: obj=json.loads(m.group(1)); return validate_and_correct_commands(obj if isinstance(obj,list) else [obj])
-        except: pass
-    return None
-
-YES=("execute","run","go","yes","onayla","evet","uygula","ja","oui","sí")
-NO =("cancel","no","hayır","iptal","nein","non")
-
-def recognize_with_whisper():
-    import tempfile
-    import soundfile as sf
-    recognizer = sr.Recognizer()
-    recognizer.energy_threshold = 300  # adjust for your mic/environment
-    recognizer.pause_threshold = 0.8   # seconds of silence to consider as end of phrase
-    with sr.Microphone() as source:
-        print("🎙️ Listening... (auto-stop on short silence)")
-        audio = recognizer.listen(source, timeout=3)  # Wait up to 3s for speech to start
-        print("🛑 Recording stopped.")
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            f.write(audio.get_wav_data())
-            temp_wav = f.name
-    import whisper
-    model = whisper.load_model("medium")
-    result = model.transcribe(temp_wav, language=None)
-    text = result["text"].strip()
-    print(f"📝 Whisper recognized: {text}")
-    return text
+    """Validated commands from a reply text; None for NO_COMMAND or an invalid reply."""
+    cmds, _ = decode_commands(txt)
+    return validate_and_correct_commands(cmds) if cmds else None
+
+
+# ═════════════════════ WHISPER ASR ENGINE ═══════════════════════════════════
+@dataclass
+class Recognition:
+    """One recognised utterance with Whisper's own language ID."""
+    text: str
+    language: Optional[str] = None          # e.g. "de-DE"; None when unsupported or below WHISPER_LANG_MIN_PROB
+    probability: float = 0.0                # Whisper's probability for the detected language
+    whisper_lang: str = ""                  # raw Whisper code, e.g. "de"
+    segments: List[Tuple[float, float, str]] = field(default_factory=list)   # (start s, end s, text)
+    t_end: float = 0.0                      # perf_counter() when the speech ended (start of the turn trace)
+
+class WhisperEngine:
+    """Long-lived Whisper model shared by every turn of the main loop."""
+
+    def __init__(self, model_name: str = WHISPER_MODEL):
+        self.model_name = model_name
+        self.model = None
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+        self.inference_times: List[float] = []
+        self.lang_counts = {"whisper": 0, "text_fallback": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self, warmup: bool = WHISPER_WARMUP) -> "WhisperEngine":
+        with self._lock:
+            if self.model is None:
+                t0 = time.perf_counter()
+                self.model = whisper.load_model(self.model_name)
+                self.load_time = time.perf_counter() - t0
+                print(f"🧠 Whisper '{self.model_name}' loaded in {self.load_time:.2f}s")
+        if warmup and not self.warmup_time:
+            self.warmup()
+        return self
+
+    def warmup(self) -> None:
+        """Transcribe one second of silence so the first real utterance is not slowed down."""
+        silence = np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32)
+        t0 = time.perf_counter()
+        with self._lock:
+            self.model.transcribe(silence, language="en")
+        self.warmup_time = time.perf_counter() - t0
+        print(f"🔥 Whisper warm-up pass took {self.warmup_time:.2f}s")
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        if self.model is None:
+            self.load()
+        t0 = time.perf_counter()
+        with self._lock, tracer.span("asr.transcribe"):
+            result = self.model.transcribe(audio, **kwargs)
+        dt = time.perf_counter() - t0
+        self.inference_times.append(dt)
+        print(f"⏱️ Whisper inference {dt:.2f}s (model load {self.load_time:.2f}s, paid once)")
+        return result
+
+    def detect_language(self, audio: np.ndarray) -> Tuple[str, float]:
+        """Whisper language ID on the first 30 s of ``audio``: (code, probability)."""
+        if self.model is None:
+            self.load()
+        n_mels = getattr(self.model.dims, "n_mels", 80)
+        clip = whisper.pad_or_trim(audio)
+        mel = whisper.log_mel_spectrogram(clip, n_mels) if n_mels != 80 else whisper.log_mel_spectrogram(clip)
+        with self._lock, tracer.span("asr.langid"):
+            _, probs = self.model.detect_language(mel.to(self.model.device))
+        code = max(probs, key=probs.get)
+        return code, float(probs[code])
+
+    def recognize(self, audio: np.ndarray, min_prob: float = WHISPER_LANG_MIN_PROB) -> Recognition:
+        """Language ID once, then transcribe in that language (transcribe() skips its own detection)."""
+        code, prob = self.detect_language(audio)
+        result = self.transcribe(audio, language=code)
+        lang = DETECT_LANG_MAP.get(code) if prob >= min_prob else None
+        self.lang_counts["whisper" if lang else "text_fallback"] += 1
+        print(f"🌐 Whisper language: {code} (p={prob:.2f})"
+              + ("" if lang else " → low confidence or unsupported, using text heuristics"))
+        return Recognition(
+            text=result["text"].strip(), language=lang, probability=prob, whisper_lang=code,
+            segments=[(s["start"], s["end"], s["text"].strip()) for s in result.get("segments", [])])
+
+    def stats(self) -> dict:
+        n = len(self.inference_times)
+        return {
+            "model": self.model_name,
+            "language_id": dict(self.lang_counts),
+            "load_s": round(self.load_time, 3),
+            "warmup_s": round(self.warmup_time, 3),
+            "utterances": n,
+            "inference_mean_s": round(sum(self.inference_times) / n, 3) if n else 0.0,
+            "inference_last_s": round(self.inference_times[-1], 3) if n else 0.0,
+        }
+
+asr_engine = WhisperEngine()
+
+def audio_to_float32(audio: "sr.AudioData", rate: int = 16000) -> np.ndarray:
+    """Convert captured mic audio to the mono float32 buffer Whisper expects (no WAV, no ffmpeg)."""
+    pcm = audio.get_raw_data(convert_rate=rate, convert_width=2)
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+def recognize_with_whisper(samples: Optional[np.ndarray] = None) -> Recognition:
+    """One blocking listen on the mic, or recognise ``samples`` (16 kHz float32, e.g. a replayed WAV)."""
+    if samples is None:
+        recognizer = sr.Recognizer()
+        recognizer.energy_threshold = 300  # adjust for your mic/environment
+        recognizer.pause_threshold = 0.8   # seconds of silence to consider as end of phrase
+        with sr.Microphone() as source:
+            print("🎙️ Listening... (auto-stop on short silence)")
+            audio = recognizer.listen(source, timeout=3)  # Wait up to 3s for speech to start
+            print("🛑 Recording stopped.")
+        samples = audio_to_float32(audio, whisper.audio.SAMPLE_RATE)
+    t_end = time.perf_counter()
+    tracer.record("asr.capture", len(samples) / whisper.audio.SAMPLE_RATE)
+    rec = asr_engine.recognize(samples)
+    rec.t_end = t_end
+    print(f"📝 Whisper recognized: {rec.text}")
+    return rec
+
+def next_utterance() -> Recognition:
+    """Next transcript: from the streaming pipeline if running, else one blocking listen."""
+    if stream_recognizer is None:
+        return recognize_with_whisper()
+    print("🎙️ Listening (streaming)...")
+    while True:
+        tr = stream_recognizer.get(timeout=0.5)
+        if tr is not None:
+            break
+    print(f"📝 Whisper recognized: {tr.text}")
+    rec = tr.result
+    rec.t_end = time.perf_counter() - (time.time() - tr.segment.end)
+    tracer.record("asr.capture", tr.segment.duration)
+    tracer.record("asr.queue_wait", tr.picked - tr.segment.emitted)
+    st = stream_recognizer.stats()
+    print(f"📊 Stream queues {st['queue_depth']} • end-to-end {st['latency']['end_to_end']['mean_s']}s")
+    return rec
+
+def to_robot_cmd(c: dict) -> dict:
+    """Only send supported keys for Robo Pro, with motor directions swapped."""
+    cmd = {k: c[k] for k in ['M1_dir', 'M2_dir', 'speed', 'step_size'] if k in c}
+    for dir_key in ['M1_dir', 'M2_dir']:
+        if dir_key in cmd:
+            if cmd[dir_key] == 'cw':
+                cmd[dir_key] = 'ccw'
+            elif cmd[dir_key] == 'ccw':
+                cmd[dir_key] = 'cw'
+    return cmd
 
 def publish_command(cmd):
-    client = mqtt.Client()
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    client.publish(MQTT_TOPIC, json.dumps(cmd))
+    mqtt_publisher.publish(cmd, MQTT_TOPIC)
     print(f"📡 Published to {MQTT_TOPIC}: {cmd}")
-    client.disconnect()
+
+startup.mark("module setup")
 
 # ═════════════════════ MAIN LOOP ════════════════════════════════════════════
 def main()->None:
+    global stream_recognizer
     pending = None
+    # Models and connections load on background threads while the mic is already listening;
+    # speech captured meanwhile waits in the pipeline queues (STARTUP_MODE=eager: load first)
+    startup.warm("whisper", asr_engine.load)
+    startup.warm("mqtt", resolve, sequencer)
+    startup.warm("openai", resolve, openai_client)
+    startup.warm("tiktoken", chat_ctx.warmup)
+    startup.warm("langdetect", language_warmup)
+    # prewarm/preload return their own thread: join it so the step is timed and awaited
+    if TTS_PREWARM:
+        startup.warm("phrase cache", lambda: prewarm_phrases().join())
+    if COQUI_PRELOAD or TTS_ENGINE == "coqui":
+        startup.warm("coqui", lambda: coqui_pool.preload(COQUI_MODELS).join())
+    if STT_MODE == "stream":
+        with startup.step("microphone stream"):
+            stream_recognizer = StreamingRecognizer(
+                asr_engine.recognize, text_of=lambda rec: rec.text,
+                on_speech=None if STREAM_DUCK_TTS else speaker.stop).start()   # barge-in needs an open mic
+    startup.ready()
+    if STARTUP_REPORT:
+        startup.report_when_done()
     print("🎤 Robot agent active…  (Ctrl+C quits)")
     print("🌍 Whisper STT + OpenAI TTS + GPT-4o for robot commands!")
     
     while True:
         try:
-            utter = recognize_with_whisper()
+            rec = next_utterance()
+            utter = rec.text
             if not utter:
                 print("🤷 not understood")
                 continue
@@ -363,71 +576,109 @@ def main()->None:
             print(f"❌ Error during recognition: {e}")
             continue
 
-        # Check if this is just a language switch request
-        if is_language_switch_request(utter):
-            # Use explicit language detection for switch requests
-            explicit_lang = detect_explicit_language_request(utter)
-            if explicit_lang:
-                detected_lang = explicit_lang
-                print(f"🔍 Explicit language switch detected: {detected_lang}")
-            else:
-                # Fallback to auto-detection if explicit detection fails
-                detected_lang = auto_detect_language(utter) or "en-US"
+        # Everything from end of speech to the reply is one trace (TRACE=1)
+        with tracer.trace("turn", start=rec.t_end or None, text=utter):
+            # One pass over the words: language scores, switch request, yes/no/stop
+            with tracer.span("language"):
+                info = analyze(utter)
+
+            # Check if this is just a language switch request
+            if info.switch_request:
+                tracer.annotate(route="switch")
+                # Use explicit language detection for switch requests
+                if info.explicit_lang:
+                    detected_lang = info.explicit_lang
+                    print(f"🔍 Explicit language switch detected: {detected_lang}")
+                else:
+                    # Fallback to the spoken language if no language was named
+                    detected_lang = rec.language or auto_detect_language(utter, info) or "en-US"
             
-            lang_names = {"en-US": "English", "de-DE": "German", "tr-TR": "Turkish", 
-                         "fr-FR": "French", "es-ES": "Spanish", "it-IT": "Italian", "ru-RU": "Russian"}
-            speak(f"Switched to {lang_names.get(detected_lang, detected_lang)}. How can I help you?", detected_lang)
-            continue
+                speak(f"Switched to {LANG_NAMES.get(detected_lang, detected_lang)}. How can I help you?", detected_lang)
+                continue
 
-        # Detect language from the recognized text (like ChatGPT)
-        detected_lang = auto_detect_language(utter)
-        if not detected_lang:
-            detected_lang = "en-US"  # Default fallback
+            # Whisper's language ID; the text heuristics only run when it was not confident
+            with tracer.span("language"):
+                detected_lang = rec.language or auto_detect_language(utter, info)
+            tracer.annotate(lang=detected_lang, lang_source="whisper" if rec.language else "text")
+            if not detected_lang:
+                detected_lang = "en-US"  # Default fallback
         
-        print(f"🔍 Detected language: {detected_lang}")
-
-        low=utter.lower()
-        if pending:
-            if any(w in low for w in YES):
-                speak("Executing.", detected_lang)
-                for c in pending:
-                    # Only send supported keys for Robo Pro, but swap directions
-                    cmd = {k: c[k] for k in ['M1_dir', 'M2_dir', 'speed', 'step_size'] if k in c}
-                    # Swap directions
-                    for dir_key in ['M1_dir', 'M2_dir']:
-                        if dir_key in cmd:
-                            if cmd[dir_key] == 'cw':
-                                cmd[dir_key] = 'ccw'
-                            elif cmd[dir_key] == 'ccw':
-                                cmd[dir_key] = 'cw'
-                    
-                    print(f"🤖 Sending command: {cmd}")
-                    publish_command(cmd)
-                    time.sleep(1.0)
-                pending=None; continue
-            if any(w in low for w in NO):
-                speak("Cancelled.", detected_lang); pending=None; continue
-            speak("Say 'execute' to confirm, or modify the plan.", detected_lang); continue
+            print(f"🔍 Detected language: {detected_lang}"
+                  f" ({'whisper' if rec.language else 'text'}, p={rec.probability:.2f})")
+
+            if sequencer.running and info.stop:
+                sequencer.cancel()
+                speak("Cancelled.", detected_lang); continue
+
+            if pending:
+                tracer.annotate(route="confirm")
+                if info.yes:
+                    try:
+                        # runs in the background, paced by robot acks or step_size/speed estimates
+                        sequencer.start([to_robot_cmd(c) for c in pending])
+                    except LookupError as e:   # fleet mode with no robot registered yet: keep the plan
+                        print(f"⚠️ Plan not started: {e}")
+                        speak("No robot is connected yet. Say 'execute' again once it is online.", detected_lang)
+                        continue
+                    speak("Executing.", detected_lang)
+                    pending=None; continue
+                if info.no:
+                    speak("Cancelled.", detected_lang); pending=None; continue
+                speak("Say 'execute' to confirm, or modify the plan.", detected_lang); continue
+
+            with tracer.span("fast_path"):
+                cmds = fast_path.parse(utter, detected_lang) if FAST_PATH else None
+            if cmds:
+                tracer.annotate(route="fast_path")
+                print(f"⚡ Fast-path parse: {cmds}  {fast_path.summary()}")
+                chat_ctx.record(utter, json.dumps(cmds))   # keep GPT aware of the plan for follow-ups
+                pending = validate_and_correct_commands(cmds)
+                speak("Plan ready. Say execute to run.", detected_lang)
+                continue
 
-        try:
-            reply = gpt(utter, 0.2)
-        except Exception as err:
-            print("⚠️ GPT-4o failed:", err)
-            speak("Sorry, I could not process your request.", detected_lang)
-            continue
+            with tracer.span("cache"):
+                cmds = cmd_cache.get(utter, detected_lang)
+            if cmds:
+                tracer.annotate(route="cache")
+                print(f"🗂️ Cache hit: {cmds}  {cmd_cache.stats()}")
+                chat_ctx.record(utter, json.dumps(cmds))
+                pending = cmds
+                speak("Plan ready. Say execute to run.", detected_lang)
+                continue
 
-        # If GPT says NO_COMMAND, do not prompt for execution or send to robot
-        if reply.strip() == "NO_COMMAND":
-            speak("OK, language or context switched. Awaiting your robot command.", detected_lang)
-            continue
+            tracer.annotate(route="gpt")
+            try:
+                cmds = gpt_commands(utter, 0.2)
+            except Exception as err:
+                print("⚠️ GPT-4o failed:", err)
+                cmds = None
+            if cmds is None:
+                speak("Sorry, I could not process your request.", detected_lang)
+                continue
 
-        if (cmds:=get_cmds(reply)):
+            # If GPT says NO_COMMAND, do not prompt for execution or send to robot
+            if not cmds:
+                speak("OK, language or context switched. Awaiting your robot command.", detected_lang)
+                continue
+
+            cmd_cache.put(utter, detected_lang, cmds)
             pending=cmds; speak("Plan ready. Say execute to run.", detected_lang)
-        else:
-            speak(reply, detected_lang)
 
-    if mqtt_client:
-        mqtt_client.disconnect()
+    print(f"📊 Whisper stats: {asr_engine.stats()}")
+    print(f"📊 Fast-path stats: {fast_path.summary()}")
+    print(f"📊 Command cache stats: {cmd_cache.stats()}")
+    print(f"📊 Command parse stats: {parse_stats.summary()}")
+    print(f"📊 TTS stats: {speaker.stats()} • routes {tts_router.counts}")
+    print(f"📊 Coqui stats: {coqui_pool.stats()}")
+    print(f"📊 Phrase cache stats: {phrase_cache.stats()}")
+    if stream_recognizer is not None:
+        print(f"📊 Stream stats: {stream_recognizer.stats()}")
+        stream_recognizer.stop()
+    sequencer.cancel()
+    print(f"📊 Sequencer stats: {sequencer.stats()}")
+    print(f"📊 MQTT stats: {mqtt_publisher.stats()}")
+    tracer.report()
+    mqtt_publisher.stop()
 
 # ════════════════════════════════════════════════════════════════════════════
 if __name__=="__main__":
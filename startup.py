@@ -0,0 +1,133 @@
+"""Startup timing, lazy imports and background warm-up.
+
+    whisper = lazy_module("whisper")                 # imported on first attribute access
+    client  = lazy("OpenAI client", lambda: openai.OpenAI())
+    startup.warm("whisper", asr_engine.load)         # runs on a background thread
+    startup.ready()                                  # the mic is listening from here on
+
+Every import and initialisation step is timed with the thread it ran on;
+``startup.report()`` prints the breakdown. With STARTUP_MODE=eager warm-ups
+run inline, in order, before ``ready()`` (the old behaviour: everything is
+loaded before the first utterance).
+"""
+from __future__ import annotations
+import importlib, os, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+STARTUP_MODE   = os.getenv("STARTUP_MODE", "lazy")          # lazy / eager
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "1") == "1"    # print the breakdown once warm-up is done
+
+class StartupTimer:
+    """Records (step, thread, start offset, duration) from the moment this module was imported."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.ready_s: Optional[float] = None
+        self.steps: List[Tuple[str, str, float, float]] = []
+        self.errors: Dict[str, Exception] = {}
+        self._threads: List[threading.Thread] = []
+        self._mark = self.t0
+        self._lock = threading.Lock()
+
+    def _add(self, name: str, start: float, seconds: float) -> None:
+        with self._lock:
+            self.steps.append((name, threading.current_thread().name, start - self.t0, seconds))
+
+    @contextmanager
+    def step(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, t, time.perf_counter() - t)
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark (e.g. a block of module-level imports)."""
+        now = time.perf_counter()
+        self._add(name, self._mark, now - self._mark)
+        self._mark = now
+
+    def warm(self, name: str, fn: Callable, *args) -> Optional[threading.Thread]:
+        """Run ``fn(*args)`` on a background thread (inline with STARTUP_MODE=eager)."""
+        def run():
+            try:
+                with self.step(name):
+                    fn(*args)
+            except Exception as e:
+                self.errors[name] = e
+                print(f"⚠️ Warm-up '{name}' failed: {e}")
+        if STARTUP_MODE == "eager":
+            run()
+            return None
+        t = threading.Thread(target=run, name=f"warm:{name}", daemon=True)
+        t.start()
+        self._threads.append(t)
+        return t
+
+    def pending(self) -> List[str]:
+        return [t.name[5:] for t in self._threads if t.is_alive()]
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in list(self._threads):
+            t.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not self.pending()
+
+    def ready(self) -> None:
+        self.ready_s = time.perf_counter() - self.t0
+        busy = self.pending()
+        print(f"👂 Ready after {self.ready_s:.2f}s" + (f", still warming up: {', '.join(busy)}" if busy else ""))
+
+    def report(self) -> None:
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s[2])
+        print(f"⏱️ Startup ({STARTUP_MODE}): ready after {self.ready_s or 0:.2f}s, "
+              f"warm after {max((s + d for _, _, s, d in steps), default=0):.2f}s")
+        print(f"   {'step':34} {'thread':22} {'at s':>6} {'took s':>7}")
+        for name, thread, start, seconds in steps:
+            print(f"   {name:34} {thread[:22]:22} {start:6.2f} {seconds:7.2f}")
+
+    def report_when_done(self) -> threading.Thread:
+        t = threading.Thread(target=lambda: (self.wait(), self.report()), name="startup-report", daemon=True)
+        t.start()
+        return t
+
+startup = StartupTimer()
+
+_UNSET = object()
+
+class Lazy:
+    """Stand-in that builds the real object on first attribute access (thread-safe, timed)."""
+
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self._lazy_name, self._lazy_factory = name, factory
+        self._lazy_obj = _UNSET
+        self._lazy_lock = threading.Lock()
+
+    def _lazy_get(self):
+        if self._lazy_obj is _UNSET:
+            with self._lazy_lock:
+                if self._lazy_obj is _UNSET:
+                    with startup.step(self._lazy_name):
+                        self._lazy_obj = self._lazy_factory()
+        return self._lazy_obj
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy_get(), attr)
+
+    def __repr__(self) -> str:
+        state = "unresolved" if self._lazy_obj is _UNSET else repr(self._lazy_obj)
+        return f"<lazy {self._lazy_name}: {state}>"
+
+def lazy(name: str, factory: Callable[[], object]) -> Lazy:
+    return Lazy(name, factory)
+
+def lazy_module(module: str) -> Lazy:
+    """Module proxy: ``import module`` happens on first use, timed as ``import <module>``."""
+    return Lazy(f"import {module}", lambda: importlib.import_module(module))
+
+def resolve(obj):
+    """The real object behind a Lazy (built now if needed); other objects are returned as-is."""
+    return obj._lazy_get() if isinstance(obj, Lazy) else obj
@@ -0,0 +1,58 @@
+from command_cache import CommandCache
+from fast_parser import parse_command
+
+FWD = lambda n: {"M1_dir": "cw", "M2_dir": "cw", "speed": 300, "step_size": n}
+BACK = lambda n: {"M1_dir": "ccw", "M2_dir": "ccw", "speed": 300, "step_size": n}
+LEFT = lambda n: {"M1_dir": "cw", "M2_dir": "ccw", "speed": 300, "step_size": n}
+RIGHT = lambda n: {"M1_dir": "ccw", "M2_dir": "cw", "speed": 300, "step_size": n}
+
+# phrase → expected command list (None = not confident, GPT handles it)
+CASES = [
+    ("go forward 100 steps", [FWD(100)]),
+    ("move back 20 steps", [BACK(20)]),
+    ("turn left 90 degrees", [LEFT(68)]),
+    ("turn right", [RIGHT(68)]),
+    ("turn left two times", [LEFT(136)]),
+    ("turn left twice", [LEFT(136)]),
+    ("dön 180 derece", [LEFT(136)]),
+    ("bir tam tur at", [LEFT(272)]),
+    ("go forward 10 steps then turn right", [FWD(10), RIGHT(68)]),
+    ("go forward twice", None),
+    ("go forward 3 times", None),
+    ("move back 5 times", None),
+    ("go forward 99999999 steps", None),
+    ("go forward -100 steps", None),
+    ("go forward 0 steps", None),
+    ("turn around", None),
+    ("what is the weather", None),
+]
+
+def test_fast_parser():
+    for text, want in CASES:
+        got = parse_command(text)
+        assert got == want, f"{text!r}: {got} != {want}"
+
+def test_cache_rejects_invalid_entries():
+    cache = CommandCache(path="")
+    cache.put("go far", "en-US", [FWD(99999999)])
+    cache.put("go", "en-US", [FWD(100)])
+    assert cache.get("go far", "en-US") is None
+    assert cache.get("go", "en-US") == [FWD(100)]
+    assert cache.stats()["invalid"] == 1
+
+def test_near_duplicates_need_same_numbers_and_directions():
+    embed = lambda text: [1.0, 0.0]                       # every phrase looks identical to the embedder
+    cache = CommandCache(path="", embed=embed, threshold=0.9)
+    cache.put("please go forward 100 steps", "en-US", [FWD(100)])
+    assert cache.get("go forward 100 steps now", "en-US") == [FWD(100)]
+    assert cache.get("go ahead 100 steps", "en-US") == [FWD(100)]      # synonym, same command
+    assert cache.get("go forward 10 steps", "en-US") is None
+    assert cache.get("go back 100 steps", "en-US") is None
+    assert cache.get("turn left 100 degrees", "en-US") is None
+    assert cache.stats()["near_hits"] == 2
+
+if __name__ == "__main__":
+    test_fast_parser()
+    test_cache_rejects_invalid_entries()
+    test_near_duplicates_need_same_numbers_and_directions()
+    print(f"✅ {len(CASES)} fast-path phrasings + command cache validation OK")
@@ -0,0 +1,21 @@
+from image_transport import Reassembler, encode_frame, encode_legacy, is_binary
+
+def test_legacy_names_starting_with_magic():
+    r = Reassembler()
+    for name in ("TXT4_cam_1", "TX", "TXcam"):
+        payload = encode_legacy(b"\xff\xd8jpeg" * 10, name)
+        assert not is_binary(payload)
+        f = r.feed(payload)
+        assert f.legacy and f.name == name and bytes(f.data) == b"\xff\xd8jpeg" * 10
+
+def test_binary_roundtrip():
+    r = Reassembler()
+    data = bytes(range(256)) * 5
+    frames = [r.feed(p) for p in encode_frame(data, 7, chunk_size=300)]
+    assert frames[:-1] == [None] * (len(frames) - 1)
+    assert frames[-1].frame_id == 7 and bytes(frames[-1].data) == data
+
+if __name__ == "__main__":
+    test_legacy_names_starting_with_magic()
+    test_binary_roundtrip()
+    print("✅ image transport binary + legacy framing OK")
@@ -1,24 +1,15 @@
-import paho.mqtt.client as mqtt
-import json
-import time
+from mqtt_publisher import get_publisher
 
-client = mqtt.Client()
-client.connect("test.mosquitto.org", 1883)
+payload = {
+    "action": "MOVE_FORWARD",
+    "turn_direction": "LEFT",
+    "angle": 0,
+    "x_center": 300,
+    "height": 100
+}
 
-def on_connect(client, userdata, flags, rc):
-    print("✅ Connected")
-    payload = {
-        "action": "MOVE_FORWARD",
-        "turn_direction": "LEFT",
-        "angle": 0,
-        "x_center": 300,
-        "height": 100
-    }
-    client.publish("txt4/action", json.dumps(payload))
-    print("📤 Sent:", payload)
-    time.sleep(2)
-    client.disconnect()
-
-client.on_connect = on_connect
-client.connect("test.mosquitto.org", 1883)
-client.loop_forever()
\ No newline at end of file
+publisher = get_publisher()
+print("✅ Connected" if publisher.connected.is_set() else "⚠️ Not connected yet, message queued")
+publisher.publish(payload, "txt4/action", wait=True)
+print("📤 Sent:", payload)
+publisher.stop()
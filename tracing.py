@@ -0,0 +1,189 @@
+"""Lightweight latency tracing: spans per turn/frame, rolling percentiles, exports.
+
+    with tracer.trace("turn"):               # one voice turn, one frame, one detection run …
+        with tracer.span("gpt"):
+            reply = gpt(...)
+        tracer.record("asr.capture", 1.7)    # a duration measured elsewhere (e.g. another thread)
+
+Every span feeds a rolling window per name (p50/p95/p99). Spans opened inside
+a ``trace`` on the same thread are also attached to it, and the finished
+trace is appended to TRACE_JSONL as one JSON line. ``prometheus()`` renders
+the windows as Prometheus summaries (written to TRACE_PROM on export).
+With TRACE=0 (the default) ``span``/``trace`` return one shared no-op context
+manager and ``record`` returns immediately.
+"""
+from __future__ import annotations
+import collections, itertools, json, os, threading, time
+from contextlib import nullcontext
+from typing import Deque, Dict, Iterable, List, Optional
+
+# ═════════════════════════════ CONFIG ═══════════════════════════════════════
+TRACE         = os.getenv("TRACE", "0") == "1"
+TRACE_JSONL   = os.getenv("TRACE_JSONL", "traces.jsonl")    # "" = no per-trace log
+TRACE_PROM    = os.getenv("TRACE_PROM", "")                 # e.g. metrics.prom, written by export()
+TRACE_WINDOW  = int(os.getenv("TRACE_WINDOW", "1000"))      # samples kept per span name
+TRACE_PREFIX  = "txt4"
+
+_NOOP = nullcontext()
+
+def percentile(s: List[float], p: float) -> float:
+    """Nearest-rank percentile of a sorted, non-empty list."""
+    return s[min(len(s) - 1, int(p * len(s)))]
+
+def latency_summary(xs: Iterable[float]) -> Dict[str, float]:
+    """n / mean / p95 in ms of a window of durations in seconds (the services' stats() format)."""
+    s = sorted(xs)
+    if not s:
+        return {"n": 0, "mean_ms": 0.0, "p95_ms": 0.0}
+    return {"n": len(s), "mean_ms": round(1000 * sum(s) / len(s), 2), "p95_ms": round(1000 * percentile(s, 0.95), 2)}
+
+class _Trace:
+    def __init__(self, kind: str, tid: int, start: float, attrs: dict):
+        self.kind, self.id, self.start, self.attrs = kind, tid, start, attrs
+        self.wall = time.time() - (time.perf_counter() - start)
+        self.spans: List[dict] = []
+
+class _Span:
+    __slots__ = ("tracer", "name", "t0")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer, self.name = tracer, name
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer._add(self.name, time.perf_counter() - self.t0, self.t0)
+
+class _TraceCtx:
+    def __init__(self, tracer: "Tracer", trace: _Trace):
+        self.tracer, self.trace = tracer, trace
+
+    def __enter__(self) -> _Trace:
+        self.tracer._local.stack.append(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, *exc) -> None:
+        self.tracer._local.stack.pop()
+        if exc_type is not None:
+            self.trace.attrs["error"] = exc_type.__name__
+        self.tracer._finish(self.trace)
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACE, jsonl: str = TRACE_JSONL, prom: str = TRACE_PROM,
+                 window: int = TRACE_WINDOW):
+        self.enabled, self.jsonl, self.prom, self.window = enabled, jsonl, prom, window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, List[float]] = {}     # name → [count, sum] since start
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._out = None
+
+    # ── recording ──────────────────────────────────────────────────────────
+    def span(self, name: str):
+        """Context manager timing ``name``; a shared no-op when tracing is off."""
+        return _Span(self, name) if self.enabled else _NOOP
+
+    def trace(self, kind: str, start: Optional[float] = None, **attrs):
+        """Group the spans of one turn/frame; ``start`` (perf_counter) back-dates it."""
+        if not self.enabled:
+            return _NOOP
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return _TraceCtx(self, _Trace(kind, next(self._ids), start or time.perf_counter(), attrs))
+
+    def record(self, name: str, seconds: float, start: Optional[float] = None) -> None:
+        """Add a duration measured elsewhere (e.g. on another thread)."""
+        if self.enabled:
+            self._add(name, seconds, start)
+
+    def annotate(self, **attrs) -> None:
+        """Attach attributes to the trace open on this thread."""
+        if self.enabled and getattr(self._local, "stack", None):
+            self._local.stack[-1].attrs.update(attrs)
+
+    def _add(self, name: str, seconds: float, start: Optional[float]) -> None:
+        with self._lock:
+            q = self._samples.get(name)
+            if q is None:
+                q = self._samples[name] = collections.deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            q.append(seconds)
+            self._totals[name][0] += 1
+            self._totals[name][1] += seconds
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            tr = stack[-1]
+            tr.spans.append({"name": name, "ms": round(1000 * seconds, 3),
+                             "at_ms": round(1000 * ((start or time.perf_counter() - seconds) - tr.start), 3)})
+
+    def _finish(self, tr: _Trace) -> None:
+        total = time.perf_counter() - tr.start
+        self._add(f"{tr.kind}.total", total, tr.start)
+        if not self.jsonl:
+            return
+        line = json.dumps({"kind": tr.kind, "id": tr.id, "ts": round(tr.wall, 3),
+                           "total_ms": round(1000 * total, 3), **tr.attrs, "spans": tr.spans},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                if self._out is None:
+                    self._out = open(self.jsonl, "a", encoding="utf-8", buffering=1)
+                self._out.write(line + "\n")
+            except OSError as e:
+                print(f"⚠️ Could not write trace to {self.jsonl}: {e}")
+                self.jsonl = ""
+
+    # ── reporting ──────────────────────────────────────────────────────────
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snap = {k: sorted(v) for k, v in self._samples.items()}
+        return {k: {"n": len(s), "mean_ms": round(1000 * sum(s) / len(s), 2),
+                    "p50_ms": round(1000 * percentile(s, 0.50), 2), "p95_ms": round(1000 * percentile(s, 0.95), 2),
+                    "p99_ms": round(1000 * percentile(s, 0.99), 2)}
+                for k, s in sorted(snap.items()) if s}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition: one summary per span name."""
+        with self._lock:
+            snap = {k: (sorted(v), list(self._totals[k])) for k, v in self._samples.items()}
+        metric = f"{TRACE_PREFIX}_span_seconds"
+        out = [f"# HELP {metric} Span durations (rolling window of {self.window} samples).",
+               f"# TYPE {metric} summary"]
+        for name, (s, (count, total)) in sorted(snap.items()):
+            if not s:
+                continue
+            for q in (0.5, 0.95, 0.99):
+                out.append(f'{metric}{{span="{name}",quantile="{q}"}} {percentile(s, q):.6f}')
+            out.append(f'{metric}_sum{{span="{name}"}} {total:.6f}')
+            out.append(f'{metric}_count{{span="{name}"}} {count}')
+        return "\n".join(out) + "\n"
+
+    def export(self) -> None:
+        """Flush the JSONL log and write TRACE_PROM (if configured)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._out is not None:
+                self._out.flush()
+        if self.prom:
+            tmp = f"{self.prom}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus())
+                os.replace(tmp, self.prom)
+            except OSError as e:
+                print(f"⚠️ Could not write {self.prom}: {e}")
+
+    def report(self) -> None:
+        """Print the percentile table and export."""
+        if not self.enabled:
+            return
+        print(f"{'span':28} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, s in self.summary().items():
+            print(f"{name:28} {s['n']:6d} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f}")
+        self.export()
+
+tracer = Tracer()
@@ -0,0 +1,179 @@
+"""Non-blocking streaming speech output.
+
+``say()`` returns immediately. Sentences are synthesised on a small thread
+pool (the next one is requested while the current one is still playing) and
+their PCM chunks are written to a sounddevice OutputStream as soon as they
+arrive, so the first audio plays long before the whole reply is synthesised.
+``stop()`` is the barge-in hook: queued and playing audio is dropped within
+one playback slice.
+"""
+from __future__ import annotations
+import collections, os, queue, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from typing import Callable, ContextManager, Deque, Iterable, List, Optional, Tuple
+import numpy as np
+from startup import lazy_module
+from tracing import percentile, tracer
+
+sd = lazy_module("sounddevice")   # PortAudio is initialised when the first stream opens
+
+TTS_PREFETCH  = int(os.getenv("TTS_PREFETCH", "2"))     # sentences synthesised concurrently
+PLAY_SLICE_S  = 0.08                                     # barge-in granularity
+_END = object()
+
+# synth(sentence, lang) → iterator of (sample_rate, float32 mono chunk)
+Synth = Callable[[str, str], Iterable[Tuple[int, np.ndarray]]]
+
+def _close(stream) -> None:
+    try:
+        stream.stop(); stream.close()
+    except Exception:
+        pass
+
+class StreamingSpeaker:
+    def __init__(self, synth: Synth, guard: Callable[[], ContextManager] = nullcontext,
+                 name: str = "TTS"):
+        self.synth = synth
+        self.guard = guard
+        self.name = name
+        self.ttfa: Deque[float] = collections.deque(maxlen=100)   # time to first audio per utterance
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._audio: "queue.Queue" = queue.Queue(maxsize=512)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, TTS_PREFETCH), thread_name_prefix="tts-synth")
+        self._gen = 0
+        self._pending = 0
+        self._idle = threading.Condition()
+        for target, name in ((self._synth_loop, "tts-order"), (self._play_loop, "tts-play")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    # ── public API ─────────────────────────────────────────────────────────
+    def say(self, sentences: List[str], lang: str, wait: bool = False) -> None:
+        sentences = [s for s in sentences if s.strip()]
+        if not sentences:
+            return
+        with self._idle:
+            self._pending += 1
+            gen = self._gen
+        self._jobs.put((gen, sentences, lang, time.perf_counter()))
+        if wait:
+            self.wait()
+
+    def stop(self) -> bool:
+        """Barge-in: drop everything queued or playing. Returns True if something was cut off."""
+        with self._idle:
+            was_busy = self._pending > 0
+            self._gen += 1
+            self._pending = 0
+            self._idle.notify_all()
+        for q in (self._jobs, self._audio):
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        if was_busy:
+            print(f"✋ [{self.name}] playback interrupted")
+        return was_busy
+
+    @property
+    def speaking(self) -> bool:
+        return self._pending > 0
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    # ── workers ────────────────────────────────────────────────────────────
+    def _produce(self, gen: int, sentence: str, lang: str, out: "queue.Queue") -> None:
+        try:
+            for rate, chunk in self.synth(sentence, lang):
+                if gen != self._gen:
+                    break
+                out.put((rate, chunk))
+        except Exception as e:
+            print(f"❌ [{self.name}] synthesis failed: {e}")
+        finally:
+            out.put(_END)
+
+    def _synth_loop(self) -> None:
+        """Start sentence requests ahead of time and forward their chunks in order."""
+        while True:
+            gen, sentences, lang, t0 = self._jobs.get()
+            if gen != self._gen:
+                continue
+            outs = [queue.Queue() for _ in sentences]
+            for s, q in zip(sentences, outs):
+                self._pool.submit(self._produce, gen, s, lang, q)
+            for q in outs:
+                while gen == self._gen:
+                    item = q.get()
+                    if item is _END:
+                        break
+                    self._audio.put((gen, t0, item))
+            self._audio.put((gen, t0, _END))
+
+    def _play_loop(self) -> None:
+        stream, rate_open = None, 0
+        started: Optional[float] = None
+        failed: Optional[float] = None                 # t0 of an utterance whose playback failed
+        playing, guard = -1, ExitStack()
+        while True:
+            try:
+                gen, t0, item = self._audio.get(timeout=0.1)
+            except queue.Empty:
+                if started is not None and playing != self._gen:   # stopped, nothing more queued
+                    guard.close(); started = None
+                continue
+            if gen != self._gen:
+                guard.close(); started = None
+                continue
+            if item is _END:
+                guard.close()
+                if t0 == failed:                       # already counted as finished
+                    failed = None
+                    continue
+                if started is not None:
+                    print(f"[🔊 {self.name}] done in {time.perf_counter() - t0:.2f}s")
+                started = None
+                self._finished(gen)
+                continue
+            if t0 == failed:
+                continue
+            rate, chunk = item
+            try:
+                if stream is None or rate != rate_open:
+                    if stream is not None:
+                        _close(stream); stream = None
+                    stream = sd.OutputStream(samplerate=rate, channels=1, dtype="float32")
+                    stream.start(); rate_open = rate
+                if started is None:
+                    started, playing = time.perf_counter(), gen
+                    self.ttfa.append(started - t0)
+                    tracer.record("tts.first_audio", started - t0, t0)
+                    print(f"[🔊 {self.name}] first audio after {started - t0:.2f}s")
+                    guard.enter_context(self.guard())
+                step = max(1, int(rate * PLAY_SLICE_S))
+                for i in range(0, len(chunk), step):
+                    if gen != self._gen:
+                        break
+                    stream.write(np.ascontiguousarray(chunk[i:i + step], dtype=np.float32))
+            except Exception as e:   # no audio device, device unplugged, write error: drop this utterance
+                print(f"❌ [{self.name}] playback failed: {e}")
+                guard.close(); started = None
+                if stream is not None:
+                    _close(stream); stream = None
+                failed = t0
+                self._finished(gen)
+
+    def _finished(self, gen: int) -> None:
+        with self._idle:
+            if gen == self._gen and self._pending:
+                self._pending -= 1
+            self._idle.notify_all()
+
+    def stats(self) -> dict:
+        xs = sorted(self.ttfa)
+        return {"utterances": len(xs), "speaking": self.speaking,
+                "ttfa_mean_s": round(sum(xs) / len(xs), 3) if xs else 0.0,
+                "ttfa_p95_s": round(percentile(xs, 0.95), 3) if xs else 0.0}